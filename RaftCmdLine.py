@@ -23,12 +23,23 @@
 import sys
 import argparse
 import os
-import bz2
-import lzma
+import multiprocessing
 import glob
+import time
+import uuid
+import functools
+from urllib import parse as urlparse
 
 from core.database import database
-from core.data.RaftDbCapture import RaftDbCapture
+from core.database.BulkInsert import BulkResponseWriter
+from core.database.BulkExport import BulkCaptureExporter, capture_compression
+from core.fuzzer.TemplateDefinition import TemplateDefinition
+from core.fuzzer.TemplateItem import TemplateItem
+from core.fuzzer.TemplateRenderer import TemplateRenderer, build_replacements
+from core.fuzzer.FuzzJob import FuzzJob
+from core.fuzzer.Payloads import read_payload_file
+from core.fuzzer.ConcurrencyController import ConcurrencyController
+from core.network.AsyncRequestEngine import AsyncRequestEngine
 
 from utility.ScriptLoader import ScriptLoader
 
@@ -36,6 +47,7 @@ from lib.parsers.burpparse import burp_parse_log, burp_parse_state, burp_parse_x
 from lib.parsers.webscarabparse import webscarab_parse_conversation
 from lib.parsers.parosparse import paros_parse_message
 from lib.parsers.raftparse import raft_parse_xml, ParseAdapter
+from lib.parsers.raftcapture import raft_parse_capture
 from lib.parsers.appscanparse import appscan_parse_xml
 
 from raft import __version__
@@ -44,6 +56,7 @@ class RaftCmdLine():
     # TODO: refactor this definition to be shared with importers
     FILE_PROCESSOR_DEFINTIONS = {
         'raft_capture_xml' : raft_parse_xml,
+        'raft_capture' : raft_parse_capture,
         'burp_log' : burp_parse_log,
         'burp_xml' : burp_parse_xml,
         'burp_vuln_xml' : burp_parse_vuln_xml,
@@ -52,6 +65,8 @@ class RaftCmdLine():
         'webscarab' : webscarab_parse_conversation,
         'paros_message' : paros_parse_message,
         }
+    # same default as the GUI framework
+    DEFAULT_USER_AGENT = 'Mozilla/5.0 (Macintosh; U; Intel Mac OS X 10_6_7; en-us) AppleWebKit/533.21.1 (KHTML, like Gecko) Version/5.0.5 Safari/533.21.1'
     def __init__(self):
         self.scripts = {}
         self.scriptLoader = ScriptLoader()
@@ -67,6 +82,8 @@ class RaftCmdLine():
         do_import = getattr(args, 'import')
         do_export = getattr(args, 'export')
         do_parse = getattr(args, 'parse')
+        do_fuzz = getattr(args, 'fuzz')
+        do_bulk_request = getattr(args, 'bulk_request')
 
         # was DB file specified?
         db_filename = getattr(args, 'db')
@@ -85,8 +102,8 @@ class RaftCmdLine():
             self.Data.connect(db_filename)
             sys.stderr.write('\nAttaching database: %s\n' %(db_filename))
         else:
-            if do_export or do_import:
-                sys.stderr.write('\nDB file is required\n' % (db_filename))
+            if do_export or do_import or do_fuzz or do_bulk_request:
+                sys.stderr.write('\nDB file is required\n')
                 return 1
 
         # setup any capture filters
@@ -103,22 +120,29 @@ class RaftCmdLine():
             for filearg in arg:
                 self.process_capture_scripts.append(self.load_script_file(filearg))
 
+        # RAFT capture containers are read through their index, so these skip other captures without decoding them
+        self.capture_hosts = getattr(args, 'capture_host')
+        self.capture_urls = getattr(args, 'capture_url')
+
         if do_export:
             filename = getattr(args, 'output_file')
-            if filename.endswith('.xml.xz'):
-                fh = lzma.LZMAFile(filename, 'w')
-            elif filename.endswith('.xml.bz2'):
-                fh = bz2.BZ2File(filename, 'w')
-            elif filename.endswith('.xml'):
-                fh = open(filename, 'wb')
-            else:
+            if capture_compression(filename) is None:
                 sys.stderr.write('\nUnsupported output file type [%s]\n' % (filename))
                 return 1
-            self.export_to_raft_capture(filename, fh)
+            self.export_to_raft_capture(filename)
         elif do_import:
             self.run_process_loop(args, self.import_one_file)
+            self.update_search_index()
         elif do_parse:
             self.run_process_loop(args, self.parse_one_file)
+        elif do_fuzz:
+            rc = self.run_fuzz(args)
+            self.update_search_index()
+            return rc
+        elif do_bulk_request:
+            rc = self.run_bulk_request(args)
+            self.update_search_index()
+            return rc
         else:
             sys.stderr.write('\nNo recognized options\n')
 
@@ -158,6 +182,8 @@ class RaftCmdLine():
             arg = getattr(args, name)
             if arg is None:
                 continue
+            if raft_parse_capture == func:
+                func = functools.partial(raft_parse_capture, hosts = self.capture_hosts, urls = self.capture_urls, processes = None)
             for filearg in arg:
                 if filearg.startswith('~'):
                     filearg = os.path.expanduser(filearg)
@@ -171,7 +197,7 @@ class RaftCmdLine():
                     call_func(filename, func, name)
         self.setup_script_finalizers()
 
-    def export_to_raft_capture(self, filename, fhandle):
+    def export_to_raft_capture(self, filename):
         """ Export to RAFT capture format """
         sys.stderr.write('\nExporting to [%s]\n' % (filename))
         self.reset_script_begin_end()
@@ -183,30 +209,11 @@ class RaftCmdLine():
             if capture_filter:
                 filters.append(capture_filter)
 
-        adapter = ParseAdapter()
-        count = 0
         Data = self.Data
         cursor = Data.allocate_thread_cursor()
         try:
-            fhandle.write(b'<raft version="1.0">\n')
-            for row in Data.read_all_responses(cursor):
-                capture = RaftDbCapture()
-                capture.populate_by_dbrow(row)
-
-                skip = False
-                for capture_filter in filters:
-                    result = capture_filter(capture)
-                    if not result:
-                        skip = True
-                        break
-
-                if not skip:
-                    fhandle.write(adapter.format_as_xml(capture).encode('utf-8'))
-                    count += 1
-
-            fhandle.write(b'</raft>')
-            fhandle.close()
-
+            exporter = BulkCaptureExporter(Data, cursor, filename, capture_filters = filters)
+            count = exporter.export_all()
             sys.stderr.write('\nExported [%d] records\n' % (count))
 
         finally:
@@ -219,6 +226,24 @@ class RaftCmdLine():
 
         self.setup_script_finalizers()
 
+    def update_search_index(self):
+        """ Index the responses written without search indexing, so searches need not scan them """
+        Data = self.Data
+        cursor = Data.allocate_thread_cursor()
+        try:
+            count = 0
+            while True:
+                indexed = Data.index_pending_responses(cursor, 2000)
+                if not indexed:
+                    break
+                count += indexed
+            if count:
+                sys.stderr.write('\nIndexed [%d] records for search\n' % (count))
+        finally:
+            cursor.close()
+            Data.release_thread_cursor(cursor)
+            Data, cursor = None, None
+
     def import_one_file(self, filename, func, funcname):
         """ Import one file using specified parser function"""
         adapter = ParseAdapter()
@@ -231,10 +256,9 @@ class RaftCmdLine():
             if capture_filter:
                 filters.append(capture_filter)
 
-        count = 0
-        commit_threshold = 100
         Data = self.Data
         cursor = Data.allocate_thread_cursor()
+        writer = BulkResponseWriter(Data, cursor)
         try:
             Data.set_insert_pragmas(cursor)
             for result in func(filename):
@@ -249,17 +273,13 @@ class RaftCmdLine():
                     insertlist = [None, capture.url, capture.request_headers, capture.request_body, capture.response_headers, capture.response_body,
                                   capture.status, capture.content_length, capture.elapsed, capture.datetime, capture.notes, None, capture.confirmed, 
                                   capture.method, capture.hostip, capture.content_type, '%s-%s' % (funcname, capture.origin), capture.host]
-                    Data.insert_responses(cursor, insertlist, False)
-                    count += 1
-                    if (0 == (count % commit_threshold)):
-                        Data.commit()
-
-            if not (0 == (count % commit_threshold)):
-                Data.commit()
+                    writer.add(insertlist)
 
+            count = writer.finish()
             sys.stderr.write('\nInserted [%d] records\n' % (count))
 
         except Exception as error:
+            writer.close()
             Data.rollback()
             print(error)
             # TODO: should continue(?)
@@ -313,6 +333,174 @@ class RaftCmdLine():
         for script_env in self.process_capture_scripts:
             self.call_script_method_with_filename(script_env, 'end', filename)
 
+    def run_fuzz(self, args):
+        """ Send every combination of payloads applied to a web fuzzer template """
+        url = getattr(args, 'url')
+        template_filename = getattr(args, 'template')
+        if not url or not template_filename:
+            sys.stderr.write('\nFuzzing requires --url and --template\n')
+            return 1
+        method = getattr(args, 'method') or 'GET'
+
+        template_definition = TemplateDefinition(self.read_template_file(template_filename))
+        parameter_names = template_definition.parameter_names
+
+        global_ns = local_ns = {}
+        for filename in getattr(args, 'function_file') or []:
+            self.scriptLoader.load_from_file(os.path.expanduser(filename), global_ns, local_ns)
+
+        # the last payload given varies fastest
+        payloads = {}
+        for arg in getattr(args, 'payload') or []:
+            name, filename = self.split_name_value(arg)
+            payloads[name] = read_payload_file(os.path.expanduser(filename))
+        for arg in getattr(args, 'static_payload') or []:
+            name, value = self.split_name_value(arg)
+            payloads[name] = [value]
+
+        missing = parameter_names.difference(payloads)
+        if missing:
+            sys.stderr.write('\nNo payload given for: %s\n' % (', '.join(sorted(missing))))
+            return 1
+        test_slots = [(name, values) for name, values in payloads.items() if name in parameter_names]
+
+        replacements = build_replacements(method, url, self.useragent(args))
+        fuzz_job = FuzzJob(url, template_definition.template_items, test_slots, replacements, global_ns, local_ns)
+        sys.stderr.write('\nFuzzing [%s] with [%d] requests\n' % (url, fuzz_job.total))
+
+        def fuzz_requests():
+            while True:
+                request = fuzz_job.next_request()
+                if request is None:
+                    break
+                yield request
+
+        return self.send_requests(args, fuzz_requests(), 'CmdLineFuzzer')
+
+    def run_bulk_request(self, args):
+        """ Send a request template to each url of the url lists """
+        template_filename = getattr(args, 'template')
+        if not template_filename:
+            sys.stderr.write('\nBulk requests require --template\n')
+            return 1
+        method = getattr(args, 'method') or 'GET'
+        template_text = self.read_template_file(template_filename)
+
+        request_urls = []
+        for filename in getattr(args, 'url_list') or []:
+            fh = open(os.path.expanduser(filename), 'r')
+            request_urls.extend([line.strip() for line in fh if line.strip()])
+            fh.close()
+        sys.stderr.write('\nSending [%d] bulk requests\n' % (len(request_urls)))
+
+        # read from the database, so looked up once rather than per request
+        user_agent = self.useragent(args)
+
+        def bulk_requests():
+            # builtins such as ${request_uri} are the only replacements, as in the bulk requester
+            template_items = [TemplateItem(template_text, TemplateItem.T_TEXT)]
+            for url in request_urls:
+                renderer = TemplateRenderer(url, template_items, [], build_replacements(method, url, user_agent), {}, {})
+                request_method, request_url, headers, body = renderer.render(())
+                yield request_method, request_url, headers, body, uuid.uuid4().hex
+
+        return self.send_requests(args, bulk_requests(), 'CmdLineBulkRequest')
+
+    def useragent(self, args):
+        user_agent = getattr(args, 'user_agent')
+        if user_agent:
+            return user_agent
+        cursor = self.Data.allocate_thread_cursor()
+        try:
+            if self.Data.get_config_value(cursor, 'RAFT', 'browser_custom_user_agent', bool, False):
+                return self.Data.get_config_value(cursor, 'RAFT', 'browser_user_agent_value', str, self.DEFAULT_USER_AGENT)
+            return self.DEFAULT_USER_AGENT
+        finally:
+            cursor.close()
+            self.Data.release_thread_cursor(cursor)
+
+    def create_request_engine(self, args):
+        """ Engine settings default to the request runner configuration in the database """
+        Data = self.Data
+        cursor = Data.allocate_thread_cursor()
+        try:
+            def setting(argname, name, rtype, default_value):
+                value = getattr(args, argname)
+                if value is None:
+                    value = Data.get_config_value(cursor, 'RAFT', name, rtype, default_value)
+                return value
+            controller = ConcurrencyController(
+                initial = setting('concurrency', 'RequestRunner.InitialConcurrency', int, 10),
+                minimum = Data.get_config_value(cursor, 'RAFT', 'RequestRunner.MinConcurrency', int, 1),
+                maximum = setting('max_concurrency', 'RequestRunner.MaxConcurrency', int, 64),
+                max_host = 0,
+                max_rate = setting('requests_per_second', 'RequestRunner.MaxRequestsPerSecond', float, 0.0),
+                adaptive = Data.get_config_value(cursor, 'RAFT', 'RequestRunner.AdaptiveConcurrency', bool, True),
+                )
+            # each connection to a host carries one request at a time, unless pipelined
+            max_host_connections = setting('host_connections', 'RequestRunner.MaxHostConcurrency', int, 0) or 6
+        finally:
+            cursor.close()
+            Data.release_thread_cursor(cursor)
+
+        return AsyncRequestEngine(controller, max_host_connections, getattr(args, 'pipeline_depth') or 1,
+                                  getattr(args, 'timeout') or 30.0, self.useragent(args))
+
+    def send_requests(self, args, requests, origin):
+        """ Send requests with the asyncio engine, storing each response into the database """
+        engine = self.create_request_engine(args)
+        Data = self.Data
+        cursor = Data.allocate_thread_cursor()
+        writer = BulkResponseWriter(Data, cursor)
+        counts = {'sent' : 0, 'errors' : 0}
+        started_time = time.time()
+
+        def response_received(request, response, request_headers, elapsed, started, error):
+            method, url, headers, body, context = request
+            counts['sent'] += 1
+            if 0 == counts['sent'] % 1000:
+                sys.stderr.write('\n[%d] requests sent, [%d] in flight, %.1f requests/sec\n' % (counts['sent'], engine.controller.limit(), engine.controller.throughput()))
+            if response is None:
+                counts['errors'] += 1
+                sys.stderr.write('\nRequest failed [%s]: %s\n' % (url, error))
+                return
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            insertlist = [None, url, request_headers, body or b'', response.raw_headers, response.body,
+                          response.status, len(response.body), elapsed, time.asctime(time.localtime(started)), None, None, None,
+                          method, response.hostip, response.header('content-type'), '%s-%s' % ('RAFT', origin), urlparse.urlsplit(url).netloc]
+            writer.add(insertlist)
+
+        try:
+            Data.set_insert_pragmas(cursor)
+            engine.run(requests, response_received)
+            count = writer.finish()
+            sys.stderr.write('\nSent [%d] requests in %.1f seconds, inserted [%d] records, [%d] failed\n' % (counts['sent'], time.time() - started_time, count, counts['errors']))
+        except Exception as error:
+            writer.close()
+            Data.rollback()
+            print(error)
+            raise error
+        finally:
+            Data.reset_pragmas(cursor)
+            cursor.close()
+            Data.release_thread_cursor(cursor)
+            Data, cursor = None, None
+
+        return 0
+
+    def read_template_file(self, filename):
+        fh = open(os.path.expanduser(filename), 'r')
+        template_text = fh.read()
+        fh.close()
+        return template_text
+
+    def split_name_value(self, arg):
+        if '=' not in arg:
+            raise Exception('expected name=value: %s' % (arg))
+        name, value = arg.split('=', 1)
+        return name.strip(), value
+
     def load_script_file(self, filename):
         if filename in self.scripts:
             return self.scripts[filename]
@@ -329,12 +517,15 @@ def main():
     parser.add_argument('--db', nargs='?', help='Specify a RAFT database file')
     parser.add_argument('--create', action='store_const', const=True, default=False, help='Create the database (if needed)')
     parser.add_argument('--import', action='store_const', const=True, default=False, help='Import list of files into database')
-    parser.add_argument('--export', action='store_const', const=True, default=False, help='Export the RAFT database into a RAFT XML capture file')
+    parser.add_argument('--export', action='store_const', const=True, default=False, help='Export the RAFT database into a RAFT XML capture file or .raftcap container')
     parser.add_argument('--parse', action='store_const', const=True, default=False, help='Parse list of files and run processing')
     parser.add_argument('--output-file', nargs='?', help='Output file to write results into')
     parser.add_argument('--capture-filter', nargs='*', help='A Python file with a function or single class containing: "capture_filter"')
     parser.add_argument('--process-capture', nargs='*', help='A Python file with a function or single class containing: "process_capture"')
     parser.add_argument('--raft-capture-xml', nargs='*', help='A list of RAFT xml captgure files')
+    parser.add_argument('--raft-capture', nargs='*', help='A list of RAFT capture container (.raftcap) files')
+    parser.add_argument('--capture-host', nargs='*', help='Only read captures for these hosts from RAFT capture containers')
+    parser.add_argument('--capture-url', nargs='*', help='Only read captures for these URLs from RAFT capture containers')
     parser.add_argument('--burp-log', nargs='*', help='A list of Burp log files')
     parser.add_argument('--burp-xml', nargs='*', help='A list of Burp XML files')
     parser.add_argument('--burp-vuln-xml', nargs='*', help='A list of Burp vulnerability report in XML format')
@@ -342,6 +533,22 @@ def main():
     parser.add_argument('--appscan-xml', nargs='*', help='A list of AppScan XML report files')
     parser.add_argument('--webscarab', nargs='*', help='A list of WebScarab locations')
     parser.add_argument('--paros-message', nargs='*', help='A list of Paros message files')
+    parser.add_argument('--fuzz', action='store_const', const=True, default=False, help='Send a web fuzzer template with payloads, storing responses into database')
+    parser.add_argument('--bulk-request', action='store_const', const=True, default=False, help='Send a request template to a list of URLs, storing responses into database')
+    parser.add_argument('--template', nargs='?', help='Request template file, in web fuzzer or bulk requester format')
+    parser.add_argument('--url', nargs='?', help='Base URL of the fuzzer template')
+    parser.add_argument('--method', nargs='?', help='Value of ${method} in the template (default GET)')
+    parser.add_argument('--payload', nargs='*', help='A list of name=file payloads, one value per line')
+    parser.add_argument('--static-payload', nargs='*', help='A list of name=value payloads with a single value')
+    parser.add_argument('--function-file', nargs='*', help='A list of Python files with functions used by the template')
+    parser.add_argument('--url-list', nargs='*', help='A list of files with one URL per line for bulk requests')
+    parser.add_argument('--concurrency', type=int, help='Initial number of requests in flight')
+    parser.add_argument('--max-concurrency', type=int, help='Maximum number of requests in flight')
+    parser.add_argument('--host-connections', type=int, help='Maximum connections to each host (default 6)')
+    parser.add_argument('--pipeline-depth', type=int, help='Pipeline up to this many safe requests per connection (default 1, no pipelining)')
+    parser.add_argument('--requests-per-second', type=float, help='Ceiling on requests started per second')
+    parser.add_argument('--timeout', type=float, help='Seconds to wait for each response (default 30)')
+    parser.add_argument('--user-agent', nargs='?', help='Value of ${user_agent} and the default User-Agent header')
 
     args = parser.parse_args()
 
@@ -355,4 +562,5 @@ def main():
     sys.exit(rc)
 
 if '__main__' == __name__:
+    multiprocessing.freeze_support()
     main()
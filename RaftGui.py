@@ -28,6 +28,7 @@
 
 import sys
 import os
+import multiprocessing
 import shutil
 import cgi
 import re
@@ -129,6 +130,7 @@ from actions import SettingsFiles
 from core.database import database
 from core.database.constants import ResponsesTable
 from core.data import ScopeController
+from core.data import ExtractionCache
 from core.crawler import SpiderConfig
 from core.responses import RequestResponseFactory
 
@@ -144,7 +146,7 @@ from utility import WebFuzzer
 from widgets.RequestResponseWidget import RequestResponseWidget
 from widgets.ResponsesContextMenuWidget import ResponsesContextMenuWidget
 
-from core.data import ResponsesDataModel, SiteMapModel
+from core.data import ResponsesVirtualDataModel, SiteMapModel
 from core.data import DomFuzzerQueueDataModel
 from core.data import DomFuzzerResultsDataModel
 from core.data import SpiderQueueDataModel
@@ -165,6 +167,7 @@ from core.workers import ResponsesThread
 from core.workers import ImporterThread
 from core.workers import AnalyzerThread
 from core.workers import DomFuzzerThread
+from core.workers import WebFuzzerThread
 from core.workers import SpiderThread
 from core.workers import QuickAnalysisThread
 
@@ -210,6 +213,7 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
         # TODO: should be base extractor and that loads/returns appropriate type
         self.contentExtractor = BaseExtractor.BaseExtractor()
         self.framework.setContentExtractor(self.contentExtractor)
+        self.framework.setExtractionCache(ExtractionCache.ExtractionCache(self.framework, self))
 
         # Create actions for items
         self.responsesDataTree.doubleClicked.connect(self.response_item_double_clicked)
@@ -218,6 +222,8 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
         self.responsesDataTree.activated.connect(self.fill_bottom)
         self.responsesDataTree.setSortingEnabled(True)
         self.responsesDataTree.sortByColumn(0, Qt.AscendingOrder)
+        # rows are fetched as they are shown; uniform heights keep the view from asking for every row
+        self.responsesDataTree.setUniformRowHeights(True)
         
         #analysis tab connections
         self.mainAnalysisTreeWidget.clicked.connect(self.analysistree_handle_click)
@@ -249,6 +255,7 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
         self.actionOpen.triggered.connect(self.open_file)
         self.actionSave_As.triggered.connect(self.save_as)
         self.actionImport_RaftCaptureXml.triggered.connect(lambda x: self.import_raft('raft_capture_xml'))
+        self.actionImport_RaftCapture.triggered.connect(lambda x: self.import_raft('raft_capture'))
         self.actionImport_BurpLog.triggered.connect(lambda x: self.import_burp('burp_log'))
         self.actionImport_BurpState.triggered.connect(lambda x: self.import_burp('burp_state'))
         self.actionImport_BurpXml.triggered.connect(lambda x: self.import_burp('burp_xml'))
@@ -296,7 +303,7 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
 
         self.Progress.show()
         # Set initial temp.raftdb file for storage of imported data.
-        self.Data = database.Db(__version__, self.framework.report_exception)
+        self.Data = database.Db(__version__, self.framework.report_exception, use_pool = True)
         self.db = self.dbfilename
         self.databaseThread = DatabaseThread.DatabaseThread(self.framework, self.Data, self)
         self.connect(self, SIGNAL('connectDbFinished()'), self.connectDbFinishedHandler, Qt.QueuedConnection)
@@ -363,7 +370,8 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
         self.viewTabRequestResponse = RequestResponseWidget(self.framework, self.responseTabPlaceholder, self.responseSearchControlPlaceholder, self)
 
         # Responses data
-        self.responsesDataModel = ResponsesDataModel.ResponsesDataModel(self.framework, self)
+        # rows are read from the database as they are shown, so large projects aren't held in memory
+        self.responsesDataModel = ResponsesVirtualDataModel.ResponsesVirtualDataModel(self.framework, self)
         self.responsesDataTree.setModel(self.responsesDataModel)
         self.responsesThread = ResponsesThread.ResponsesThread(self.framework, self.responsesDataModel, self)
         self.responsesThread.start(QThread.LowPriority)
@@ -389,6 +397,11 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
         self.domFuzzerTab.set_fuzzer_thread(self.domFuzzerThread)
         self.domFuzzerTab.setup_fuzzer_results_treeview()
 
+        # web fuzzer thread
+        self.webFuzzerThread = WebFuzzerThread.WebFuzzerThread(self.framework, self)
+        self.webFuzzerThread.start(QThread.LowestPriority)
+        self.webfuzzerTab.set_fuzzer_thread(self.webFuzzerThread)
+
         # spider thread
         self.spiderQueueDataModel = SpiderQueueDataModel.SpiderQueueDataModel(self.framework, self)
         self.crawlerSpiderQueueTreeView.setModel(self.spiderQueueDataModel)
@@ -492,6 +505,8 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
 
                 # New db location
                 new_db = str(file)
+                # closing checkpoints any write-ahead log back into the file being moved
+                self.Data.close()
                 shutil.move(self.db, new_db)
                 self.db = new_db
 
@@ -531,6 +546,7 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
     def import_file_finished(self):
         self.Progress.close()
         self.fillResponses()
+        self.databaseThread.indexPending()
         
     def import_proxy_file(self, proxy_file, source):
         self.Progress.show()
@@ -553,8 +569,11 @@ class RaftMain(QMainWindow, RaftMain.Ui_MainWindow):
             self.import_proxy_files(files, source)
 
     def import_raft(self, source):
-        """ Import a Raft Capture XML """
-        files = QFileDialog.getOpenFileNames(None, "Open file", "")
+        """ Import a Raft Capture XML or capture container """
+        if 'raft_capture' == source:
+            files = QFileDialog.getOpenFileNames(None, "Open file", "", "RAFT Capture (*.raftcap)")
+        else:
+            files = QFileDialog.getOpenFileNames(None, "Open file", "")
         if files is not None:
             self.import_proxy_files(files, source)
 
@@ -909,4 +928,5 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
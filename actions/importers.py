@@ -25,15 +25,15 @@ from lib.parsers.burpparse import burp_parse_log, burp_parse_state, burp_parse_x
 from lib.parsers.webscarabparse import webscarab_parse_conversation
 from lib.parsers.parosparse import paros_parse_message
 from lib.parsers.raftparse import raft_parse_xml
+from lib.parsers.raftcapture import raft_parse_capture
 from lib.parsers.appscanparse import appscan_parse_xml
+from core.database.BulkInsert import BulkResponseWriter
 
 def process_import(proxy_log, framework, source):
     """ Performs the importing of log in to the RAFT database """
 
     Data = framework.getDB()
 
-    commit_threshold = 100
-
     if 'burp_state' == source:
         func = burp_parse_state
     elif 'burp_log' == source:
@@ -48,6 +48,8 @@ def process_import(proxy_log, framework, source):
         func = webscarab_parse_conversation
     elif 'raft_capture_xml' == source:
         func = raft_parse_xml
+    elif 'raft_capture' == source:
+        func = raft_parse_capture
     elif 'appscan_xml' == source:
         func = appscan_parse_xml
     else:
@@ -55,9 +57,9 @@ def process_import(proxy_log, framework, source):
 
     raw_cookie_list = []
     cursor = Data.allocate_thread_cursor()
+    writer = BulkResponseWriter(Data, cursor, written_callback = framework.signal_response_data_added)
     try:
         Data.set_insert_pragmas(cursor)
-        count = 0
         for value in func(proxy_log):
             if 'COOKIE' == value[0]:
                 if value[1]:
@@ -100,16 +102,11 @@ def process_import(proxy_log, framework, source):
                 insertlist = [None, url, request[0], request[1], response_headers, response_body,
                               status, content_length, elapsed, datetime, notes, None, confirmed, 
                               method, hostip, content_type, '%s-%s' % (source, origin), host]
-                Data.insert_responses(cursor, insertlist, False)
-                count += 1
-                if (0 == (count % commit_threshold)):
-                    Data.commit()
-                    framework.signal_response_data_added()
+                writer.add(insertlist)
 
-        if not (0 == (count % commit_threshold)):
-            Data.commit()
-            framework.signal_response_data_added()
+        writer.finish()
     except:
+        writer.close()
         Data.rollback()
         raise
     finally:
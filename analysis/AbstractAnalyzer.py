@@ -42,6 +42,11 @@ class AbstractAnalyzer(object):
     It is the responsibility of the analyzer writer to save or clear
     object fields as desired for each page.
     """
+
+    # Earlier results are reused while the source of the analyzer and of the
+    # RAFT modules it uses is unchanged; bump this when behaviour changes
+    # some other way, such as through data files the analyzer reads.
+    analyzerversion = None
     
     #####################Standard Functions
     #####################Override when defining your own analyzers
@@ -79,6 +84,27 @@ class AbstractAnalyzer(object):
     def defaultEnabled(self):
         """Returns if the analyzer should be Enabled by default"""
         return True
+
+    def getPrefilter(self):
+        """Returns the responses this analyzer can use, or None for all of them.
+           A dictionary with any of:
+             'contentTypes' : strings, one of which must appear in the response content type
+             'statuses'     : status codes or (low, high) ranges the response status must be in
+             'needsBody'    : False if only headers are looked at; bodies are then left empty
+             'contains'     : bytes that must appear in the response body
+           The analysis engine reads each response once for all analyzers that want it."""
+        return None
+
+    def getAnalysisState(self):
+        """Returns, and then clears, any data collected across pages for use in postanalysis.
+           Analysis runs in several worker processes, so analyzers that keep such data
+           must override this and mergeAnalysisState.  The state must be picklable."""
+        return None
+
+    def mergeAnalysisState(self,state):
+        """Merges state returned by getAnalysisState in a worker process into this analyzer.
+           Called before postanalysis."""
+        pass
     
     #####################Special Functions
     #####################You shouldn't need to override these unless you're doing something very special
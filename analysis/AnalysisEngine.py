@@ -0,0 +1,217 @@
+#
+# Analysis engine that runs analyzers over responses in worker processes
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import traceback
+import importlib
+import multiprocessing
+from collections import deque
+
+from core.database.constants import ResponsesTable
+from core.responses.RequestResponseFactory import request_response_from_items
+from analysis.AnalyzerPrefilter import AnalyzerPrefilter
+from lib.extractors import BaseExtractor
+
+class WorkerFramework(object):
+    """ The part of the framework interface that RequestResponse needs inside a worker process """
+    def __init__(self):
+        self._contentExtractor = BaseExtractor.BaseExtractor()
+
+    def getContentExtractor(self):
+        return self._contentExtractor
+
+    def getExtractionCache(self):
+        return None
+
+class AnalysisWorker(object):
+    """ Analyzer instances living in one worker process """
+
+    def __init__(self, analyzer_paths, analyzer_specs):
+        for p in analyzer_paths:
+            for path in (p, os.path.dirname(p)):
+                if path not in sys.path:
+                    sys.path.insert(0, path)
+
+        self.framework = WorkerFramework()
+        self.contentExtractor = self.framework.getContentExtractor()
+        self.analyzers = []
+        for modname, classname, configuration in analyzer_specs:
+            module = importlib.import_module(modname)
+            analyzer = getattr(module, classname)()
+            if configuration:
+                analyzer.setConfiguration(configuration)
+            analyzer.preanalysis()
+            analyzer.initResultsData()
+            self.analyzers.append(analyzer)
+
+    def analyze_batch(self, batch):
+        """ Returns per analyzer (page results, overall results, state) and any errors for the batch
+            of (response items, indexes of the analyzers to run on them) """
+        errors = []
+        page_results = [[] for analyzer in self.analyzers]
+        for responseItems, selected in batch:
+            transaction = request_response_from_items(self.framework, self.contentExtractor, responseItems)
+            for ndx in selected:
+                analyzer = self.analyzers[ndx]
+                try:
+                    results = analyzer.getResults()
+                    analyzer.analyzeTransaction(transaction, results)
+                    if transaction.Id in results.pages:
+                        page_results[ndx].append((transaction.Id, transaction.responseUrl, results.pages.pop(transaction.Id)))
+                except Exception as error:
+                    message = traceback.format_exception(type(error), error, error.__traceback__)
+                    errors.append('Transaction ID: %s\n%s' % (transaction.Id, ''.join(message)))
+
+        batch_results = []
+        for ndx, analyzer in enumerate(self.analyzers):
+            overall = analyzer.getResults().overall
+            analyzer.initResultsData()
+            batch_results.append((page_results[ndx], overall, analyzer.getAnalysisState()))
+
+        return batch_results, errors
+
+_worker = None
+_worker_error = None
+
+def _init_worker(analyzer_paths, analyzer_specs):
+    global _worker, _worker_error
+    # an initializer that raises makes the pool restart the worker forever, so report it per batch instead
+    try:
+        _worker = AnalysisWorker(analyzer_paths, analyzer_specs)
+    except Exception as error:
+        _worker_error = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+
+def _analyze_batch(batch):
+    if _worker is None:
+        raise Exception('analysis worker failed to start:\n%s' % (_worker_error))
+    return _worker.analyze_batch(batch)
+
+class AnalysisEngine(object):
+    """
+    Streams batches of responses to a pool of worker processes, each of which
+    holds its own instance of every analyzer.  Page results come back to the
+    caller for writing; overall results and per-worker analyzer state are
+    merged into the analyzers passed in, ready for postanalysis.
+
+    Analyzers are grouped by their prefilters; conditions() gives the
+    predicates to read responses with, and select() picks the analyzers
+    for a response from the group matches read along with it.
+    """
+
+    def __init__(self, analyzers, analyzer_paths, processes = None, batch_size = 50):
+        self.analyzers = list(analyzers)
+        self.analyzer_paths = analyzer_paths
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.errors = []
+
+        self.prefilters = [AnalyzerPrefilter.for_analyzer(analyzer) for analyzer in self.analyzers]
+        self.groups = []
+        groups_by_key = {}
+        for ndx, prefilter in enumerate(self.prefilters):
+            key = prefilter.key()
+            if key not in groups_by_key:
+                groups_by_key[key] = len(self.groups)
+                self.groups.append((prefilter, []))
+            self.groups[groups_by_key[key]][1].append(ndx)
+
+    def conditions(self):
+        """ One (sql, params, needs_body) per analyzer group, for Db.read_responses_for_analysis """
+        conditions = []
+        for prefilter, members in self.groups:
+            sql, params = prefilter.sql_condition()
+            conditions.append((sql, params, prefilter.needsBody))
+        return conditions
+
+    def select(self, responseItems, group_matches):
+        """ Indexes of the analyzers to run on the response, given a match flag per group """
+        responseBody = responseItems[ResponsesTable.RES_DATA]
+        selected = []
+        for (prefilter, members), matched in zip(self.groups, group_matches):
+            if matched:
+                selected.extend(ndx for ndx in members if self.prefilters[ndx].accepts_body(responseBody))
+        return tuple(sorted(selected))
+
+    def analyzer_specs(self):
+        specs = []
+        for analyzer in self.analyzers:
+            configuration = getattr(analyzer, 'currentconfiguration', None)
+            specs.append((type(analyzer).__module__, type(analyzer).__name__, configuration))
+        return specs
+
+    def batches(self, response_items):
+        batch = []
+        for item in response_items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self, response_items):
+        """ Analyze (response items, analyzer indexes) pairs, yielding (analyzer, Id, url, resultset) for every page result """
+        specs = self.analyzer_specs()
+        try:
+            # spawn rather than fork, the parent is a threaded Qt application
+            pool = multiprocessing.get_context('spawn').Pool(self.processes, _init_worker, (self.analyzer_paths, specs))
+        except (OSError, ImportError, ValueError) as error:
+            self.errors.append('analysis worker processes unavailable, analyzing in process: %s' % (error))
+            pool = None
+
+        if pool is None:
+            worker = AnalysisWorker(self.analyzer_paths, specs)
+            for batch in self.batches(response_items):
+                for item in self.merge(worker.analyze_batch(batch)):
+                    yield item
+            return
+
+        try:
+            outstanding = deque()
+            for batch in self.batches(response_items):
+                outstanding.append(pool.apply_async(_analyze_batch, (batch,)))
+                # bound the number of decoded responses held in memory
+                if len(outstanding) >= 2 * self.processes:
+                    for item in self.merge(outstanding.popleft().get()):
+                        yield item
+            while outstanding:
+                for item in self.merge(outstanding.popleft().get()):
+                    yield item
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    def merge(self, batch_output):
+        batch_results, errors = batch_output
+        self.errors.extend(errors)
+        for analyzer, (pages, overall, state) in zip(self.analyzers, batch_results):
+            results = analyzer.getResults()
+            for context, resultset in overall.items():
+                for result in resultset.results:
+                    results.addCustomOverallResult(result, context)
+            if state is not None:
+                analyzer.mergeAnalysisState(state)
+            for Id, url, resultset in pages:
+                yield analyzer, Id, url, resultset
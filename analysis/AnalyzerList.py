@@ -24,73 +24,175 @@
 #
 
 import pkgutil
-import inspect
+import importlib
+import hashlib
+import json
 import sys
 import os
-import imp
+from PyQt4.QtCore import QMutex
 from .AbstractAnalyzer import AbstractAnalyzer
 
+REGISTRY_FILENAME = 'analyzer_registry.json'
+
+# shared by every AnalyzerList in the process
+registryLock = QMutex()
+registry = None
+loadedStamps = {}
+
 class AnalyzerList():
+    """
+    Finds analyzers through a registry of the analyzer modules, kept in the
+    user data directory.  Each module is recorded with its file's mtime, size
+    and hash and the analyzer classes it defines, so a module is only
+    scanned again when its file changes and only reloaded when it changed
+    since this process loaded it.
+    """
 
     def __init__(self, framework):
         self.framework = framework
         self.analyzerlist = None
 
     def find_analyzers(self):
+        """Returns a list of all analyzer class objects found in the analyzer paths"""
+        original_sys_path = self.add_analyzer_paths()
+        try:
+            analyzerclasses = []
+            for modname, classname, defaultenabled in self.registered_analyzers():
+                analyzerclass = self.load_analyzer_class(modname, classname)
+                if analyzerclass is not None:
+                    analyzerclasses.append(analyzerclass)
+            return analyzerclasses
+        finally:
+            sys.path = original_sys_path[:]
+
+    def add_analyzer_paths(self):
         # find analyzers based on mangled search path
         original_sys_path = sys.path[:]
+        for p in self.framework.get_analyzer_paths():
+            if p not in sys.path:
+                sys.path.insert(0, p)
+            parentpath = os.path.dirname(p)
+            if parentpath not in sys.path:
+                sys.path.insert(0, parentpath)
+        return original_sys_path
+
+    def registered_analyzers(self):
+        """Returns (module name, class name, enabled by default) for every analyzer, updating the registry for changed modules"""
+        global registry
+        registryLock.lock()
         try:
-            analyzer_paths = self.framework.get_analyzer_paths()
-            for p in analyzer_paths:
-                if p not in sys.path:
-                    sys.path.insert(0, p)
-                parentpath = os.path.dirname(p)
-                if parentpath not in sys.path:
-                    sys.path.insert(0, parentpath)
-            return self.import_analyzers(analyzer_paths)
+            if registry is None:
+                registry = self.read_registry()
+            analyzers = []
+            modified = False
+            for importer, modname, ispkg in pkgutil.walk_packages(self.framework.get_analyzer_paths(), prefix='analyzers.'):
+                filename = self.module_filename(importer, modname)
+                entry = registry.get(modname)
+                if not self.is_current(entry, filename):
+                    modified = True
+                    entry = self.scan_module(modname, filename)
+                    if entry is None:
+                        registry.pop(modname, None)
+                        continue
+                    registry[modname] = entry
+                for classname, defaultenabled in entry['classes']:
+                    analyzers.append((modname, classname, defaultenabled))
+            if modified:
+                self.write_registry(registry)
+            return analyzers
         finally:
-            sys.path = original_sys_path[:]
-        
-    def import_analyzers(self, analyzer_paths):
-        """Returns a list of all analyzer class objects found in the analyzers folder"""
-        #Import all submodles of analyzers
-        analyzerclasses=[]
-        
-        #Walk the tree of packages and subpackages, importing each.
-        #print 'Current Modules: %s'%sys.modules
-        for importer, modname, ispkg in pkgutil.walk_packages(analyzer_paths, prefix='analyzers.'):
-            # print "Found submodule %s (is a package: %s)" % (modname, ispkg)
+            registryLock.unlock()
 
-            try:
-                #print 'attempting to reload %s'%modname
-                module=imp.reload(sys.modules[modname])
-                #print 'reloaded %s'%module
-            except KeyError as e:
-                module = __import__(modname, fromlist="junklist")
-                #print 'first time loaded %s'%module
-            except ImportError as e:
-                print('IMPORT ERROR ON modname')
-                print(e)
-            
-            #print "Imported", module
-            classmembers = inspect.getmembers(module, inspect.isclass)
-            #print classmembers
-            #classmembers now has a list of tuples ( (classname, classobject), ...)
-            
-            #Pull out useful class objects into a new list for use later
-            #Unfortunately our relative import of AbstractAnalyzer shows up, so filter it out.
-            #TODO: Any better way to make AbstractAnalyzer not show up?  Seems like other imports could also show.
-            for c in classmembers:
-                if c[0] != 'AbstractAnalyzer':
-                    try: 
-                        clazz = c[1]()
-                        if isinstance(clazz, AbstractAnalyzer):
-                            analyzerclasses.append(c[1])
-                    except TypeError:
-                        pass
-        # print 'Final List of Analyzers: %s'%(analyzerclasses,)
-        
-        return analyzerclasses
+    def module_filename(self, importer, modname):
+        try:
+            spec = importer.find_spec(modname)
+        except (AttributeError, ImportError):
+            return None
+        if spec is None:
+            return None
+        return spec.origin
+
+    def file_stamp(self, filename):
+        try:
+            st = os.stat(filename)
+        except (TypeError, OSError):
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def file_hash(self, filename):
+        with open(filename, 'rb') as fh:
+            return hashlib.sha1(fh.read()).hexdigest()
+
+    def is_current(self, entry, filename):
+        if entry is None or entry.get('filename') != filename:
+            return False
+        stamp = self.file_stamp(filename)
+        if stamp is None:
+            return False
+        if list(stamp) == entry['stamp']:
+            return True
+        # touched but not changed, such as by a checkout
+        try:
+            if self.file_hash(filename) != entry['sha1']:
+                return False
+        except IOError:
+            return False
+        entry['stamp'] = list(stamp)
+        return True
+
+    def scan_module(self, modname, filename):
+        """Import the module and record the analyzer classes it defines"""
+        try:
+            module = self.load_module(modname, filename)
+            sha1 = self.file_hash(filename)
+        except Exception as e:
+            print(('IMPORT ERROR ON %s' % (modname)))
+            print(e)
+            return None
+        classes = []
+        for name in sorted(vars(module).keys()):
+            clazz = getattr(module, name)
+            if isinstance(clazz, type) and clazz is not AbstractAnalyzer and issubclass(clazz, AbstractAnalyzer) and clazz.__module__ == modname:
+                try:
+                    classes.append([name, bool(clazz().defaultEnabled())])
+                except TypeError:
+                    pass
+        return {'filename' : filename, 'stamp' : list(self.file_stamp(filename)), 'sha1' : sha1, 'classes' : classes}
+
+    def load_module(self, modname, filename):
+        """Import the module, or reload it if its file changed since it was loaded"""
+        stamp = self.file_stamp(filename)
+        module = sys.modules.get(modname)
+        if module is None:
+            module = importlib.import_module(modname)
+        elif loadedStamps.get(modname) != stamp:
+            module = importlib.reload(module)
+        loadedStamps[modname] = stamp
+        return module
+
+    def load_analyzer_class(self, modname, classname):
+        try:
+            return getattr(self.load_module(modname, registry[modname]['filename']), classname)
+        except Exception as e:
+            print(('IMPORT ERROR ON %s' % (modname)))
+            print(e)
+            return None
+
+    def read_registry(self):
+        try:
+            with open(os.path.join(self.framework.get_user_data_dir(), REGISTRY_FILENAME), 'r') as fh:
+                return json.load(fh)
+        except (IOError, ValueError):
+            return {}
+
+    def write_registry(self, registry):
+        filename = os.path.join(self.framework.get_user_data_dir(), REGISTRY_FILENAME)
+        try:
+            with open(filename + '.tmp', 'w') as fh:
+                json.dump(registry, fh, indent=1, sort_keys=True)
+            os.replace(filename + '.tmp', filename)
+        except (IOError, OSError) as e:
+            print(('unable to save analyzer registry: %s' % (e)))
 
     def instantiate_analyzers(self, analyzerclasses=None, reset=True, useallanalyzers=False):
         """Find all analyzers and initialize objects for them if not already existing.
@@ -99,18 +201,38 @@ class AnalyzerList():
            If reset==True, dump existing analyzers and recreate"""
         
         if self.analyzerlist==None or reset:
-            analyzerstoinstantiate=self.find_analyzers() if analyzerclasses is None else analyzerclasses
+            # the settings of every analyzer, read once instead of per analyzer
+            enabledsettings = self.framework.get_config_values('ANALYSISENABLED', bool)
+            configurations = self.framework.get_config_values('ANALYSIS')
             self.analyzerlist=list()
-            for analyzerclass in analyzerstoinstantiate:  #analyzerlist=[x() for x in ]
-                analyzerinstance=analyzerclass()
-                analyzerinstance.isenabled = self.framework.get_config_value('ANALYSISENABLED',str(analyzerinstance.__class__), bool, analyzerinstance.defaultEnabled())
-                if analyzerinstance.isenabled or useallanalyzers:
-                    self.analyzerlist.append(analyzerinstance)
-                    config=self.framework.get_config_value('ANALYSIS',str(analyzerinstance.__class__))
-                    if config:
-                        analyzerinstance.setConfiguration(config)
-                
+            original_sys_path = self.add_analyzer_paths()
+            try:
+                if analyzerclasses is None:
+                    # disabled analyzers are not even imported
+                    candidates = [(modname, classname, "<class '%s.%s'>" % (modname, classname), defaultenabled)
+                                  for modname, classname, defaultenabled in self.registered_analyzers()]
+                else:
+                    candidates = [(None, analyzerclass, str(analyzerclass), None) for analyzerclass in analyzerclasses]
+                for modname, analyzerclass, key, defaultenabled in candidates:
+                    if defaultenabled is None:
+                        analyzerinstance = analyzerclass()
+                        defaultenabled = analyzerinstance.defaultEnabled()
+                    else:
+                        analyzerinstance = None
+                    isenabled = enabledsettings.get(key, defaultenabled)
+                    if isenabled or useallanalyzers:
+                        if analyzerinstance is None:
+                            loadedclass = self.load_analyzer_class(modname, analyzerclass)
+                            if loadedclass is None:
+                                continue
+                            analyzerinstance = loadedclass()
+                        analyzerinstance.isenabled = isenabled
+                        self.analyzerlist.append(analyzerinstance)
+                        config = configurations.get(key)
+                        if config:
+                            analyzerinstance.setConfiguration(config)
+            finally:
+                sys.path = original_sys_path[:]
 
     def __iter__(self):
         return iter(self.analyzerlist)
-
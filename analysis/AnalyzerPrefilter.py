@@ -0,0 +1,85 @@
+#
+# Prefilters declared by analyzers, applied when responses are read for analysis
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+# the content type RequestResponse assumes when a response has none
+DEFAULT_CONTENT_TYPE = 'text/html'
+
+class AnalyzerPrefilter(object):
+    """
+    The responses an analyzer can use, built from the dictionary returned by
+    its getPrefilter().  Content types and status ranges become a predicate
+    over the responses table, bodies are only read when the analyzer needs
+    them, and the required literal is checked before the response is handed
+    to the analyzer.
+    """
+
+    def __init__(self, prefilter = None):
+        prefilter = prefilter or {}
+        self.contentTypes = tuple(sorted(set(str(pattern).lower() for pattern in prefilter.get('contentTypes') or ())))
+        statuses = set()
+        for status in prefilter.get('statuses') or ():
+            if isinstance(status, (tuple, list)):
+                low, high = status
+            else:
+                low = high = status
+            statuses.add((int(low), int(high)))
+        self.statuses = tuple(sorted(statuses))
+        contains = prefilter.get('contains')
+        if isinstance(contains, str):
+            contains = contains.encode('utf-8')
+        self.contains = contains or None
+        # a required literal is looked for in the body, so it has to be read
+        self.needsBody = bool(prefilter.get('needsBody', True)) or self.contains is not None
+
+    @classmethod
+    def for_analyzer(cls, analyzer):
+        getPrefilter = getattr(analyzer, 'getPrefilter', None)
+        if getPrefilter is None:
+            return cls()
+        return cls(getPrefilter())
+
+    def key(self):
+        """ Analyzers with equal keys select the same responses and are read together """
+        return (self.contentTypes, self.statuses, self.needsBody)
+
+    def sql_condition(self):
+        """ Returns (sql, params) for a predicate over the responses table """
+        clauses, params = [], []
+        if self.contentTypes:
+            alternatives = []
+            for pattern in self.contentTypes:
+                alternatives.append("ResContentType LIKE ? ESCAPE '\\'")
+                params.append('%%%s%%' % (pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')))
+            if any(pattern in DEFAULT_CONTENT_TYPE for pattern in self.contentTypes):
+                alternatives.append("IFNULL(ResContentType, '') = ''")
+            clauses.append('(%s)' % ' OR '.join(alternatives))
+        if self.statuses:
+            alternatives = []
+            for low, high in self.statuses:
+                alternatives.append('Status BETWEEN ? AND ?')
+                params.extend([low, high])
+            clauses.append('(%s)' % ' OR '.join(alternatives))
+        if not clauses:
+            return '1', []
+        return ' AND '.join(clauses), params
+
+    def accepts_body(self, responseBody):
+        return self.contains is None or self.contains in responseBody
@@ -33,6 +33,9 @@ class ASPNETApplicationServerErrors(AbstractAnalyzer):
         self.applications = {}
         self.all_urls = {}
     
+    def getPrefilter(self):
+        return {'contains' : b"Server Error in '"}
+
     def analyzeTransaction(self, target, results):
         response_body =target.responseBody
         url = target.responseUrl
@@ -49,6 +52,25 @@ class ASPNETApplicationServerErrors(AbstractAnalyzer):
                 if len(url) <= len(self.applications[appname]):
                     self.applications[appname] = url
                     
+    def getAnalysisState(self):
+        state = (self.applications, self.all_urls)
+        self.applications = {}
+        self.all_urls = {}
+        return state
+
+    def mergeAnalysisState(self,state):
+        applications, all_urls = state
+        for appname, url in applications.items():
+            if appname not in self.applications:
+                self.applications[appname] = url
+                self.all_urls[appname] = all_urls[appname]
+            else:
+                for other_url in all_urls[appname]:
+                    if not other_url in self.all_urls[appname]:
+                        self.all_urls[appname].append(other_url)
+                if len(url) <= len(self.applications[appname]):
+                    self.applications[appname] = url
+
     def postanalysis(self,results):
         for appname, url in self.applications.items():
             results.addOverallResult(self.friendlyname,
@@ -46,7 +46,14 @@ class FindInsecureCookies(AbstractAnalyzer):
     def __init__(self):
         self.desc="Identifies Cookies that are set using insecure parameters."
         self.friendlyname="Find Insecure Cookies"
+        self.notSecure = {}
+        self.notHttpOnly = {}
+        self.notPathRestricted = {}
+        self.cookies = {}
     
+    def getPrefilter(self):
+        return {'needsBody' : False}
+
     def analyzeTransaction(self, target, results):
         responseHeaders=target.responseHeaders
         host = target.requestHost
@@ -131,6 +138,26 @@ class FindInsecureCookies(AbstractAnalyzer):
                                 span=None,
                                 highlightdata=found.group(0))
 
+    def getAnalysisState(self):
+        state = (self.notSecure, self.notHttpOnly, self.notPathRestricted, self.cookies)
+        self.notSecure = {}
+        self.notHttpOnly = {}
+        self.notPathRestricted = {}
+        self.cookies = {}
+        return state
+
+    def mergeAnalysisState(self,state):
+        notSecure, notHttpOnly, notPathRestricted, cookies = state
+        for mine, other in ((self.notSecure, notSecure), (self.notHttpOnly, notHttpOnly), (self.notPathRestricted, notPathRestricted)):
+            for host, names in other.items():
+                counts = mine.setdefault(host, {})
+                for name, count in names.items():
+                    counts[name] = counts.get(name, 0) + count
+        for host, names in cookies.items():
+            values = self.cookies.setdefault(host, {})
+            for name, valuelist in names.items():
+                values.setdefault(name, []).extend(valuelist)
+
     def postanalysis(self,results):
         outputSecureValue = ""
         for h in self.notSecure.keys():
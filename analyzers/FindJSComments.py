@@ -34,6 +34,9 @@ class FindJSComments(AbstractAnalyzer):
         self.desc="Searches for JavaScript Comments."
         self.friendlyname="Find JavaScript Comments"  
     
+    def getPrefilter(self):
+        return {'contentTypes' : ['html', 'javascript', 'css']}
+
     def analyzeTransaction(self, target, results):
         
         if self.ContentTypeRegex.search(target.responseContentType):
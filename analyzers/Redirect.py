@@ -36,6 +36,9 @@ class Redirect(AbstractAnalyzer):
         self.desc="Analyzes HTTP Redirects for abnormalities"
         self.friendlyname="Redirect Analyzer"
     
+    def getPrefilter(self):
+        return {'statuses' : [302]}
+
     def analyzeTransaction(self, target, results):
         status = target.responseStatus
         host = target.requestHost
@@ -32,6 +32,9 @@ class ResponseHeaderServerInstances(AbstractAnalyzer):
     def preanalysis(self):
         pass
 
+    def getPrefilter(self):
+        return {'needsBody' : False}
+
     def analyzeTransaction(self, target, results):
 
         responseHeaders = target.responseHeaders
@@ -46,6 +49,20 @@ class ResponseHeaderServerInstances(AbstractAnalyzer):
                     if url not in self.unique_server_headers[server_value]:
                         self.unique_server_headers[server_value].append(url)
 
+    def getAnalysisState(self):
+        state = self.unique_server_headers
+        self.unique_server_headers = {}
+        return state
+
+    def mergeAnalysisState(self,state):
+        for server_value, urls in state.items():
+            if server_value not in self.unique_server_headers:
+                self.unique_server_headers[server_value] = urls
+            else:
+                for url in urls:
+                    if url not in self.unique_server_headers[server_value]:
+                        self.unique_server_headers[server_value].append(url)
+
     def postanalysis(self,results):
         keys = list(self.unique_server_headers.keys())
         keys.sort()
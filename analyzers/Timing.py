@@ -39,7 +39,11 @@ class Timing(AbstractAnalyzer):
     def __init__(self):
         self.desc="Request/Response Timing Analysis (Potential DoS finder)."
         self.friendlyname="Timing Analysis"
+        self.hosts = {}
     
+    def getPrefilter(self):
+        return {'needsBody' : False}
+
     def analyzeTransaction(self, target, results):
         responseheaders=target.responseHeaders
         url = target.responseUrl
@@ -122,6 +126,33 @@ class Timing(AbstractAnalyzer):
             if (elapsedtime > self.hosts[host][path]['max']):
                 self.hosts[host][path]['max'] = elapsedtime
                     
+    def getAnalysisState(self):
+        state = self.hosts
+        self.hosts = {}
+        return state
+
+    def mergeAnalysisState(self,state):
+        for host, hoststats in state.items():
+            if host not in self.hosts:
+                self.hosts[host] = hoststats
+                continue
+            mine = self.hosts[host]
+            for key, value in hoststats.items():
+                if key in ('count', 'times', 'total', 'min', 'max'):
+                    continue
+                if key not in mine:
+                    mine[key] = value
+                else:
+                    self.mergeTimes(mine[key], value)
+            self.mergeTimes(mine, hoststats)
+
+    def mergeTimes(self, mine, other):
+        mine['count'] += other['count']
+        mine['total'] += other['total']
+        mine['times'].extend(other['times'])
+        mine['min'] = min(mine['min'], other['min'])
+        mine['max'] = max(mine['max'], other['max'])
+
     def postanalysis(self,results):
         header = "<table border='1'><tr><td align='center' width=200><b>HOST</b></td><td align='center' width=100><b>REQUESTS</b></td><td align='center' width=100><b>MIN</b></td><td align='center' width=100><b>MAX</b></td><td align='center' width=100><b>AVE</b></td></tr>"
         tail = "</table>"
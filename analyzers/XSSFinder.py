@@ -31,6 +31,9 @@ class XSSFinder(AbstractAnalyzer):
         self.desc="Identification of successful XSS attacks."
         self.friendlyname="XSS Finder"
     
+    def getPrefilter(self):
+        return {'contains' : b'alert('}
+
     def analyzeTransaction(self, target, results):
         responseBody = target.responseBody
         rawRequest = target.rawRequest
@@ -36,22 +36,26 @@ class RegexFinder(AbstractAnalyzer):
         currconfig=self.getCurrentConfiguration()
         
         self.regex=dict(currconfig)
+
+        # compiled once here rather than for every response
+        self.compiledregex=[]
+        for main,sub in list(self.regex.items()):
+            for regexName,regexValue in list(sub.items()):
+                self.compiledregex.append((main,regexName,re.compile(regexValue.encode('utf-8'))))
         
     def analyzeTransaction(self, target, results):
         responseBody=target.responseBody
         
-        for main,sub in list(self.regex.items()):
-            for regexName,regexValue in list(sub.items()):
-                compiledRegex = re.compile(regexValue.encode('utf-8'))
-                for found in compiledRegex.finditer(responseBody):
-                    founddata=found.group(1)
-                    results.addPageResult(pageid=target.responseId, 
-                                  url=target.responseUrl,
-                                  type='Regex Found: %s - %s'%(main,regexName),
-                                  desc='A regex from the custom regex list was matched.',
-                                  data={'found':founddata},
-                                  span=found.span(),
-                                  highlightdata=founddata)
+        for main,regexName,compiledRegex in self.compiledregex:
+            for found in compiledRegex.finditer(responseBody):
+                founddata=found.group(1)
+                results.addPageResult(pageid=target.Id, 
+                              url=target.responseUrl,
+                              type='Regex Found: %s - %s'%(main,regexName),
+                              desc='A regex from the custom regex list was matched.',
+                              data={'found':founddata},
+                              span=found.span(),
+                              highlightdata=founddata)
                    
     def getDefaultConfiguration(self):
         return defaultconfig
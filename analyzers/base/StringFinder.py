@@ -21,6 +21,7 @@
 import re
 
 from analysis.AbstractAnalyzer import AbstractAnalyzer
+from utility.PatternMatcher import MultiStringMatcher
 
 class StringFinder(AbstractAnalyzer):
         
@@ -33,30 +34,34 @@ class StringFinder(AbstractAnalyzer):
         currconfig=self.getCurrentConfiguration()
         
         self.searchstrings=dict(currconfig)
+
+        # every configured string is matched in one pass over the response
+        self.searchlist=[]
+        for stringtype,stringlist in list(self.searchstrings.items()):
+            for ident,searchstring in list(stringlist.items()):
+                self.searchlist.append((stringtype,ident,searchstring.encode('utf-8')))
+        self.matcher=MultiStringMatcher([searchbytes for stringtype,ident,searchbytes in self.searchlist])
         
     def analyzeTransaction(self, target, results):
-        """TODO:  This is really slow.  Consider one of the following instead if it gets unbearable:
-            https://hkn.eecs.berkeley.edu/~dyoo/python/ahocorasick/
-            https://github.com/axiak/pyre2
-            http://code.google.com/p/esmre/
-        """
         
         responsedata=target.responseBody
+
+        found=self.matcher.first_matches(responsedata)
+        if not found:
+            return
         
-        for stringtype,stringlist in list(self.searchstrings.items()):
-            for ident,searchstring in list(stringlist.items()):
-                startindex=responsedata.find(searchstring.encode('utf-8'))
-       
-                if startindex > -1:
-                    endindex=startindex+len(searchstring)
-                    founddata=responsedata[startindex:endindex]
-                    results.addPageResult(pageid=target.responseId, 
-                                          url=target.responseUrl,
-                                          type='String Found: %s - %s'%(stringtype,ident),
-                                          desc='A string from the find strings list was matched.',
-                                          data={'found':founddata},
-                                          span=(startindex,endindex),
-                                          highlightdata=founddata)
+        for stringtype,ident,searchbytes in self.searchlist:
+            if searchbytes in found:
+                startindex=found[searchbytes]
+                endindex=startindex+len(searchbytes)
+                founddata=responsedata[startindex:endindex]
+                results.addPageResult(pageid=target.Id, 
+                                      url=target.responseUrl,
+                                      type='String Found: %s - %s'%(stringtype,ident),
+                                      desc='A string from the find strings list was matched.',
+                                      data={'found':founddata},
+                                      span=(startindex,endindex),
+                                      highlightdata=founddata)
                    
     def getDefaultConfiguration(self):
         
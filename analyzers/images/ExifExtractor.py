@@ -36,6 +36,9 @@ class ExifExtractor(AbstractAnalyzer):
         self.friendlyname="EXIF Extractor"
         #print "Loaded the ExifExtractor!"
     
+    def getPrefilter(self):
+        return {'contentTypes' : ['image/']}
+
     def analyzeTransaction(self, target, results):
         responseHeaders=target.responseHeaders
         for found in self.ContentTypeRegex.finditer(responseHeaders):
@@ -38,6 +38,9 @@ class GIFComments(AbstractAnalyzer):
         self.friendlyname="GIF Comment Analyzer"
         #print "Loaded the GCA!"
     
+    def getPrefilter(self):
+        return {'contentTypes' : ['image/']}
+
     def analyzeTransaction(self, target, results):
         responseHeaders=target.responseHeaders
         for found in self.ContentTypeRegex.finditer(responseHeaders):
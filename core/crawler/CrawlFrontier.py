@@ -0,0 +1,112 @@
+#
+# In memory record of what the spider has already retrieved or queued
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+
+from core.database.constants import SpiderQueueTable, SpiderPendingResponsesTable
+from core.database.database import normalize_url
+
+def frontier_key(method, url):
+    """ Signed 64-bit hash of the method and normalized url """
+    value = '%s %s' % (str(method).upper(), normalize_url(str(url)))
+    digest = hashlib.sha1(value.encode('utf-8', 'ignore')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+class CrawlFrontier(object):
+    """
+    Keeps hashed method and url keys of stored responses and of spider queue
+    items, and the spider pending responses, so that discovered links can be
+    checked without going to the database.  The database remains the record;
+    the sets are loaded once when it is attached and kept up to date as the
+    spider adds to it.  Callers serialize access with the spider lock.
+    """
+
+    def __init__(self):
+        self.Data = None
+        self.cursor = None
+        self.clear()
+
+    def clear(self):
+        self.responses = {}
+        self.html_responses = set()
+        self.last_response_id = 0
+        self.queued = set()
+        self.pending = set()
+
+    def attach(self, Data, cursor):
+        self.Data = Data
+        self.cursor = cursor
+        self.clear()
+        self.load_queue()
+        for row in self.Data.read_spider_pending_responses(self.cursor):
+            self.pending.add((int(row[SpiderPendingResponsesTable.RESPONSE_ID]), str(row[SpiderPendingResponsesTable.REQUEST_TYPE])))
+        self.refresh_responses()
+
+    def detach(self):
+        self.Data = None
+        self.cursor = None
+        self.clear()
+
+    def load_queue(self):
+        """ (Re)load queued keys, needed after queue items are cleared in the database """
+        self.queued = set()
+        for row in self.Data.get_spider_queue_items(self.cursor):
+            if 'D' != row[SpiderQueueTable.STATUS]:
+                url = str(row[SpiderQueueTable.URL])
+                if row[SpiderQueueTable.QUERY_PARAMS]:
+                    url += '?' + str(row[SpiderQueueTable.QUERY_PARAMS])
+                self.queued.add(frontier_key(row[SpiderQueueTable.METHOD], url))
+
+    def refresh_responses(self):
+        """ Add responses stored since the last refresh, from the spider or anywhere else """
+        max_id = self.Data.read_max_response_id(self.cursor)
+        if max_id <= self.last_response_id:
+            return
+        for Id, url, method, content_type in self.Data.read_responses_url_info(self.cursor, self.last_response_id, max_id):
+            key = frontier_key(method or '', url or '')
+            if key not in self.responses:
+                # the first response for a url is the one reused
+                self.responses[key] = Id
+                if content_type and 'html' in content_type.lower():
+                    self.html_responses.add(Id)
+        self.last_response_id = max_id
+
+    def find_response(self, key):
+        """ Returns (response id, is html) of a stored response, or (None, False) """
+        Id = self.responses.get(key)
+        if Id is None:
+            return None, False
+        return Id, Id in self.html_responses
+
+    def is_queued(self, key):
+        return key in self.queued
+
+    def add_queued(self, method, url):
+        self.queued.add(frontier_key(method, url))
+
+    def is_pending(self, response_id, request_type):
+        return (response_id, request_type) in self.pending
+
+    def add_pending(self, response_id, request_type):
+        self.pending.add((response_id, request_type))
+
+    def reset_pending(self):
+        self.pending = set()
@@ -0,0 +1,116 @@
+#
+# Clusters of near-duplicate pages found by the spider
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+from urllib import parse as urlparse
+
+from core.database.constants import SpiderInternalStateTable
+from lib.extractors.HtmlExtractor import SIMHASH_BITS
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+class PageCluster(object):
+    def __init__(self, simhash, url, count = 0):
+        self.simhash = simhash
+        self.url = url
+        self.count = count
+
+    @property
+    def key(self):
+        return '%016x' % (self.simhash)
+
+class PageClusters(object):
+    """
+    Groups spidered pages whose contextual simhash (HtmlParseResults) is within
+    max_distance bits of the first page of a cluster.  Each url shape (host,
+    path with digits masked, query parameter names) is mapped to the cluster
+    of the last page seen with that shape, so links can be judged before they
+    are requested.  Callers serialize access with the spider lock.
+    """
+
+    CATEGORY = 'Page Clusters'
+
+    re_digits = re.compile(r'\d+')
+
+    def __init__(self, max_distance = 3):
+        self.max_distance = max_distance
+        # pages within max_distance bits agree exactly in at least one of max_distance+1 bands
+        self.bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.bands
+        self.clear()
+
+    def clear(self):
+        self.clusters = {}
+        self.band_index = {}
+        self.shape_clusters = {}
+        self.seen_urls = set()
+
+    def load(self, rows):
+        """ Restore clusters from spider internal state rows """
+        self.clear()
+        for row in rows:
+            cluster = PageCluster(int(row[SpiderInternalStateTable.STATE_KEY], 16),
+                                  str(row[SpiderInternalStateTable.STATE_VALUE] or ''),
+                                  int(row[SpiderInternalStateTable.STATE_COUNT] or 0))
+            self.add_cluster(cluster)
+
+    def band_keys(self, simhash):
+        mask = (1 << self.band_bits) - 1
+        return [(band, (simhash >> (band * self.band_bits)) & mask) for band in range(self.bands)]
+
+    def add_cluster(self, cluster):
+        self.clusters[cluster.simhash] = cluster
+        for band_key in self.band_keys(cluster.simhash):
+            self.band_index.setdefault(band_key, []).append(cluster)
+
+    def find(self, simhash):
+        """ Returns the closest cluster within max_distance, or None """
+        found, found_distance = None, self.max_distance + 1
+        for band_key in self.band_keys(simhash):
+            for cluster in self.band_index.get(band_key, ()):
+                distance = hamming_distance(simhash, cluster.simhash)
+                if distance < found_distance:
+                    found, found_distance = cluster, distance
+        return found
+
+    def url_shape(self, url):
+        splitted = urlparse.urlsplit(url)
+        names = sorted(set(name for name, value in urlparse.parse_qsl(splitted.query, True)))
+        return (splitted.netloc.lower(), self.re_digits.sub('0', splitted.path or '/'), tuple(names))
+
+    def add_page(self, url, simhash):
+        """ Count a page; returns (cluster, is new cluster), or (None, False) if it was not counted """
+        if not simhash or url in self.seen_urls:
+            return None, False
+        self.seen_urls.add(url)
+        cluster = self.find(simhash)
+        is_new = cluster is None
+        if is_new:
+            cluster = PageCluster(simhash, url)
+            self.add_cluster(cluster)
+        cluster.count += 1
+        self.shape_clusters[self.url_shape(url)] = cluster
+        return cluster, is_new
+
+    def cluster_for_url(self, url):
+        """ The cluster pages shaped like url fell into, or None """
+        return self.shape_clusters.get(self.url_shape(url))
@@ -70,6 +70,8 @@ class SpiderConfig(QObject):
         self.max_link_depth = int(self.config_value_or_default(obj, 'max_link_depth', 6))
         self.max_children = int(self.config_value_or_default(obj, 'max_children', 256))
         self.max_unique_parameters = int(self.config_value_or_default(obj, 'max_unique_parameters', 16))
+        self.max_host_concurrency = int(self.config_value_or_default(obj, 'max_host_concurrency', 2))
+        self.host_request_delay = int(self.config_value_or_default(obj, 'host_request_delay', 0))
         self.redundant_content_limit = int(self.config_value_or_default(obj, 'redundant_content_limit', 128))
         self.redundant_structure_limit = int(self.config_value_or_default(obj, 'redundant_structure_limit', 256))
         self.media_extensions = str(self.config_value_or_default(obj, 'media_extensions', self.default_media_extensions))
@@ -0,0 +1,176 @@
+#
+# Per host scheduling of spider requests
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import heapq
+import itertools
+import re
+import time
+from collections import deque
+from urllib import parse as urlparse
+
+from core.database.constants import SpiderQueueTable
+
+class HostQueue(object):
+    def __init__(self):
+        self.heap = []
+        self.inflight = 0
+        self.next_time = 0.0
+        self.shapes = {}
+        self.path_parameters = {}
+        self.directory_children = {}
+
+class SpiderScheduler(object):
+    """
+    Spider queue items are kept in a priority queue per host.  Hosts take
+    turns, each with its own limit on requests in flight and minimum delay
+    between requests, so a slow host only holds up its own requests.  Within
+    a host, shallower items come first, then those leading into the smallest
+    cluster of near-duplicate pages (PageClusters), then those whose path and
+    parameter shape has been seen least, then form submissions.
+
+    The SpiderConfig limits on links, children per directory and unique
+    parameter sets per path are applied as items are added and dispatched,
+    and redundant_structure_limit caps the pages taken from one cluster.
+    """
+
+    re_digits = re.compile(r'\d+')
+
+    def __init__(self, spiderConfig, max_concurrency = 10, clock = time.monotonic, clusters = None):
+        self.spiderConfig = spiderConfig
+        self.clusters = clusters
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self.counter = itertools.count()
+        self.clear()
+
+    def clear(self):
+        self.hosts = {}
+        self.ready_hosts = deque()
+        self.inflight = {}
+        self.count = 0
+        self.dispatched = 0
+
+    def start(self):
+        """ Begin a spider run; max_links counts requests dispatched from here """
+        self.dispatched = 0
+
+    def __len__(self):
+        return self.count
+
+    def host_key(self, url):
+        return urlparse.urlsplit(url).netloc.lower()
+
+    def config_value(self, name, default):
+        return getattr(self.spiderConfig, name, default)
+
+    def add(self, data_item):
+        """ Queue a spider queue item; returns False if a SpiderConfig limit excludes it """
+        method = str(data_item[SpiderQueueTable.METHOD]).upper()
+        url = str(data_item[SpiderQueueTable.URL])
+        splitted = urlparse.urlsplit(url)
+        host = splitted.netloc.lower()
+        path = splitted.path or '/'
+
+        names = set(name for name, value in urlparse.parse_qsl(str(data_item[SpiderQueueTable.QUERY_PARAMS] or ''), True))
+        from_form = bool(data_item[SpiderQueueTable.ENCODING_TYPE] or data_item[SpiderQueueTable.FORM_PARAMS] or 'GET' != method)
+        if data_item[SpiderQueueTable.FORM_PARAMS]:
+            names.update(name for name, value in urlparse.parse_qsl(str(data_item[SpiderQueueTable.FORM_PARAMS]), True))
+        parameters = tuple(sorted(names))
+
+        cluster_pages = 0
+        if self.clusters is not None:
+            query = str(data_item[SpiderQueueTable.QUERY_PARAMS] or '')
+            cluster = self.clusters.cluster_for_url(url + '?' + query if query else url)
+            if cluster is not None:
+                cluster_pages = cluster.count
+                if cluster_pages >= self.config_value('redundant_structure_limit', 256):
+                    return False
+
+        queue = self.hosts.get(host)
+        if queue is None:
+            queue = self.hosts[host] = HostQueue()
+
+        parameter_sets = queue.path_parameters.setdefault(path, set())
+        if parameters not in parameter_sets:
+            if len(parameter_sets) >= self.config_value('max_unique_parameters', 16):
+                return False
+            parameter_sets.add(parameters)
+
+        directory = path[:path.rfind('/')+1]
+        children = queue.directory_children.setdefault(directory, set())
+        if path not in children:
+            if len(children) >= self.config_value('max_children', 256):
+                return False
+            children.add(path)
+
+        shape = (method, self.re_digits.sub('0', path), parameters)
+        seen = queue.shapes.get(shape, 0)
+        queue.shapes[shape] = seen + 1
+
+        depth = int(data_item[SpiderQueueTable.DEPTH] or 0)
+        priority = (depth, cluster_pages, seen, 0 if from_form else 1, next(self.counter))
+        if not queue.heap:
+            self.ready_hosts.append(host)
+        heapq.heappush(queue.heap, (priority, data_item))
+        self.count += 1
+        return True
+
+    def next_request(self):
+        """ Returns the next item that may be sent now, or None """
+        if len(self.inflight) >= self.max_concurrency:
+            return None
+        if self.dispatched >= self.config_value('max_links', 8192):
+            return None
+        now = self.clock()
+        max_host_concurrency = self.config_value('max_host_concurrency', 2)
+        for i in range(len(self.ready_hosts)):
+            host = self.ready_hosts.popleft()
+            queue = self.hosts[host]
+            if queue.inflight < max_host_concurrency and queue.next_time <= now:
+                priority, data_item = heapq.heappop(queue.heap)
+                queue.inflight += 1
+                queue.next_time = now + self.config_value('host_request_delay', 0) / 1000.0
+                if queue.heap:
+                    self.ready_hosts.append(host)
+                self.inflight[id(data_item)] = host
+                self.count -= 1
+                self.dispatched += 1
+                return data_item
+            self.ready_hosts.append(host)
+        return None
+
+    def finished(self, data_item):
+        host = self.inflight.pop(id(data_item), None)
+        if host is not None:
+            self.hosts[host].inflight -= 1
+
+    def next_delay(self):
+        """ Seconds until a host held back only by its request delay may send, or None """
+        if not self.count or len(self.inflight) >= self.max_concurrency:
+            return None
+        if self.dispatched >= self.config_value('max_links', 8192):
+            return None
+        now = self.clock()
+        max_host_concurrency = self.config_value('max_host_concurrency', 2)
+        delays = [self.hosts[host].next_time - now for host in self.ready_hosts if self.hosts[host].inflight < max_host_concurrency]
+        if not delays:
+            return None
+        return max(0.0, min(delays))
@@ -77,6 +77,39 @@ class DataTableDataModel(QAbstractTableModel):
         self.endRemoveRows()
         return data
 
+    def find_data(self, data):
+        """ Row number holding data, or None """
+        for row, item in enumerate(self.rows):
+            if item is data:
+                return row
+        return None
+
+    def remove_data(self, data):
+        """ Remove the row holding data; returns False if it isn't in the model """
+        row = self.find_data(data)
+        if row is None:
+            return False
+        modelIndex = QModelIndex()
+        self.beginRemoveRows(modelIndex, row, row)
+        del self.rows[row]
+        if 0 != self._sort_column:
+            del self._sort_keys[row]
+        self.endRemoveRows()
+        return True
+
+    def update_data(self, data):
+        """ Show changes made in place to the row holding data; returns False if it isn't in the model """
+        row = self.find_data(data)
+        if row is None:
+            return False
+        if 0 != self._sort_column and self._sort_keys[row] != data[self._sort_column]:
+            # sort key changed, so move the row
+            self.remove_data(data)
+            self.append_data([data])
+        else:
+            self.emit(SIGNAL('dataChanged(QModelIndex,QModelIndex)'), self.index(row, 0), self.index(row, self.column_count - 1))
+        return True
+
     def append_data(self, new_rows):
         size = len(new_rows)
         if 0 == size:
@@ -0,0 +1,132 @@
+#
+# Cache of html and javascript extraction results keyed on the extracted content
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from PyQt4.QtCore import QObject, QMutex
+import hashlib
+import json
+
+from core.data.LRUCache import LRUCache
+from lib.extractors.HtmlExtractor import HtmlParseResults
+from lib.extractors.JSExtractor import JSParseResults
+
+# bump when extractor output changes, so results extracted by older code are not reused
+EXTRACTOR_VERSION = 2
+
+class ExtractionCache(QObject):
+    """
+    Extraction results for a body are the same every time it is parsed with the
+    same base url and charset, so they are kept by content hash in memory and
+    in the project database.  Each lookup hands back new result objects, since
+    callers add to them.
+    """
+
+    RESULT_CLASSES = {
+        'html' : HtmlParseResults,
+        'javascript' : JSParseResults,
+        }
+
+    def __init__(self, framework, parent = None, maxsize = 1024, maxbytes = 32*1024*1024):
+        QObject.__init__(self, parent)
+        self.framework = framework
+        self.qlock = QMutex()
+        self.cache = LRUCache(maxsize, maxbytes, len)
+        self.Data = None
+        self.framework.subscribe_database_events(self.db_attach, self.db_detach)
+
+    def db_attach(self):
+        self.Data = self.framework.getDB()
+        self.clear()
+
+    def db_detach(self):
+        self.Data = None
+        self.clear()
+
+    def clear(self):
+        self.qlock.lock()
+        try:
+            self.cache.clear()
+        finally:
+            self.qlock.unlock()
+
+    def make_key(self, content_type, content_hash, baseurl, charset):
+        key = '%s\n%d\n%s\n%s\n%s' % (content_type, EXTRACTOR_VERSION, content_hash, baseurl, charset)
+        return hashlib.sha256(key.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def process(self, content_type, content, content_hash, baseurl, charset, extract):
+        """
+        Return results of content_type ('html' or 'javascript') for the content
+        with content_hash, calling extract() to produce them when not cached.
+        """
+        if not content_hash:
+            raw = content if isinstance(content, bytes) else content.encode('utf-8', 'surrogatepass')
+            content_hash = hashlib.sha256(raw).hexdigest()
+        cachekey = self.make_key(content_type, content_hash, baseurl, charset)
+
+        state = self.lookup(cachekey)
+        if state is not None:
+            results = self.RESULT_CLASSES[content_type](baseurl, charset)
+            results.set_state(json.loads(state.decode('ascii')))
+            return results
+
+        results = extract()
+        state = json.dumps(results.get_state()).encode('ascii')
+        self.store(cachekey, content_hash, state)
+        return results
+
+    def lookup(self, cachekey):
+        self.qlock.lock()
+        try:
+            if self.cache.has_key(cachekey):
+                return self.cache.getitem(cachekey)
+        finally:
+            self.qlock.unlock()
+
+        Data = self.Data
+        if Data is None:
+            return None
+        cursor = Data.allocate_thread_cursor()
+        try:
+            state = Data.read_extraction_cache(cursor, cachekey)
+        finally:
+            cursor.close()
+            Data.release_thread_cursor(cursor)
+        if state is not None:
+            self.remember(cachekey, state)
+        return state
+
+    def store(self, cachekey, content_hash, state):
+        self.remember(cachekey, state)
+        Data = self.Data
+        if Data is None:
+            return
+        cursor = Data.allocate_thread_cursor()
+        try:
+            Data.insert_extraction_cache(cursor, cachekey, content_hash, state)
+        finally:
+            cursor.close()
+            Data.release_thread_cursor(cursor)
+
+    def remember(self, cachekey, state):
+        self.qlock.lock()
+        try:
+            self.cache.setitem(cachekey, state)
+        finally:
+            self.qlock.unlock()
@@ -19,26 +19,59 @@
 # along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import collections
+
 class LRUCache():
-    def __init__(self, maxsize):
+    """
+    Least recently used cache holding at most maxsize entries and, when a
+    sizeof function is given, at most maxbytes of values as measured by it.
+    """
+    def __init__(self, maxsize, maxbytes = 0, sizeof = None):
         self.maxsize = maxsize
-        self.offset = 0
-        self.lru = []
-        [self.lru.append('') for i in range(0, maxsize)]
-        self.cache = {}
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.currentbytes = 0
+        self.cache = collections.OrderedDict()
+        self.sizes = {}
 
     def has_key(self, key):
         return key in self.cache
 
     def getitem(self, key):
-        return self.cache[key]
+        value = self.cache[key]
+        self.cache.move_to_end(key)
+        return value
+
+    def get(self, key, default = None):
+        if key in self.cache:
+            return self.getitem(key)
+        return default
 
     def setitem(self, key, value):
-        if key not in self.cache:
-            size = len(self.cache)
-            if size > self.maxsize:
-                k = self.lru[self.offset]
-                self.cache.pop(k)
-            self.lru[self.offset] = key
+        if key in self.cache:
+            self.remove(key)
+        size = 0
+        if self.sizeof is not None:
+            size = self.sizeof(value)
+            if self.maxbytes and size > self.maxbytes:
+                # would evict everything else and still not fit
+                return
         self.cache[key] = value
+        self.sizes[key] = size
+        self.currentbytes += size
+        while len(self.cache) > self.maxsize or (self.maxbytes and self.currentbytes > self.maxbytes):
+            oldest = next(iter(self.cache))
+            self.remove(oldest)
+
+    def remove(self, key):
+        if key in self.cache:
+            self.cache.pop(key)
+            self.currentbytes -= self.sizes.pop(key)
+
+    def clear(self):
+        self.cache.clear()
+        self.sizes.clear()
+        self.currentbytes = 0
 
+    def __len__(self):
+        return len(self.cache)
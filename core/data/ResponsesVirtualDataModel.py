@@ -0,0 +1,189 @@
+#
+# This module supports a data model for the responses data that reads rows from the database as they are shown
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from PyQt4.QtCore import Qt, SIGNAL, QModelIndex, QMutex
+from core.data.DataTableDataModel import DataTableDataModel
+from core.data.ResponsesDataModel import ResponsesDataModel
+from core.data.LRUCache import LRUCache
+from core.database.constants import ResponsesTable
+
+def response_info_items(row):
+    """ Items of a responses info row as they are shown in the views """
+    responseItems = [m or '' for m in list(row)]
+    if str(responseItems[ResponsesTable.CONFIRMED]).lower() in ('y', '1'):
+        responseItems[ResponsesTable.CONFIRMED] = "Yes"
+    else:
+        responseItems[ResponsesTable.CONFIRMED] = ""
+    return responseItems
+
+class ResponsesVirtualDataModel(DataTableDataModel):
+    """
+    Responses model that keeps only recently shown pages of rows in memory.
+    The row count, pages, sort order and row filters all come from SQL;
+    responses added after the last refresh_rows are not shown until the next.
+    """
+
+    PAGE_SIZE = 256
+
+    def __init__(self, framework, parent = None, max_pages = 64):
+        DataTableDataModel.__init__(self, framework, ResponsesDataModel.ITEM_DEFINITION, parent)
+        self.qlock = QMutex()
+        self.pages = LRUCache(max_pages)
+        self.filters = []
+        self.row_count = 0
+        self.max_id = 0
+        self.Data = None
+        self.cursor = None
+        self.framework.subscribe_database_events(self.db_attach, self.db_detach)
+
+    def db_attach(self):
+        self.Data = self.framework.getDB()
+        self.cursor = self.Data.allocate_thread_cursor()
+
+    def db_detach(self):
+        self.clearModel()
+        self.qlock.lock()
+        try:
+            if self.cursor and self.Data:
+                self.cursor.close()
+                self.Data.release_thread_cursor(self.cursor)
+            self.cursor = None
+            self.Data = None
+        finally:
+            self.qlock.unlock()
+
+    def clearModel(self):
+        self.beginResetModel()
+        self.qlock.lock()
+        try:
+            self.pages.clear()
+            self.row_count = 0
+            self.max_id = 0
+        finally:
+            self.qlock.unlock()
+        self.endResetModel()
+
+    def refresh_rows(self, max_id):
+        """ Show responses up to max_id; new rows are inserted in place when sorted by Id, otherwise the view is reset """
+        self.qlock.lock()
+        try:
+            if self.Data is None or max_id <= self.max_id:
+                return
+            old_count = self.row_count
+            new_count = self.Data.count_responses_info(self.cursor, max_id, self.filters)
+        finally:
+            self.qlock.unlock()
+
+        if new_count == old_count:
+            self.max_id = max_id
+            return
+
+        if ResponsesTable.ID == self._sort_column and new_count > old_count:
+            if Qt.AscendingOrder == self._sort_order:
+                first = old_count
+            else:
+                first = 0
+            self.beginInsertRows(QModelIndex(), first, first + new_count - old_count - 1)
+            self.update_rows(max_id, new_count)
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            self.update_rows(max_id, new_count)
+            self.endResetModel()
+
+    def update_rows(self, max_id, row_count):
+        self.qlock.lock()
+        try:
+            self.pages.clear()
+            self.max_id = max_id
+            self.row_count = row_count
+        finally:
+            self.qlock.unlock()
+
+    def set_filters(self, filters):
+        """ Show only rows matching filters, a list of (column offset, value, equal) """
+        self.beginResetModel()
+        self.qlock.lock()
+        try:
+            self.filters = list(filters)
+            self.pages.clear()
+            if self.Data is not None:
+                self.row_count = self.Data.count_responses_info(self.cursor, self.max_id, self.filters)
+        finally:
+            self.qlock.unlock()
+        self.endResetModel()
+
+    def add_filter(self, offset, value, equal):
+        self.set_filters(self.filters + [(offset, value, equal)])
+
+    def append_data(self, new_rows):
+        # rows are read from the database, so new ones only need a refresh up to the last of them
+        if new_rows:
+            self.refresh_rows(max([int(row[ResponsesTable.ID]) for row in new_rows]))
+
+    def appendleft_data(self, new_rows):
+        self.append_data(new_rows)
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.row_count
+
+    def read_row(self, row):
+        page_number = row // self.PAGE_SIZE
+        self.qlock.lock()
+        try:
+            page = self.pages.get(page_number)
+            if page is None:
+                if self.Data is None:
+                    return None
+                rows = self.Data.read_responses_info_page(self.cursor, self.max_id, self.filters,
+                                                          self._sort_column, Qt.DescendingOrder == self._sort_order,
+                                                          page_number * self.PAGE_SIZE, self.PAGE_SIZE)
+                page = [response_info_items(r) for r in rows]
+                self.pages.setitem(page_number, page)
+        finally:
+            self.qlock.unlock()
+        offset = row - page_number * self.PAGE_SIZE
+        if offset < len(page):
+            return page[offset]
+        return None
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None # QVariant()
+        if index.row() >= self.row_count:
+            return None
+        responseItems = self.read_row(index.row())
+        if responseItems is None:
+            return None
+        return responseItems[self.column_offset[index.column()]]
+
+    def sort(self, column, order):
+        self.emit(SIGNAL('layoutAboutToBeChanged()'))
+        self.qlock.lock()
+        try:
+            self._sort_column = self.column_offset[column]
+            self._sort_order = order
+            self.pages.clear()
+        finally:
+            self.qlock.unlock()
+        self.emit(SIGNAL('layoutChanged()'))
@@ -21,42 +21,6 @@
 
 from PyQt4.QtCore import Qt, QVariant, QAbstractItemModel, QModelIndex
 
-def findOrAddSiteMapNode(model, parent, nodes, text):
-    prevNode = None
-    foundNode = None
-    for index in range(0, len(nodes)):
-        # keep in order
-        if text == nodes[index].text:
-            foundNode = nodes[index]
-            break
-        if text < nodes[index].text:
-            if (not prevNode) or (prevNode and prevNode.text < text):
-                if not parent:
-                    modelIndex = QModelIndex()
-                else:
-                    modelIndex = model.createIndex(index, 0, parent)
-                model.beginInsertRows(modelIndex, index, index)
-                foundNode = SiteMapNode(parent, nodes[index].row, text)
-                for i in range(index, len(nodes)):
-                    nodes[i].row += 1
-                nodes.insert(index, foundNode)
-                model.endInsertRows()
-                break
-        prevNode = nodes[index]
-
-    if not foundNode:
-        row = len(nodes)
-        index = len(nodes)
-        foundNode = SiteMapNode(parent, row, text)
-        if not parent:
-            modelIndex = QModelIndex()
-        else:
-            modelIndex = model.createIndex(index, 0, parent)
-        model.beginInsertRows(modelIndex, index, index)
-        nodes.append(foundNode)
-        model.endInsertRows()
-    return foundNode
-
 def clearMapNode(model, parent, nodes):
     if not parent:
         modelIndex = QModelIndex()
@@ -72,43 +36,130 @@ def clearMapNode(model, parent, nodes):
     model.endRemoveRows()
 
 class SiteMapNode(object):
+    """
+    Children are indexed by name and kept sorted.  New children are held in
+    pending until the model applies them, so nodes can be added from the
+    site map thread without touching rows the view can see.
+    """
     def __init__(self, parent, row, text):
         self.parent = parent
         self.text = text
         self.Id = None
         self.url = None
-        self.row = row
+        self._row = row
         self.children = []
+        self.childIndex = {}
+        self.pending = []
+        self.rowsDirty = False
+        self.attached = False
+
+    @property
+    def row(self):
+        parent = self.parent
+        if parent is not None and parent.rowsDirty:
+            parent.renumberChildren()
+        return self._row
+
+    def renumberChildren(self):
+        for row, node in enumerate(self.children):
+            node._row = row
+        self.rowsDirty = False
 
     def findOrAddNode(self, model, text):
-        return findOrAddSiteMapNode(model, self, self.children, text)
+        node = self.childIndex.get(text)
+        if node is None:
+            node = SiteMapNode(self, 0, text)
+            self.childIndex[text] = node
+            if self.attached and not self.pending:
+                model.pendingParents.append(self)
+            self.pending.append(node)
+        return node
+
+    def takePending(self):
+        """ Returns the pending children in order, with their own pending children merged in """
+        pending = sorted(self.pending, key = lambda node: node.text)
+        self.pending = []
+        for node in pending:
+            node.attach()
+        return pending
+
+    def attach(self):
+        # not yet visible, so the pending children are merged without model changes
+        if self.pending:
+            self.children = mergeSiteMapNodes(self.children, self.takePending())
+            self.rowsDirty = True
+        self.attached = True
 
     def setResponseId(self, Id, url):
         self.Id = Id
         self.url = url
 
+def mergeSiteMapNodes(nodes, added):
+    merged = []
+    i = 0
+    for node in added:
+        while i < len(nodes) and nodes[i].text < node.text:
+            merged.append(nodes[i])
+            i += 1
+        merged.append(node)
+    merged.extend(nodes[i:])
+    return merged
+
+def insertionRuns(nodes, added):
+    """ Returns (row, nodes) for each run of added nodes, with rows as they are once all are inserted """
+    runs = []
+    i = 0
+    for count, node in enumerate(added):
+        while i < len(nodes) and nodes[i].text < node.text:
+            i += 1
+        row = i + count
+        if runs and runs[-1][0] + len(runs[-1][1]) == row:
+            runs[-1][1].append(node)
+        else:
+            runs.append((row, [node]))
+    return runs
+
 class SiteMapModel(QAbstractItemModel):
     def __init__(self, framework, parent = None):
         QAbstractItemModel.__init__(self, parent)
         self.framework = framework
-        self.nodes = []
+        self.root = SiteMapNode(None, 0, '')
+        self.root.attached = True
+        self.pendingParents = []
 
     def findOrAddNode(self, text):
-        return findOrAddSiteMapNode(self, None, self.nodes, text)
+        return self.root.findOrAddNode(self, text)
+
+    def applyPendingChanges(self):
+        """ Inserts the nodes added since the last call, one insert per run of adjacent rows under each parent """
+        pendingParents, self.pendingParents = self.pendingParents, []
+        for parent in pendingParents:
+            added = parent.takePending()
+            if parent is self.root:
+                parentIndex = QModelIndex()
+            else:
+                parentIndex = self.createIndex(parent.row, 0, parent)
+            for row, run in insertionRuns(parent.children, added):
+                self.beginInsertRows(parentIndex, row, row + len(run) - 1)
+                parent.children[row:row] = run
+                parent.rowsDirty = True
+                self.endInsertRows()
 
     def clearModel(self):
-#        clearMapNode(self, None, self.nodes)
+#        clearMapNode(self, None, self.root.children)
         self.beginResetModel()
-        self.nodes = []
+        self.root = SiteMapNode(None, 0, '')
+        self.root.attached = True
+        self.pendingParents = []
         self.endResetModel()
 
     def index(self, row, column, parent):
-        if not self.nodes:
+        if not self.root.children:
             return QModelIndex()
         if not parent.isValid():
-            if row >= len(self.nodes):
+            if row >= len(self.root.children):
                 return QModelIndex()
-            return self.createIndex(row, column, self.nodes[row])
+            return self.createIndex(row, column, self.root.children[row])
         node = parent.internalPointer()
         if row >= len(node.children):
             return QModelIndex()
@@ -118,14 +169,14 @@ class SiteMapModel(QAbstractItemModel):
         if not index.isValid():
             return QModelIndex()
         node = index.internalPointer()
-        if node.parent is None:
+        if node.parent is self.root:
             return QModelIndex()
         else:
             return self.createIndex(node.parent.row, 0, node.parent)
 
     def rowCount(self, parent):
         if not parent.isValid():
-            return len(self.nodes)
+            return len(self.root.children)
         node = parent.internalPointer()
         if not node:
             return 0
@@ -0,0 +1,205 @@
+#
+# Streaming export of responses to RAFT capture files and containers
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import bz2
+import gzip
+import lzma
+import multiprocessing
+import zlib
+from collections import deque
+
+from core.database.constants import ResponsesTable
+from core.data.RaftDbCapture import RaftDbCapture
+from lib.parsers.raftparse import ParseAdapter
+from lib.parsers.raftcapture import RaftCaptureWriter, encode_block
+
+COMPRESSED_COLUMNS = (ResponsesTable.REQ_HEADERS, ResponsesTable.REQ_DATA, ResponsesTable.RES_HEADERS, ResponsesTable.RES_DATA)
+
+# each batch is compressed as its own stream; the readers of these formats take concatenated streams
+COMPRESSORS = {
+    'xz' : lambda data: lzma.compress(data),
+    'bz2' : lambda data: bz2.compress(data, 9),
+    'gz' : lambda data: gzip.compress(data),
+    '' : lambda data: data,
+    }
+
+# indexed capture container, see lib/parsers/raftcapture.py
+CONTAINER = 'raftcap'
+
+def capture_compression(filename):
+    """ Compression for a RAFT capture filename, or None if it is not one """
+    for extension, compression in (('.raftcap', CONTAINER), ('.xml.xz', 'xz'), ('.xml.bz2', 'bz2'), ('.xml.gz', 'gz'), ('.xml', '')):
+        if filename.endswith(extension):
+            return compression
+    return None
+
+def decompress_row(row):
+    row = list(row)
+    for ndx in COMPRESSED_COLUMNS:
+        row[ndx] = zlib.decompress(row[ndx]) if row[ndx] else b''
+    return row
+
+def _export_batch(rows, compression, is_compressed):
+    adapter = ParseAdapter()
+    captures = []
+    for row in rows:
+        if is_compressed:
+            row = decompress_row(row)
+        capture = RaftDbCapture()
+        capture.populate_by_dbrow(row)
+        captures.append(capture)
+    if CONTAINER == compression:
+        # each batch is one container block
+        return encode_block(captures), len(rows)
+    chunks = [adapter.format_as_xml(capture) for capture in captures]
+    return COMPRESSORS[compression](''.join(chunks).encode('utf-8')), len(rows)
+
+class BulkCaptureExporter(object):
+    """
+    Writes responses to a RAFT capture file a batch at a time.  Rows are
+    read in Id order with read_responses_export_batch, still compressed as
+    stored, and decompressed, formatted as XML and compressed by a pool of
+    worker processes.  Each batch becomes its own xz, bz2 or gzip stream,
+    or its own block of a .raftcap container, written in order as soon as
+    it is ready, so memory stays bounded by the batches in flight.  Like
+    BulkResponseWriter, the pool is only started once there is more than
+    one batch to prepare.
+
+    Capture filters run in this process, on rows it decompresses itself.
+    """
+
+    def __init__(self, Data, cursor, filename, processes = None, batch_size = 200, capture_filters = None):
+        self.Data = Data
+        self.cursor = cursor
+        self.filename = filename
+        self.compression = capture_compression(filename)
+        if self.compression is None:
+            raise Exception('unsupported RAFT capture file type: %s' % (filename))
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.capture_filters = capture_filters or []
+        self.use_pool = self.processes > 1
+        self.pool = None
+        self.outstanding = deque()
+        self.fh = None
+        self.container = None
+        self.count = 0
+
+    def export_all(self):
+        """ Export every response; returns the number exported """
+        return self.export(self.all_batches())
+
+    def export_ids(self, ids):
+        """ Export the responses with these Ids, in Id order; returns the number exported """
+        return self.export(self.id_batches(sorted(set(int(Id) for Id in ids))))
+
+    def all_batches(self):
+        lastId = 0
+        while True:
+            rows = self.Data.read_responses_export_batch(self.cursor, lastId, self.batch_size)
+            if not rows:
+                break
+            lastId = rows[-1][ResponsesTable.ID]
+            yield rows
+
+    def id_batches(self, ids):
+        for offset in range(0, len(ids), self.batch_size):
+            chunk = ids[offset:offset+self.batch_size]
+            yield self.Data.read_responses_export_batch(self.cursor, 0, len(chunk), chunk)
+
+    def export(self, batches):
+        if CONTAINER == self.compression:
+            self.container = RaftCaptureWriter(self.filename)
+        else:
+            self.fh = open(self.filename, 'wb')
+            self.fh.write(COMPRESSORS[self.compression](b'<raft version="1.0">\n'))
+        try:
+            pending = None
+            for rows in batches:
+                if pending is not None:
+                    # a second batch means the pool is worth starting
+                    self.submit(pending)
+                pending = rows
+            if pending is not None:
+                if self.pool is None:
+                    self.use_pool = False
+                self.submit(pending)
+            while self.outstanding:
+                self.write(self.outstanding.popleft().get())
+            if self.fh is not None:
+                self.fh.write(COMPRESSORS[self.compression](b'</raft>'))
+        finally:
+            self.close()
+        return self.count
+
+    def submit(self, rows):
+        is_compressed = True
+        if self.capture_filters:
+            rows = [row for row in [decompress_row(row) for row in rows] if self.filter_row(row)]
+            is_compressed = False
+            if not rows:
+                return
+        if self.pool is None and self.use_pool:
+            try:
+                # spawn rather than fork, the parent may be a threaded Qt application
+                self.pool = multiprocessing.get_context('spawn').Pool(self.processes)
+            except (OSError, ImportError, ValueError) as error:
+                print(('export worker processes unavailable, exporting in process: %s' % (error)))
+                self.use_pool = False
+        if self.pool is None:
+            self.write(_export_batch(rows, self.compression, is_compressed))
+            return
+        self.outstanding.append(self.pool.apply_async(_export_batch, (rows, self.compression, is_compressed)))
+        # bound the number of formatted batches held in memory
+        while len(self.outstanding) >= 2 * self.processes:
+            self.write(self.outstanding.popleft().get())
+
+    def filter_row(self, row):
+        capture = RaftDbCapture()
+        capture.populate_by_dbrow(row)
+        for capture_filter in self.capture_filters:
+            if not capture_filter(capture):
+                return False
+        return True
+
+    def write(self, result):
+        data, count = result
+        if self.container is not None:
+            self.container.write_block(*data)
+        else:
+            self.fh.write(data)
+        self.count += count
+
+    def close(self):
+        if self.pool is not None:
+            if self.outstanding:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.outstanding.clear()
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
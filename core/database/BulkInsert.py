@@ -0,0 +1,76 @@
+#
+# Bulk insertion of imported responses
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import traceback
+
+from core.database.database import prepare_bulk_response
+
+class BulkResponseWriter(object):
+    """
+    Takes rows in the insert_responses layout, hashes and compresses them a
+    batch at a time, reusing content repeated within the batch, and writes
+    each batch with insert_responses_bulk.  Search indexing is deferred:
+    trigram tokenizing is most of the cost of an insert, so imported rows
+    are left for index_pending_responses and stay searchable meanwhile.
+    """
+
+    def __init__(self, Data, cursor, batch_size = 500, written_callback = None):
+        self.Data = Data
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.written_callback = written_callback
+        self.batch = []
+        self.count = 0
+        self.errors = []
+
+    def add(self, values):
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self.submit()
+
+    def submit(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        prepared = []
+        known_content = {}
+        for values in batch:
+            try:
+                prepared.append(prepare_bulk_response(values, False, known_content))
+            except Exception as error:
+                message = traceback.format_exception(type(error), error, error.__traceback__)
+                self.report_error('%s\n%s' % (values[1], ''.join(message)))
+        if prepared:
+            self.count += self.Data.insert_responses_bulk(self.cursor, prepared, True, True)
+            if self.written_callback is not None:
+                self.written_callback()
+
+    def report_error(self, error):
+        self.errors.append(error)
+        print(('FIX ME! ERROR:\n%s' % (error)))
+
+    def finish(self):
+        """ Write everything added so far; returns the number of rows written """
+        self.submit()
+        return self.count
+
+    def close(self):
+        self.batch = []
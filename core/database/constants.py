@@ -70,6 +70,10 @@ class ResponsesTable():
     REQ_DATA_HASHVAL = 17
     RES_DATA_HASHVAL = 18
     REQ_HOST = 19
+
+    COLUMN_NAMES = ('Id', 'Url', 'ReqHeaders', 'ReqData', 'ResHeaders', 'ResContent', 'Status', 'Length',
+                    'ReqTime', 'ReqDate', 'Notes', 'Results', 'Confirmed', 'ReqMethod', 'HostIP',
+                    'ResContentType', 'DataOrigin', 'ReqDataHashval', 'ResContentHashval', 'ReqHost')
     
 class SequencesTable():
     ID=0
@@ -33,8 +33,10 @@ import traceback
 import shutil
 import time,datetime
 import uuid
+import threading
 import sqlite3
 from sqlite3 import dbapi2 as sqlite
+from urllib import parse as urlparse
 
 from PyQt4.QtCore import QMutex
 from core.database.constants import *
@@ -62,12 +64,154 @@ def adapt_compressed(compressed):
 def convert_compressed(blob):
     return Compressed(zlib.decompress(blob))
 
+class CompressedBlob(object):
+    """ Data already compressed, such as by an import worker, and stored as is in compressed columns """
+    def __init__(self, blob):
+        self.blob = blob
+
+def adapt_compressed_blob(compressed_blob):
+    return compressed_blob.blob
+
+def normalize_url(url):
+    """ Lower case scheme and host, drop default ports and fragments """
+    try:
+        parsed = urlparse.urlsplit(url)
+        netloc = parsed.netloc.lower()
+        if (parsed.scheme.lower(), parsed.port) in (('http', 80), ('https', 443)):
+            netloc = netloc.rsplit(':', 1)[0]
+    except ValueError:
+        return url
+    return urlparse.urlunsplit((parsed.scheme.lower(), netloc, parsed.path or '/', parsed.query, ''))
+
+def index_text(value):
+    """ Text for the search index; undecodable bytes are dropped so ascii runs stay contiguous """
+    if value is None:
+        return ''
+    if isinstance(value, Compressed):
+        value = value.value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'ignore')
+    return str(value)
+
+def is_text_content_type(content_type):
+    content_type = str(content_type or '').lower()
+    if not content_type or content_type.startswith('text/'):
+        return True
+    for marker in ('html', 'xml', 'json', 'javascript', 'ecmascript', 'x-www-form-urlencoded', 'css'):
+        if marker in content_type:
+            return True
+    return False
+
+def search_index_text(url, reqheaders, reqdata, resheaders, rescontent, content_type, notes):
+    """ The column text for responses_fts, whether the content was indexed and the notes text """
+    indexed = is_text_content_type(content_type)
+    if indexed:
+        rescontent = index_text(rescontent)
+    else:
+        # binary response bodies are not indexed
+        rescontent = ''
+    texts = (index_text(url), index_text(reqheaders), index_text(reqdata), index_text(resheaders), rescontent)
+    return texts, indexed, str(notes) if notes else ''
+
+def convert_config_value(value, rtype):
+    if rtype == bool:
+        if not value:
+            return False
+        if value.lower() in ['true', 'yes', 'y', '1']:
+            return True
+        else:
+            return False
+    elif rtype == int:
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+    elif rtype == bytes:
+        return value.encode('utf-8')
+    else:
+        # TODO: implement more types
+        return value
+
+def url_hash(url):
+    """ Signed 64-bit hash of the normalized url, used for indexed exact match lookups """
+    digest = hashlib.sha1(normalize_url(str(url)).encode('utf-8', 'ignore')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+def content_digest(value, hashalgo = hashlib.sha256):
+    """ Hashval of content_data, an empty value has an empty digest """
+    if not value:
+        return b''
+    return hashalgo(value).hexdigest()
+
+def prepare_bulk_response(values, keep_indexed = True, known_content = None):
+    """
+    Does the hashing and compression of insert_responses for one row, so it
+    can run in import worker processes.  Returns the row of responses
+    values, the content_data rows it needs and its search_index_text.
+    Content compressed for earlier rows is reused from known_content.
+    """
+    if known_content is None:
+        known_content = {}
+    indexed = None
+    if keep_indexed:
+        indexed = search_index_text(*[values[ndx] for ndx in (ResponsesTable.URL, ResponsesTable.REQ_HEADERS, ResponsesTable.REQ_DATA,
+                                                              ResponsesTable.RES_HEADERS, ResponsesTable.RES_DATA,
+                                                              ResponsesTable.RES_CONTENT_TYPE, ResponsesTable.NOTES)])
+    row = list(values)
+    content = []
+    for ndx in (ResponsesTable.REQ_HEADERS, ResponsesTable.RES_HEADERS):
+        row[ndx] = CompressedBlob(adapt_compressed(Compressed(values[ndx])))
+    for ndx in (ResponsesTable.REQ_DATA, ResponsesTable.RES_DATA):
+        value = values[ndx] or b''
+        digest = content_digest(value)
+        row[ndx] = digest
+        if digest not in known_content:
+            known_content[digest] = CompressedBlob(adapt_compressed(Compressed(value)))
+        content.append((digest, known_content[digest]))
+    row.append(url_hash(values[ResponsesTable.URL]))
+    return row, content, indexed
+
+class ConnectionPool(object):
+    """ Hands out one read-only connection per thread against a WAL mode database """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.local = threading.local()
+        self.mutex = threading.Lock()
+        self.connections = []
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite.connect(self.filename, detect_types=sqlite.PARSE_DECLTYPES, check_same_thread = False)
+            conn.execute('PRAGMA query_only = ON')
+            self.local.conn = conn
+            with self.mutex:
+                self.connections.append(conn)
+        return conn
+
+    def cursor(self):
+        # each read gets its own cursor so nested iteration on one thread is safe
+        return self.connection().cursor()
+
+    def close(self):
+        with self.mutex:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
 class Db:
     """ Db database class """
 
-    def __init__(self, version, exception_reporter = None):
+    def __init__(self, version, exception_reporter = None, use_pool = False):
         self.version = version
         self.exception_reporter = exception_reporter
+        # when pooled, every thread reads over its own connection and only writes share self.conn
+        self.use_pool = use_pool
+        self.pool = None
+        self.write_behind = None
+        self.search_index = False
 
     def connect(self, filename):
 
@@ -75,8 +219,13 @@ class Db:
 
         # Register the adapter
         sqlite.register_adapter(Compressed, adapt_compressed)
+        sqlite.register_adapter(CompressedBlob, adapt_compressed_blob)
         sqlite.register_converter("compressed", convert_compressed)
 
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
         self.filename = filename
         self.threadMutex = QMutex()
         self.threadCursors = []
@@ -98,6 +247,48 @@ class Db:
             cursor = self.conn.cursor()
             self.perform_upgrade(cursor, dbversion, version)
 
+        if self.use_pool:
+            self.enable_pool(cursor)
+        self.init_response_id(cursor)
+        self.search_index = self.has_search_index(cursor)
+        cursor.close()
+
+    def init_response_id(self, cursor):
+        """ Response ids are handed out here so queued rows can be numbered before they are written """
+        self.idMutex = QMutex()
+        cursor.execute("SELECT max(Id) FROM responses")
+        row = cursor.fetchone()
+        last_id = int(row[0] or 0)
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name='responses'")
+        row = cursor.fetchone()
+        if row and row[0] is not None:
+            last_id = max(last_id, int(row[0]))
+        self.last_response_id = last_id
+
+    def allocate_response_id(self):
+        self.idMutex.lock()
+        try:
+            self.last_response_id += 1
+            return self.last_response_id
+        finally:
+            self.idMutex.unlock()
+
+    def set_write_behind(self, writer):
+        self.write_behind = writer
+
+    def get_write_behind(self):
+        return self.write_behind
+
+    def enable_pool(self, cursor):
+        """ Switch the database to WAL mode so readers never block behind the writer """
+        cursor.execute('PRAGMA journal_mode = WAL')
+        row = cursor.fetchone()
+        if not row or 'wal' != str(row[0]).lower():
+            print(('unable to enable WAL mode for %s; using single connection' % (self.filename)))
+            return
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        self.pool = ConnectionPool(self.filename)
+
     def get_connection(self, filename, version):
         if os.path.exists(filename):
             conn = sqlite.connect(filename, detect_types=sqlite.PARSE_DECLTYPES, check_same_thread = False)
@@ -117,6 +308,11 @@ class Db:
         # TODO: lock?
         for cur in self.threadCursors:
             cur.close()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        # sqlite3 rolls back whatever is uncommitted when the connection closes
+        self.conn.commit()
         self.conn.close()
 
     def create_raft_db(self, filename, version):
@@ -124,6 +320,7 @@ class Db:
         
         # Register the adapter
         sqlite.register_adapter(Compressed, adapt_compressed)
+        sqlite.register_adapter(CompressedBlob, adapt_compressed_blob)
         sqlite.register_converter("compressed", convert_compressed)
 
         conn = sqlite.connect(filename, detect_types=sqlite.PARSE_DECLTYPES)
@@ -139,7 +336,12 @@ class Db:
                 Url TEXT, ReqHeaders compressed, ReqDataHashval VARCHAR(64), ResHeaders compressed,
                 ResContentHashval VARCHAR(64), Status INTEGER, Length INTEGER, ReqTime INTEGER, ReqDate TEXT,
                 Notes TEXT, Results TEXT, Confirmed BOOL,
-                ReqMethod TEXT, HostIP TEXT, ResContentType TEXT, DataOrigin TEXT, ReqHost TEXT) """)
+                ReqMethod TEXT, HostIP TEXT, ResContentType TEXT, DataOrigin TEXT, ReqHost TEXT,
+                UrlHash INTEGER) """)
+
+        self.create_responses_indexes(cursor)
+        self.create_search_index(cursor)
+        self.create_extraction_cache(cursor)
 
         cursor.execute(""" CREATE TABLE analysis (Id INTEGER PRIMARY KEY NOT NULL UNIQUE, Results TEXT) """)
 
@@ -257,7 +459,8 @@ class Db:
         
         cursor.execute("""CREATE TABLE AnalysisRuns (
                                 AnalysisRun_ID INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE,
-                                timeran TIMESTAMP
+                                timeran TIMESTAMP,
+                                MaxResponseId INTEGER
                                 );
                             """)
 
@@ -268,6 +471,8 @@ class Db:
                                className TEXT,
                                AnalysisRun INTEGER,
                                resultclass TEXT,
+                               ConfigHash TEXT,
+                               AnalysisState TEXT,
                                FOREIGN KEY (AnalysisRun) REFERENCES AnalysisRuns (AnalysisRun_ID)
                                );
                             """)
@@ -387,6 +592,110 @@ class Db:
         cursor.close()
         conn.close()
 
+    def create_responses_indexes(self, cursor):
+        cursor.execute("""CREATE INDEX IF NOT EXISTS IDX_responses_Url_ReqMethod ON responses (Url, ReqMethod)""")
+        cursor.execute("""CREATE INDEX IF NOT EXISTS IDX_responses_UrlHash ON responses (UrlHash)""")
+        cursor.execute("""CREATE INDEX IF NOT EXISTS IDX_responses_ReqHost ON responses (ReqHost)""")
+        cursor.execute("""CREATE INDEX IF NOT EXISTS IDX_responses_Status ON responses (Status)""")
+        cursor.execute("""CREATE INDEX IF NOT EXISTS IDX_responses_ResContentType ON responses (ResContentType)""")
+        cursor.execute("""CREATE INDEX IF NOT EXISTS IDX_responses_DataOrigin ON responses (DataOrigin)""")
+
+    def create_search_index(self, cursor):
+        """ Trigram full-text index used by execute_search to narrow down candidate responses """
+        try:
+            # bodies and headers never change once stored, so the index does not keep a copy of them
+            cursor.execute("""CREATE VIRTUAL TABLE responses_fts USING fts5 (
+                              Url, ReqHeaders, ReqData, ResHeaders, ResContent,
+                              content='', tokenize='trigram'
+                              )""")
+            cursor.execute("""CREATE VIRTUAL TABLE responses_notes_fts USING fts5 (Notes, tokenize='trigram')""")
+        except sqlite.OperationalError as error:
+            print(('full-text search index not available, searches will scan all responses: %s' % (error)))
+            return False
+        # binary response bodies are not indexed; searches of response content always check these rows
+        cursor.execute("""CREATE TABLE responses_fts_unindexed (Response_Id INTEGER PRIMARY KEY NOT NULL)""")
+        self.create_search_index_pending(cursor)
+        return True
+
+    def create_search_index_pending(self, cursor):
+        """ Responses bulk inserted but not yet indexed; every search checks these rows until index_pending_responses reaches them """
+        cursor.execute("""CREATE TABLE IF NOT EXISTS responses_fts_pending (Response_Id INTEGER PRIMARY KEY NOT NULL)""")
+
+    def create_extraction_cache(self, cursor):
+        """ Parsed link, form and script extraction results keyed on the content they were extracted from """
+        cursor.execute("""CREATE TABLE IF NOT EXISTS extraction_cache (CacheKey VARCHAR(64) PRIMARY KEY NOT NULL UNIQUE,
+                          ContentHashval VARCHAR(64), Results compressed)""")
+
+    def has_search_index(self, cursor):
+        cursor.execute("""SELECT count(1) FROM sqlite_master WHERE type='table' AND name='responses_fts_unindexed'""")
+        return 0 != int(cursor.fetchone()[0])
+
+    def insert_search_index(self, cursor, rowid, url, reqheaders, reqdata, resheaders, rescontent, content_type, notes):
+        if not self.search_index:
+            return
+        self.insert_search_index_rows(cursor, [(rowid, search_index_text(url, reqheaders, reqdata, resheaders, rescontent, content_type, notes))])
+
+    def insert_search_index_rows(self, cursor, rows):
+        """ Index (rowid, search_index_text) pairs """
+        if not self.search_index:
+            return
+        cursor.executemany("""INSERT OR IGNORE INTO responses_fts_unindexed (Response_Id) VALUES (?)""",
+                           [(rowid,) for rowid, (texts, indexed, notes) in rows if not indexed])
+        cursor.executemany("""INSERT INTO responses_fts (rowid, Url, ReqHeaders, ReqData, ResHeaders, ResContent)
+                          VALUES (?, ?, ?, ?, ?, ?)""",
+                           [(rowid,) + texts for rowid, (texts, indexed, notes) in rows])
+        cursor.executemany("""INSERT INTO responses_notes_fts (rowid, Notes) VALUES (?, ?)""",
+                           [(rowid, notes) for rowid, (texts, indexed, notes) in rows if notes])
+
+    def index_pending_responses(self, cursor, limit = 100):
+        """
+        Index up to limit responses left pending by deferred bulk inserts,
+        returning how many were indexed.  Each call is one savepoint under
+        the write lock, committed unless another transaction is open.
+        """
+        if not self.search_index:
+            return 0
+        self.lock_write()
+        try:
+            cursor.execute("SELECT Response_Id FROM responses_fts_pending ORDER BY Response_Id LIMIT ?", [int(limit)])
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return 0
+            cursor.execute("SAVEPOINT index_pending_responses")
+            try:
+                cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, cd2.Data ResContent, ResContentType, Notes \
+                                   FROM responses, content_data cd1, content_data cd2 \
+                                   WHERE \
+                                   cd1.Hashval = ReqDataHashval and cd2.Hashval = ResContentHashval \
+                                   AND Id >= ? AND Id <= ? AND Id IN (SELECT Response_Id FROM responses_fts_pending)", [ids[0], ids[-1]])
+                wanted = set(ids)
+                rows = [(row[0], search_index_text(*row[1:])) for row in cursor.fetchall() if row[0] in wanted]
+                # notes may have been edited since the insert and already indexed by update_responses
+                cursor.executemany("DELETE FROM responses_notes_fts WHERE rowid=?", [(rowid,) for rowid, indexed in rows])
+                self.insert_search_index_rows(cursor, rows)
+                cursor.executemany("DELETE FROM responses_fts_pending WHERE Response_Id=?", [(Id,) for Id in ids])
+            except:
+                cursor.execute("ROLLBACK TO index_pending_responses")
+                cursor.execute("RELEASE index_pending_responses")
+                raise
+            cursor.execute("RELEASE index_pending_responses")
+            return len(ids)
+        finally:
+            self.unlock_write()
+
+    def build_search_query(self, fragments, columns):
+        """ Build an FTS query requiring every literal fragment; None if the index cannot narrow the search """
+        if not self.search_index:
+            return None
+        # trigram matching needs at least three characters
+        phrases = ['"%s"' % (fragment.replace('"', '""')) for fragment in fragments if len(fragment) >= 3]
+        if not phrases:
+            return None
+        query = ' AND '.join(phrases)
+        if columns:
+            query = '{%s} : (%s)' % (' '.join(columns), query)
+        return query
+
     def validate_db(self, conn):
         cursor = conn.cursor()
         cursor.execute("""SELECT name FROM sqlite_master WHERE type='table'""")
@@ -425,16 +734,28 @@ class Db:
                 dbversion = self.upgrade_to_2011_8_31_alpha(cursor)
             elif '2011.8.31-alpha' == dbversion:
                 dbversion = self.upgrade_to_2011_9_1_alpha(cursor)
-            elif '2011.9.1-alpha' == dbversion and '3.0.1-pre' == version:
+            elif '2011.9.1-alpha' == dbversion:
                 dbversion = self.upgrade_to_3_0_1_pre(cursor)
-            elif '3.0.1-pre' == dbversion and '3.0.1' == version:
+            elif '3.0.1-pre' == dbversion:
                 dbversion = self.upgrade_to_3_0_1(cursor)
+            elif '3.0.1' == dbversion:
+                dbversion = self.upgrade_to_3_0_2(cursor)
+            elif '3.0.2' == dbversion:
+                dbversion = self.upgrade_to_3_0_3(cursor)
+            elif '3.0.3' == dbversion:
+                dbversion = self.upgrade_to_3_0_4(cursor)
+            elif '3.0.4' == dbversion:
+                dbversion = self.upgrade_to_3_0_5(cursor)
+            elif '3.0.5' == dbversion:
+                dbversion = self.upgrade_to_3_0_6(cursor)
             else:
                 raise Exception('Implement upgrade from %s to %s' % (dbversion, version))
 
     def read_responses_by_id(self, cursor, Id):
         """ Read a single row from the database providing the Id of the row to be returned. """
-        self.qlock.lock()
+        if self.write_behind is not None:
+            self.write_behind.ensure_written(Id)
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
                                cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
@@ -447,11 +768,42 @@ class Db:
             response = cursor.fetchone()
             return(response)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
+
+    def read_responses_metadata_by_id(self, cursor, Id):
+        """ Read a single row without the request and response bodies, which are left for read_content_data """
+        if self.write_behind is not None:
+            self.write_behind.ensure_written(Id)
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT Id, Url, ReqHeaders, '' ReqData, ResHeaders, \
+                               '' ResContent, Status, Length, ReqTime, ReqDate, Notes, \
+                               Results, Confirmed, \
+                               ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost \
+                               FROM responses \
+                               WHERE \
+                               Id=?", [str(Id)])
+            response = cursor.fetchone()
+            return(response)
+        finally:
+            self.unlock_read(cursor)
+
+    def read_content_data(self, cursor, hashval):
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT Data FROM content_data WHERE Hashval=?", [hashval])
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return bytes(row[0])
+        finally:
+            self.unlock_read(cursor)
 
     def read_responses_info_by_id(self, cursor, Id):
         """ Read info for a single response row from the database providing the Id of the row to be returned. """
-        self.qlock.lock()
+        if self.write_behind is not None:
+            self.write_behind.ensure_written(Id)
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, '' ReqHeaders, '' ReqData, '' ResHeaders, \
                                '' ResContent, Status, Length, ReqTime, ReqDate, '' Notes, \
@@ -463,11 +815,11 @@ class Db:
             response = cursor.fetchone()
             return(response)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def read_responses_by_url(self, cursor, url):
         """ Read rows from the database providing the Url of the rows to be returned. """
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
                                cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
@@ -476,14 +828,24 @@ class Db:
                                FROM responses, content_data cd1, content_data cd2 \
                                WHERE \
                                cd1.Hashval = ReqDataHashval AND cd2.Hashval = ResContentHashval \
-                               AND Url=?", [str(url)])
+                               AND UrlHash=? AND Url=?", [url_hash(url), str(url)])
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
+
+    def read_responses_url_info(self, cursor, afterId, throughId):
+        """ Return Id, Url, ReqMethod and ResContentType of responses with afterId < Id <= throughId """
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT Id, Url, ReqMethod, ResContentType FROM responses \
+                           WHERE Id > ? AND Id <= ? ORDER BY Id", [int(afterId), int(throughId)])
+            return(cursor)
+        finally:
+            self.unlock_read(cursor)
 
     def read_responses_starting_with_url(self, cursor, url):
         """ Read rows from the database providing the Url of the rows to be returned. """
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
                            cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
@@ -492,14 +854,14 @@ class Db:
                            FROM responses, content_data cd1, content_data cd2 \
                            WHERE \
                            cd1.Hashval = ReqDataHashval AND cd2.Hashval = ResContentHashval \
-                           AND Url LIKE ?", [str(url)+'%'])
+                           AND Url >= ? AND Url < ?", [str(url), str(url) + '\U0010ffff'])
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def read_newer_responses_info(self, cursor, startId):
         """ Return all of the responses info from the database greater than startId. """
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, '' ReqHeaders, '' ReqData, '' ResHeaders, \
                            '' ResContent, Status, Length, ReqTime, ReqDate, Notes, \
@@ -508,11 +870,99 @@ class Db:
                            FROM responses where Id > ?", [int(startId)])
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
+
+    def responses_info_where(self, maxId, filters):
+        """ SQL and parameters for responses with Id <= maxId matching filters, a list of
+            (column offset, value, equal); NULL compares as '', which is how the views show it """
+        clauses, params = ['Id <= ?'], [int(maxId)]
+        for offset, value, equal in filters:
+            column = ResponsesTable.COLUMN_NAMES[offset]
+            if value is None:
+                value = ''
+            if ResponsesTable.CONFIRMED == offset:
+                column = "(CASE WHEN LOWER(Confirmed) IN ('y', '1') THEN 'Yes' ELSE '' END)"
+            elif not equal or '' == value:
+                column = "IFNULL(%s, '')" % (column)
+            clauses.append('%s %s ?' % (column, '=' if equal else '!='))
+            params.append(value)
+        return ' AND '.join(clauses), params
+
+    def count_responses_info(self, cursor, maxId, filters = ()):
+        """ Return the number of responses with Id <= maxId matching filters """
+        where, params = self.responses_info_where(maxId, filters)
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT COUNT(*) FROM responses WHERE " + where, params)
+            return int(cursor.fetchone()[0])
+        finally:
+            self.unlock_read(cursor)
+
+    def read_responses_info_page(self, cursor, maxId, filters, sortColumn, descending, offset, limit):
+        """ Return a page of responses info with Id <= maxId matching filters, ordered by the
+            sortColumn offset and then Id """
+        where, params = self.responses_info_where(maxId, filters)
+        direction = 'DESC' if descending else 'ASC'
+        if ResponsesTable.ID == sortColumn:
+            columns = []
+        elif ResponsesTable.URL == sortColumn:
+            # matches IDX_responses_Url_ReqMethod, so pages are read from the index without sorting
+            columns = ['Url', 'ReqMethod']
+        else:
+            columns = [ResponsesTable.COLUMN_NAMES[sortColumn]]
+        order = ', '.join('%s %s' % (column, direction) for column in columns + ['Id'])
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT Id, Url, '' ReqHeaders, '' ReqData, '' ResHeaders, \
+                           '' ResContent, Status, Length, ReqTime, ReqDate, Notes, \
+                           Results, Confirmed, \
+                           ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost \
+                           FROM responses WHERE %s ORDER BY %s LIMIT ? OFFSET ?" % (where, order),
+                           params + [int(limit), int(offset)])
+            return cursor.fetchall()
+        finally:
+            self.unlock_read(cursor)
+
+    def read_max_response_id(self, cursor):
+        if self.write_behind is not None:
+            self.write_behind.ensure_written(self.last_response_id)
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT max(Id) FROM responses")
+            row = cursor.fetchone()
+            return int(row[0] or 0)
+        finally:
+            self.unlock_read(cursor)
+
+    def read_responses_for_analysis(self, cursor, afterId, throughId, conditions):
+        """ Return the responses with afterId < Id <= throughId matching any of conditions, a list of
+            (sql, params, needs_body) predicates over responses.  Each row has a 0 or 1 per condition
+            appended, and its bodies are only read if it matches a condition that needs them. """
+        body_conditions = ['(%s)' % (sql) for sql, params, needs_body in conditions if needs_body] or ['0']
+        body_params = [p for sql, params, needs_body in conditions if needs_body for p in params]
+        matches = ['(%s)' % (sql) for sql, params, needs_body in conditions]
+        match_params = [p for sql, params, needs_body in conditions for p in params]
+        body_sql = ' OR '.join(body_conditions)
+        cursor = self.lock_read(cursor)
+        try:
+            # joining on the condition, rather than selecting the data conditionally, keeps the compressed type
+            cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
+                           cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
+                           Results, Confirmed, \
+                           ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost, %s \
+                           FROM responses \
+                           LEFT JOIN content_data cd1 ON cd1.Hashval = ReqDataHashval AND (%s) \
+                           LEFT JOIN content_data cd2 ON cd2.Hashval = ResContentHashval AND (%s) \
+                           WHERE \
+                           Id > ? AND Id <= ? AND (%s) ORDER BY Id" % (', '.join(matches), body_sql, body_sql, ' OR '.join(matches)),
+                           match_params + body_params + body_params + [afterId, throughId] + match_params)
+            return(cursor)
+        finally:
+            self.unlock_read(cursor)
 
     def read_all_responses(self, cursor):
         """ Return all of the results from the database. """
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
                            cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
@@ -523,11 +973,37 @@ class Db:
                            cd1.Hashval = ReqDataHashval and cd2.Hashval = ResContentHashval")
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
+
+    def read_responses_export_batch(self, cursor, afterId, limit, ids = None):
+        """ Up to limit responses with Id > afterId in Id order, or only those in ids if given.  Headers
+            and bodies are returned as stored, zlib compressed, for export workers to decompress. """
+        if ids is not None:
+            if self.write_behind is not None and ids:
+                self.write_behind.ensure_written(max(ids))
+            condition = 'Id IN (%s)' % (','.join(['?'] * len(ids)))
+            params = [int(Id) for Id in ids]
+        else:
+            condition = 'Id > ?'
+            params = [int(afterId)]
+        cursor = self.lock_read(cursor)
+        try:
+            # cast to BLOB so the compressed converter leaves the values alone
+            cursor.execute("SELECT Id, Url, CAST(ReqHeaders AS BLOB), CAST(cd1.Data AS BLOB), CAST(ResHeaders AS BLOB), \
+                           CAST(cd2.Data AS BLOB), Status, Length, ReqTime, ReqDate, Notes, \
+                           Results, Confirmed, \
+                           ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost \
+                           FROM responses, content_data cd1, content_data cd2 \
+                           WHERE \
+                           cd1.Hashval = ReqDataHashval and cd2.Hashval = ResContentHashval \
+                           AND %s ORDER BY Id LIMIT ?" % (condition), params + [int(limit)])
+            return cursor.fetchall()
+        finally:
+            self.unlock_read(cursor)
 
     def read_all_newer_responses(self, cursor, latestId):
         """ Return all of the results from the database. """
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
                                cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
@@ -539,18 +1015,18 @@ class Db:
                                and Id > ?", [int(latestId)])
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_sitemap_info(self, cursor, lastId):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, Status, ResHeaders, ReqHeaders FROM responses where Id > ?", [int(lastId)])
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_all_sequences(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, \
                               Name, \
@@ -566,18 +1042,18 @@ class Db:
                            FROM sequences ORDER BY Id")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_sequence_items(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Name FROM sequences ORDER BY Id")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_sequence_by_id(self, cursor, sequenceId):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, \
                               Name, \
@@ -595,10 +1071,10 @@ class Db:
                               Id = ?", [sequenceId])
             return cursor.fetchone()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def insert_new_sequence(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             rowid = None
             cursor.execute("INSERT INTO sequences (\
@@ -616,10 +1092,10 @@ class Db:
 
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def update_sequence(self, cursor, updatelist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             rowid = None
             cursor.execute("UPDATE sequences SET \
@@ -628,25 +1104,25 @@ class Db:
                             OutOfSession_Pattern=?, OutOfSession_RE=?, Dynamic_Data=? \
                             WHERE Id=?", updatelist)
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_sequence_steps(self, cursor, sequenceId):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Sequence_Id, StepNum, Response_Id, Is_Enabled, Is_Hidden FROM sequence_steps WHERE Sequence_Id=? ORDER BY StepNum", [sequenceId])
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def clear_sequence_steps(self, cursor, sequenceId):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE FROM sequence_steps WHERE Sequence_Id=?", [sequenceId])
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def insert_sequence_step(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO sequence_steps ( \
                               Sequence_Id, StepNum, Response_Id, Is_Enabled, Is_Hidden \
@@ -655,10 +1131,10 @@ class Db:
                             )", insertlist)
 
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def delete_sequence(self, cursor, sequenceId):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE FROM sequence_cookies WHERE Sequence_Id=?", [sequenceId])
             cursor.execute("DELETE FROM sequence_target_parameters WHERE Sequence_Id=?", [sequenceId])
@@ -670,19 +1146,19 @@ class Db:
             self.rollback()
             raise
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_sequence_parameters(self, cursor, sequenceId):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE FROM sequence_source_parameters WHERE Sequence_Id=?", [sequenceId])
             cursor.execute("DELETE FROM sequence_target_parameters WHERE Sequence_Id=?", [sequenceId])
             cursor.execute("DELETE FROM sequence_cookies WHERE Sequence_Id=?", [sequenceId])
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def insert_sequence_source_parameter(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             insertlist[SequenceSourceParameters.INPUT_VALUE] = Compressed(insertlist[SequenceSourceParameters.INPUT_VALUE])
             cursor.execute("""INSERT INTO sequence_source_parameters (
@@ -706,10 +1182,10 @@ class Db:
                 if i not in [SequenceSourceParameters.INPUT_VALUE]:
                     print(('[%d] %s' % (i, insertlist[i])))
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_sequence_source_parameter_by_id(self, cursor, sequence_id):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT
                               Sequence_Id, 
@@ -722,10 +1198,10 @@ class Db:
                           FROM sequence_source_parameters WHERE Sequence_Id=?""", [int(sequence_id)])
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def insert_sequence_target_parameter(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             insertlist[SequenceTargetParameters.INPUT_VALUE] = Compressed(insertlist[SequenceTargetParameters.INPUT_VALUE])
             cursor.execute("""INSERT INTO sequence_target_parameters (
@@ -748,10 +1224,10 @@ class Db:
                 if i not in [SequenceTargetParameters.INPUT_VALUE]:
                     print(('[%d] %s' % (i, insertlist[i])))
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_sequence_target_parameter_by_id(self, cursor, sequence_id):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT
                               Sequence_Id, 
@@ -764,10 +1240,10 @@ class Db:
                           FROM sequence_target_parameters WHERE Sequence_Id=?""", [int(sequence_id)])
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def insert_sequence_cookie(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             insertlist[SequenceCookies.COOKIE_RAW_VALUE] = Compressed(insertlist[SequenceCookies.COOKIE_RAW_VALUE])
             cursor.execute("""INSERT INTO sequence_cookies (
@@ -780,10 +1256,10 @@ class Db:
                              ?, ?, ?, ?, ?
                            )""", insertlist)
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_sequence_cookies_by_id(self, cursor, sequence_id):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT 
                               Sequence_Id, 
@@ -794,18 +1270,18 @@ class Db:
                            FROM sequence_cookies WHERE Sequence_Id=?""", [int(sequence_id)])
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_sequence_builder_manual_items(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Response_Id FROM sequence_manual_items ORDER BY Time_Added")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
         
     def add_sequence_builder_manual_item(self, cursor, Id):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO sequence_manual_items (Response_Id, Time_Added) values (?, ?)", [int(Id), int(time.time())])
             self.commit()
@@ -813,27 +1289,27 @@ class Db:
         except sqlite.IntegrityError:
             return False
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_sequence_builder_manual_items(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE FROM sequence_manual_items")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_all_vulnerabilities(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Hostname, Port, Vulnerability, Severity, Url, FalsePositive, Remediation \
                                FROM vulnerabilities")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_vulnerability_by_id(self, cursor, Id):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Hostname, Port, Vulnerability, Severity, Url, FalsePositive, Remediation \
                                FROM vulnerabilities \
@@ -842,10 +1318,10 @@ class Db:
             response = cursor.fetchone()
             return response
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def insert_new_vulnerability(self, cursor, insertlist, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             insertlist[7] = Compressed(insertlist[7])
             cursor.execute("INSERT into vulnerabilities (\
@@ -854,10 +1330,10 @@ class Db:
             if AutoCommit:
                 self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def update_vulnerability(self, cursor, insertlist, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             insertlist[6] = Compressed(insertlist[6])
             cursor.execute("UPDATE vulnerabilities SET \
@@ -866,10 +1342,10 @@ class Db:
             if AutoCommit:
                 self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def upsert_vulnerability_parameter(self, cursor, vulnerabilityId, insertlist, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("SELECT count(1) FROM  vulnerability_parameters WHERE Vulnerability_id=? and Num=?",
                                 [vulnerabilityId, insertlist[0]])
@@ -890,48 +1366,58 @@ class Db:
             if AutoCommit:
                 self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_vulnerability_parameters(self, cursor, vulnerabilityId):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Num, ParamName, Payload, Example FROM vulnerability_parameters where \
                                  Vulnerability_Id=?", [vulnerabilityId])
             return cursor.fetchall()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
 
     def get_vulnerability_parameter_by_num(self, cursor, vulnerabilityId, Num):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Num, ParamName, Payload, Example FROM vulnerability_parameters where \
                                  Vulnerability_Id=? and Num = ?", [vulnerabilityId, Num])
             return cursor.fetchone()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def update_responses(self, cursor, notes, results, confirmed, Id):
-        self.qlock.lock()
+        self.lock_write()
         try:
             """ Update specified values in the capture database. """
             cursor.execute("UPDATE responses SET Notes=?, Results=?, Confirmed=? WHERE Id=?", [notes, results, confirmed, Id])
+            if self.search_index:
+                cursor.execute("DELETE FROM responses_notes_fts WHERE rowid=?", [Id])
+                if notes:
+                    cursor.execute("INSERT INTO responses_notes_fts (rowid, Notes) VALUES (?, ?)", [Id, str(notes)])
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def truncate_response_data(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             """ Truncate the responses table. """
             # TODO: clear additional locations
             cursor.execute("DELETE FROM differ_items")
             cursor.execute("DELETE FROM responses")
             cursor.execute("DELETE FROM content_data")
+            cursor.execute("DELETE FROM extraction_cache")
+            if self.search_index:
+                cursor.execute("INSERT INTO responses_fts (responses_fts) VALUES ('delete-all')")
+                cursor.execute("DELETE FROM responses_notes_fts")
+                cursor.execute("DELETE FROM responses_fts_unindexed")
+                cursor.execute("DELETE FROM responses_fts_pending")
             self.hashval_lookup.clear()
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def commit(self):
         self.conn.commit()
@@ -939,6 +1425,28 @@ class Db:
     def rollback(self):
         self.conn.rollback()
 
+    def lock_write(self):
+        self.qlock.lock()
+
+    def unlock_write(self):
+        self.qlock.unlock()
+
+    def lock_read(self, cursor):
+        """
+        Return the cursor to read from; only takes the global lock when not
+        pooled or when the writer connection has uncommitted rows.  Pooled
+        connections only see committed data, so while a transaction is open
+        every thread reads from the writer and sees the rows it holds.
+        """
+        if self.pool is None or self.conn.in_transaction:
+            self.qlock.lock()
+            return cursor
+        return self.pool.cursor()
+
+    def unlock_read(self, cursor):
+        if cursor.connection is self.conn:
+            self.qlock.unlock()
+
     def set_insert_pragmas(self, cursor):
         cursor.execute('PRAGMA synchronous = OFF')
         cursor.execute('PRAGMA temp_store = MEMORY')
@@ -948,13 +1456,9 @@ class Db:
         cursor.execute('PRAGMA temp_store = 0') # DEFAULT
 
     def insert_content_data(self, cursor, value):
-        if not value or len(value) == 0:
-            digest = b''
+        digest = content_digest(value, self.hashalgo)
+        if not digest:
             value = b''
-        else:
-            h = self.hashalgo()
-            h.update(value)
-            digest = h.hexdigest()
         if digest not in self.hashval_lookup:
             try:
                 cursor.execute("INSERT INTO content_data (Hashval, Data) VALUES (?, ?)", [digest, Compressed(value)])
@@ -970,28 +1474,71 @@ class Db:
                     raise
         return digest
 
+    def read_extraction_cache(self, cursor, cachekey):
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT Results FROM extraction_cache WHERE CacheKey=?", [cachekey])
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return bytes(row[0])
+        finally:
+            self.unlock_read(cursor)
+
+    def insert_extraction_cache(self, cursor, cachekey, contenthash, results):
+        """
+        The row is written in its own savepoint and committed, unless a
+        caller's transaction was already open; committing that part way
+        through is left to its owner.  A cache row lost to a rollback is
+        only extracted again.
+        """
+        self.lock_write()
+        try:
+            outer = self.conn.in_transaction
+            cursor.execute('SAVEPOINT insert_extraction_cache')
+            try:
+                cursor.execute("INSERT OR REPLACE INTO extraction_cache (CacheKey, ContentHashval, Results) VALUES (?, ?, ?)",
+                               [cachekey, contenthash, Compressed(results)])
+            except:
+                cursor.execute('ROLLBACK TO insert_extraction_cache')
+                cursor.execute('RELEASE insert_extraction_cache')
+                raise
+            cursor.execute('RELEASE insert_extraction_cache')
+            if not outer:
+                self.commit()
+        finally:
+            self.unlock_write()
+
     def insert_responses(self, cursor, values, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             """ Insert data in to the database """
             # Insert a Python list into the database
+            indexed = [values[ndx] for ndx in (ResponsesTable.URL, ResponsesTable.REQ_HEADERS, ResponsesTable.REQ_DATA,
+                                               ResponsesTable.RES_HEADERS, ResponsesTable.RES_DATA,
+                                               ResponsesTable.RES_CONTENT_TYPE, ResponsesTable.NOTES)]
             values[ResponsesTable.REQ_HEADERS] = Compressed(values[ResponsesTable.REQ_HEADERS])
             values[ResponsesTable.RES_HEADERS] = Compressed(values[ResponsesTable.RES_HEADERS])
             values[ResponsesTable.REQ_DATA] = self.insert_content_data(cursor, values[ResponsesTable.REQ_DATA])
             values[ResponsesTable.RES_DATA] = self.insert_content_data(cursor, values[ResponsesTable.RES_DATA])
+            if values[ResponsesTable.ID] is None:
+                values[ResponsesTable.ID] = self.allocate_response_id()
             rowid = 0
             cursor.execute("INSERT INTO responses(Id, Url, ReqHeaders, ReqDataHashval, \
                                     ResHeaders, ResContentHashval, Status, Length, ReqTime, ReqDate, \
                                     Notes, Results, Confirmed, \
-                                    ReqMethod, HostIP, ResContentType, DataOrigin, ReqHost) \
-                                    values(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+                                    ReqMethod, HostIP, ResContentType, DataOrigin, ReqHost, UrlHash) \
+                                    values(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    values + [url_hash(values[ResponsesTable.URL])])
             cursor.execute('SELECT last_insert_rowid()')
             results = cursor.fetchone()
             if results:
                 rowid = int(results[0])
 
+            self.insert_search_index(cursor, rowid, *indexed)
+
             if AutoCommit:
-                self.conn.commit()
+                self.commit()
 
             return rowid
 
@@ -1005,10 +1552,90 @@ class Db:
                     print(('[%d] %s' % (i, values[i])))
 
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
+
+    def insert_responses_bulk(self, cursor, prepared_rows, AutoCommit = True, DeferIndex = False):
+        """
+        Insert rows made by prepare_bulk_response, returning how many were
+        written.  With DeferIndex the rows are only marked for
+        index_pending_responses, as trigram indexing dominates insert time.
+        """
+        self.lock_write()
+        try:
+            count, digests = self.write_prepared_responses(cursor, prepared_rows, DeferIndex)
+            for digest in digests:
+                self.hashval_lookup[digest] = True
+
+            if AutoCommit:
+                self.commit()
+
+            return count
+        finally:
+            self.unlock_write()
+
+    def insert_responses_batch(self, cursor, rows):
+        """
+        Insert rows in the insert_responses layout as one unit, returning how
+        many were written.  The rows are written inside a savepoint while
+        holding the write lock, so a failure undoes only these rows and
+        nothing else can be committed or rolled back part way through.  The
+        batch is committed unless a caller's transaction was already open,
+        in which case the rows are committed with it.
+        """
+        prepared = [prepare_bulk_response(values, self.search_index) for values in rows]
+        self.lock_write()
+        try:
+            outer = self.conn.in_transaction
+            cursor.execute('SAVEPOINT insert_responses_batch')
+            try:
+                count, digests = self.write_prepared_responses(cursor, prepared)
+            except:
+                cursor.execute('ROLLBACK TO insert_responses_batch')
+                cursor.execute('RELEASE insert_responses_batch')
+                raise
+            cursor.execute('RELEASE insert_responses_batch')
+            if not outer:
+                self.commit()
+            # only known to exist once the rows are in
+            for digest in digests:
+                self.hashval_lookup[digest] = True
+            return count
+        finally:
+            self.unlock_write()
+
+    def write_prepared_responses(self, cursor, prepared_rows, DeferIndex = False):
+        """ Execute the inserts for prepared rows; the caller holds the write lock.  Returns the row count and new content digests """
+        content = []
+        digests = set()
+        rows = []
+        for row, row_content, indexed in prepared_rows:
+            for digest, data in row_content:
+                if digest not in self.hashval_lookup and digest not in digests:
+                    digests.add(digest)
+                    content.append((digest, data))
+            if row[ResponsesTable.ID] is None:
+                row[ResponsesTable.ID] = self.allocate_response_id()
+            rows.append(row)
+
+        cursor.executemany("INSERT OR IGNORE INTO content_data (Hashval, Data) VALUES (?, ?)", content)
+        cursor.executemany("INSERT INTO responses(Id, Url, ReqHeaders, ReqDataHashval, \
+                                ResHeaders, ResContentHashval, Status, Length, ReqTime, ReqDate, \
+                                Notes, Results, Confirmed, \
+                                ReqMethod, HostIP, ResContentType, DataOrigin, ReqHost, UrlHash) \
+                                values(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           rows)
+
+        if not self.search_index:
+            pass
+        elif DeferIndex:
+            cursor.executemany("INSERT OR IGNORE INTO responses_fts_pending (Response_Id) VALUES (?)", [(row[ResponsesTable.ID],) for row in rows])
+        else:
+            self.insert_search_index_rows(cursor, [(row[ResponsesTable.ID], indexed) for row, row_content, indexed in prepared_rows])
+
+        return len(rows), digests
 
     def get_all_requester_history(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, '' ReqHeaders, '' ReqData, '' ResHeaders, \
                                '' ResContent, Status, Length, ReqTime, ReqDate, '' Notes, \
@@ -1019,27 +1646,27 @@ class Db:
                                Id = Response_Id")
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def insert_requester_history(self, cursor, response_id, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO requester_history (Response_Id) VALUES (?)", [response_id])
             if AutoCommit:
-                self.conn.commit()
+                self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_requester_history(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE from requester_history")
-            self.conn.commit()
+            self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
         
     def get_all_fuzzer_history(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Id, Url, '' ReqHeaders, '' ReqData, '' ResHeaders, \
                                '' ResContent, Status, Length, ReqTime, ReqDate, '' Notes, \
@@ -1050,35 +1677,35 @@ class Db:
                                Id = Response_Id")
             return(cursor)
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def insert_fuzzer_history(self, cursor, response_id, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO fuzzer_history (Response_Id) VALUES (?)", [response_id])
             if AutoCommit:
-                self.conn.commit()
+                self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_fuzzer_history(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE from fuzzer_history")
-            self.conn.commit()
+            self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def read_all_config_values(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT Component, ConfigName, ConfigValue FROM configuration")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
         
     def get_config_value(self, cursor, component, name, rtype = str, default_value = None):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT ConfigValue FROM configuration WHERE Component=? AND ConfigName=?", [component, name])
             row = cursor.fetchone()
@@ -1090,30 +1717,25 @@ class Db:
             else:
                 # XXX: should convert bytes(?)
                 value = str(bytes(row[0]), 'utf-8', 'ignore')
+            return convert_config_value(value, rtype)
+        finally:
+            self.unlock_read(cursor)
 
-            if rtype == bool:
-                if not value:
-                    return False
-                if value.lower() in ['true', 'yes', 'y', '1']:
-                    return True
-                else:
-                    return False
-            elif rtype == int:
-                try:
-                    return int(value)
-                except ValueError:
-                    return 0
-            elif rtype == bytes:
-                return value.encode('utf-8')
-            else:
-                # TODO: implement more types
-                return value
+    def get_config_values(self, cursor, component, rtype = str):
+        """ All values of a component in one query, as a dictionary of name to value """
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT ConfigName, ConfigValue FROM configuration WHERE Component=?", [component])
+            values = {}
+            for row in cursor.fetchall():
+                values[row[0]] = convert_config_value(str(bytes(row[1]), 'utf-8', 'ignore'), rtype)
+            return values
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def update_config_value(self, cursor, component, name, value, is_locked = False):
         if not is_locked:
-            self.qlock.lock()
+            self.lock_write()
         try:
             # XXX: need to add correct handling for types instead assuming string conversions
             if type(value) is not bytes:
@@ -1122,10 +1744,10 @@ class Db:
             self.commit()
         finally:
             if not is_locked:
-                self.qlock.unlock()
+                self.unlock_write()
             
     def set_config_value(self, cursor, component, name, value):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("SELECT count(1) FROM configuration WHERE Component=? AND ConfigName=?", [component, name])
             count = int(cursor.fetchone()[0])
@@ -1139,7 +1761,7 @@ class Db:
             else:
                 self.update_config_value(cursor, component, name, value, True)
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_config_value(self, cursor, component, name=None):
         if name is None:
@@ -1152,7 +1774,7 @@ class Db:
                             """, [component,name])
         
     def add_differ_item(self, cursor, Id):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO differ_items (response_id, time_added) values (?, ?)", [Id, time.time()])
             self.commit()
@@ -1160,10 +1782,10 @@ class Db:
         except sqlite.IntegrityError:
             return False
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def add_differ_list(self, cursor, id_list):
-        self.qlock.lock()
+        self.lock_write()
         added_list = []
         try:
             for Id in id_list:
@@ -1174,29 +1796,29 @@ class Db:
                     pass
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
         return added_list
 
     def clear_differ_items(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("DELETE FROM differ_items")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
 
     def get_differ_ids(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT r.Id, r.Url FROM responses r, differ_items d WHERE r.id=d.response_id ORDER BY time_added")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def analysis_start(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO AnalysisRuns (timeran) values (?)", [datetime.datetime.now()])
 
@@ -1205,22 +1827,76 @@ class Db:
             #self.conn.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
     
-    def analysis_add_analyzer_instance(self, cursor, analysisrunid, classname, friendlyname, desc, resultclass):
-        self.qlock.lock()
+    def analysis_finish(self, cursor, analysisrunid, maxresponseid):
+        self.lock_write()
+        try:
+            cursor.execute("UPDATE AnalysisRuns SET MaxResponseId=? WHERE AnalysisRun_ID=?", [maxresponseid, analysisrunid])
+        finally:
+            self.unlock_write()
+
+    def analysis_get_last_run(self, cursor):
+        """ Return the Id and highest analyzed response Id of the latest completed analysis run, or None """
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT AnalysisRun_ID, MaxResponseId FROM AnalysisRuns WHERE MaxResponseId IS NOT NULL ORDER BY AnalysisRun_ID DESC LIMIT 1")
+            return cursor.fetchone()
+        finally:
+            self.unlock_read(cursor)
+
+    def analysis_get_instance_by_class(self, cursor, analysisrunid, classname):
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("SELECT AnalysisInstance_ID, ConfigHash, AnalysisState FROM AnalysisInstances WHERE AnalysisRun=? AND className=?",
+                                [analysisrunid, classname])
+            return cursor.fetchone()
+        finally:
+            self.unlock_read(cursor)
+
+    def analysis_set_instance_state(self, cursor, analyzerinstanceid, state):
+        self.lock_write()
+        try:
+            cursor.execute("UPDATE AnalysisInstances SET AnalysisState=? WHERE AnalysisInstance_ID=?", [state, analyzerinstanceid])
+        finally:
+            self.unlock_write()
+
+    def analysis_copy_page_resultsets(self, cursor, frominstanceid, toinstanceid):
+        """ Carry the per-page results of an earlier analyzer instance forward to a new one """
+        self.lock_write()
         try:
-            cursor.execute("INSERT INTO AnalysisInstances (AnalysisRun, friendlyName, desc, className, resultclass) values (?,?,?,?,?)", 
-                                [analysisrunid, friendlyname, desc, classname, resultclass])
+            cursor.execute("SELECT AnalysisResultSet_ID FROM AnalysisResultSet WHERE AnalysisInstance=? AND isOverallResult=0 ORDER BY AnalysisResultSet_ID",
+                                [frominstanceid])
+            for row in cursor.fetchall():
+                oldresultset = row[0]
+                cursor.execute("""INSERT INTO AnalysisResultSet (AnalysisInstance, Response_analyzed, isOverallResult, context, resultclass)
+                                    SELECT ?, Response_analyzed, isOverallResult, context, resultclass FROM AnalysisResultSet WHERE AnalysisResultSet_ID=?""",
+                                    [toinstanceid, oldresultset])
+                newresultset = cursor.lastrowid
+                cursor.execute("""INSERT INTO AnalysisSingleResult (AnalysisResultSet, severity, certainty, type, desc, data, spanstart, spanend, resultclass)
+                                    SELECT ?, severity, certainty, type, desc, data, spanstart, spanend, resultclass FROM AnalysisSingleResult WHERE AnalysisResultSet=?
+                                    ORDER BY AnalysisSingleResult_ID""",
+                                    [newresultset, oldresultset])
+                cursor.execute("""INSERT INTO AnalysisStats (AnalysisResultSet, statName, statValue)
+                                    SELECT ?, statName, statValue FROM AnalysisStats WHERE AnalysisResultSet=? ORDER BY AnalysisStat_ID""",
+                                    [newresultset, oldresultset])
+        finally:
+            self.unlock_write()
+
+    def analysis_add_analyzer_instance(self, cursor, analysisrunid, classname, friendlyname, desc, resultclass, confighash = None):
+        self.lock_write()
+        try:
+            cursor.execute("INSERT INTO AnalysisInstances (AnalysisRun, friendlyName, desc, className, resultclass, ConfigHash) values (?,?,?,?,?,?)", 
+                                [analysisrunid, friendlyname, desc, classname, resultclass, confighash])
             cursor.execute("SELECT last_insert_rowid()")
             rowid = int(cursor.fetchone()[0])
             #self.conn.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
     
     def analysis_add_resultset(self, cursor, analyzerinstanceid,responseid,isOverallResult,context, resultclass):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO AnalysisResultSet (AnalysisInstance, Response_analyzed, isOverallResult, context, resultclass) values (?,?,?,?,?)", 
                                 [analyzerinstanceid, responseid, isOverallResult, context,resultclass])
@@ -1229,10 +1905,10 @@ class Db:
             #self.conn.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
     
     def analysis_add_singleresult(self, cursor, resultsetid,severity,certainty,type,desc,data,span,resultclass):
-        self.qlock.lock()
+        self.lock_write()
         try:
             if span is None:
                 span=(None,None)
@@ -1244,10 +1920,10 @@ class Db:
             #self.conn.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
     
     def analysis_add_stat(self, cursor, resultsetid, statname, statvalue):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("INSERT INTO AnalysisStats (AnalysisResultSet, statName, statValue) values (?,?,?)", 
                                 [resultsetid, statname, statvalue])
@@ -1256,10 +1932,10 @@ class Db:
             #self.conn.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def analysis_get_runs(self, cursor,lastx=None):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             mainquery="""SELECT AnalysisRun_ID,timeran, 
                             (SELECT COUNT(*) 
@@ -1278,11 +1954,11 @@ class Db:
 
             return cursor.fetchall()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
     
     
     def analysis_get_instances_per_run(self, cursor, runid):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT AnalysisInstance_ID, friendlyName, desc, className, resultclass,
                                 (SELECT COUNT(*) 
@@ -1294,10 +1970,10 @@ class Db:
                                 [runid])
             return cursor.fetchall()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
     
     def analysis_get_resultsets_per_instance(self, cursor, instanceid):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT AnalysisResultSet_ID, Response_analyzed, isOverallResult, context, resultclass,
                                     (SELECT COUNT(*) 
@@ -1308,25 +1984,25 @@ class Db:
                                 [instanceid])
             return cursor.fetchall()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
     
     def analysis_get_singleresults_per_resultset(self, cursor, resultsetid):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT AnalysisSingleResult_ID, severity, certainty, type, desc,data, spanstart,spanend, resultclass FROM AnalysisSingleResult WHERE AnalysisResultSet=?", 
                                 [resultsetid])
             return cursor.fetchall()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
     
     def analysis_get_stats_per_resultset(self,cursor, resultsetid):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("SELECT AnalysisStat_ID, statName, statValue FROM AnalysisStats WHERE AnalysisResultSet=?", 
                                 [resultsetid])
             return cursor.fetchall()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
     
     def analysis_clear_configuration(self, cursor, name=None):
         cursor.execute("""DELETE FROM configuration 
@@ -1337,7 +2013,7 @@ class Db:
                         """)
 
     def get_dom_fuzzer_queue_items(self, cursor, status_filter = None):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             base_query = """SELECT 
                               Id, 
@@ -1356,10 +2032,10 @@ class Db:
 
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def get_dom_fuzzer_queue_item_by_id(self, cursor, Id):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT 
                               Id, 
@@ -1373,10 +2049,10 @@ class Db:
                               WHERE Id = ?""", [Id])
             return cursor.fetchone()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def add_dom_fuzzer_queue_item(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""INSERT INTO dom_fuzzer_queue (
                               Id, 
@@ -1394,26 +2070,26 @@ class Db:
             self.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def update_dom_fuzzer_queue_item_status(self, cursor, Id, status):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""UPDATE dom_fuzzer_queue SET status=? where Id=?""", [status, Id])
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_dom_fuzzer_queue(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""UPDATE dom_fuzzer_queue SET status='D' where Status='P'""")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def add_dom_fuzzer_results_item(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             insertlist[DomFuzzerResultsTable.RENDERED_DATA] = Compressed(insertlist[DomFuzzerResultsTable.RENDERED_DATA])
             cursor.execute("""INSERT INTO dom_fuzzer_results (
@@ -1433,10 +2109,10 @@ class Db:
             self.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def read_dom_fuzzer_results_info(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT 
                               Id, 
@@ -1450,10 +2126,10 @@ class Db:
                               FROM dom_fuzzer_results ORDER BY Id""")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def read_dom_fuzzer_results_by_id(self, cursor, Id):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT 
                               Id, 
@@ -1467,10 +2143,10 @@ class Db:
                               FROM dom_fuzzer_results WHERE Id = ?""", [Id])
             return cursor.fetchone()
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def read_spider_pending_responses(self, cursor, status_filter = None):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             if status_filter:
                 cursor.execute("""SELECT Response_Id, Request_Type, Depth, Status from spider_pending_responses WHERE Status=?""", [status_filter])
@@ -1478,10 +2154,10 @@ class Db:
                 cursor.execute("""SELECT Response_Id, Request_Type, Depth, Status from spider_pending_responses""")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def spider_pending_response_exists(self, cursor, Id, Request_Type):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT count(1) from spider_pending_responses WHERE Response_Id=? and Request_Type=?""", [Id, Request_Type])
             row = cursor.fetchone()
@@ -1491,10 +2167,10 @@ class Db:
                     return True
             return False
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def add_spider_pending_response_id(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""INSERT INTO spider_pending_responses (Response_Id, Request_Type, Depth, Status) VALUES (?,?,?,?)""", insertlist)
             self.commit()
@@ -1503,66 +2179,66 @@ class Db:
             # okay if duplicates
             return False
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def update_spider_pending_response_id(self, cursor, Status, Id, Request_Type):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""UPDATE spider_pending_responses SET Status = ? WHERE Response_Id=? and Request_Type=?""", [Status, Id, Request_Type])
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_spider_pending_responses(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""UPDATE spider_pending_responses SET Status='D' where Status='P'""")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def reset_spider_pending_responses(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""DELETE FROM spider_pending_responses""")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def clear_spider_queue(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""UPDATE spider_queue SET status='D' where Status='P'""")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def reset_spider_queue(self, cursor):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""DELETE from spider_queue""")
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def read_spider_pending_analysis(self, cursor):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT Id, Analysis_Type, Content, Url, Depth FROM spider_pending_analysis""")
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def delete_spider_pending_analysis(self, cursor, Id):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""DELETE FROM spider_pending_analysis WHERE Id=?""", [Id])
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def add_spider_pending_analysis(self, cursor, insertlist, AutoCommit = True):
-        self.qlock.lock()
+        self.lock_write()
         try:
             duplist = insertlist[:]
             if isinstance(duplist[SpiderPendingAnalysisTable.CONTENT], bytes):
@@ -1581,10 +2257,10 @@ class Db:
             print(insertlist)
             raise
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def add_spider_queue_item(self, cursor, insertlist):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""INSERT INTO spider_queue (
                               Id, 
@@ -1604,10 +2280,10 @@ class Db:
             self.commit()
             return rowid
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
 
     def get_spider_queue_items(self, cursor, status_filter = None):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             base_query = """SELECT 
                               Id, 
@@ -1628,10 +2304,10 @@ class Db:
 
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def read_spider_queue_by_url(self, cursor, Url):
-        self.qlock.lock()
+        cursor = self.lock_read(cursor)
         try:
             cursor.execute("""SELECT 
                               Id, 
@@ -1647,22 +2323,39 @@ class Db:
                               WHERE Url = ?""", [Url])
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def update_spider_queue_item_status(self, cursor, Id, status):
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""UPDATE spider_queue SET status=? where Id=?""", [status, Id])
             self.commit()
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
+
+    def read_spider_internal_state(self, cursor, State_Category):
+        cursor = self.lock_read(cursor)
+        try:
+            cursor.execute("""SELECT State_Category, State_Key, State_Count, State_Value FROM spider_internal_state WHERE State_Category = ?""", [State_Category])
+            return cursor
+        finally:
+            self.unlock_read(cursor)
+
+    def set_spider_internal_state(self, cursor, State_Category, State_Key, State_Count, State_Value):
+        self.lock_write()
+        try:
+            cursor.execute("""INSERT OR REPLACE INTO spider_internal_state (State_Category, State_Key, State_Count, State_Value) VALUES (?, ?, ?, ?)""",
+                           [State_Category, State_Key, State_Count, State_Value])
+            self.commit()
+        finally:
+            self.unlock_write()
 
     def get_db_uuid(self, in_cursor = None):
         if in_cursor is None:
             cursor = self.allocate_thread_cursor()
         else:
             cursor = in_cursor
-        self.qlock.lock()
+        self.lock_write()
         try:
             cursor.execute("""SELECT Value FROM raft where Name='UUID'""")
             ret = cursor.fetchone()
@@ -1670,7 +2363,7 @@ class Db:
                 ret = str(ret[0])
             return ret
         finally:
-            self.qlock.unlock()
+            self.unlock_write()
             if in_cursor is None:
                 self.release_thread_cursor(cursor)
             
@@ -1691,26 +2384,45 @@ class Db:
         finally:
             self.threadMutex.unlock()
 
-    def execute_search(self, cursor, includeBody):
-        self.qlock.lock()
+    def execute_search(self, cursor, includeBody, search_query = None, includeUnindexed = False):
+        """ Return responses to search; with a search_query of (responses, notes) FTS queries only candidates are returned """
+        cursor = self.lock_read(cursor)
         try:
             if not includeBody:
-                cursor.execute("SELECT Id, Url, ReqHeaders, null ReqData, ResHeaders, \
+                query = "SELECT Id, Url, ReqHeaders, null ReqData, ResHeaders, \
                                null ResContent, Status, Length, ReqTime, ReqDate, Notes, \
                                Results, Confirmed, \
                                ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost \
-                               FROM responses")
+                               FROM responses WHERE 1=1"
             else:
-                cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
+                query = "SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
                                cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
                                Results, Confirmed, \
                                ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost \
                                FROM responses, content_data cd1, content_data cd2 \
                                WHERE \
-                               cd1.Hashval = ReqDataHashval and cd2.Hashval = ResContentHashval")
+                               cd1.Hashval = ReqDataHashval and cd2.Hashval = ResContentHashval"
+            params = []
+            if search_query is not None:
+                responses_query, notes_query = search_query
+                candidates = []
+                if responses_query:
+                    candidates.append("SELECT rowid FROM responses_fts WHERE responses_fts MATCH ?")
+                    params.append(responses_query)
+                if notes_query:
+                    candidates.append("SELECT rowid FROM responses_notes_fts WHERE responses_notes_fts MATCH ?")
+                    params.append(notes_query)
+                if includeUnindexed:
+                    candidates.append("SELECT Response_Id FROM responses_fts_unindexed")
+                if candidates:
+                    candidates.append("SELECT Response_Id FROM responses_fts_pending")
+                    query += " AND Id IN (%s)" % (' UNION '.join(candidates))
+                else:
+                    query += " AND 0"
+            cursor.execute(query + " ORDER BY Id", params)
             return cursor
         finally:
-            self.qlock.unlock()
+            self.unlock_read(cursor)
 
     def upgrade_to_2011_8_31_alpha(self, cursor):
 
@@ -1760,3 +2472,74 @@ class Db:
         self.conn.commit()
 
         return version
+
+    def upgrade_to_3_0_2(self, cursor):
+
+        version = '3.0.2'
+
+        cursor.execute("ALTER TABLE responses ADD COLUMN UrlHash INTEGER")
+        cursor.execute("SELECT Id, Url FROM responses")
+        updates = [(url_hash(row[1]), row[0]) for row in cursor.fetchall()]
+        cursor.executemany("UPDATE responses SET UrlHash=? WHERE Id=?", updates)
+        self.create_responses_indexes(cursor)
+
+        cursor.execute("UPDATE raft SET Value=? WHERE Name=?", [version, 'VERSION'])
+        self.conn.commit()
+
+        return version
+
+    def upgrade_to_3_0_3(self, cursor):
+
+        version = '3.0.3'
+
+        if self.create_search_index(cursor):
+            self.search_index = True
+            cursor.execute("SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, cd2.Data ResContent, ResContentType, Notes \
+                               FROM responses, content_data cd1, content_data cd2 \
+                               WHERE \
+                               cd1.Hashval = ReqDataHashval and cd2.Hashval = ResContentHashval")
+            write_cursor = self.conn.cursor()
+            for row in cursor:
+                self.insert_search_index(write_cursor, *row)
+            write_cursor.close()
+
+        cursor.execute("UPDATE raft SET Value=? WHERE Name=?", [version, 'VERSION'])
+        self.conn.commit()
+
+        return version
+
+    def upgrade_to_3_0_4(self, cursor):
+
+        version = '3.0.4'
+
+        cursor.execute("ALTER TABLE AnalysisRuns ADD COLUMN MaxResponseId INTEGER")
+        cursor.execute("ALTER TABLE AnalysisInstances ADD COLUMN ConfigHash TEXT")
+        cursor.execute("ALTER TABLE AnalysisInstances ADD COLUMN AnalysisState TEXT")
+
+        cursor.execute("UPDATE raft SET Value=? WHERE Name=?", [version, 'VERSION'])
+        self.conn.commit()
+
+        return version
+
+    def upgrade_to_3_0_5(self, cursor):
+
+        version = '3.0.5'
+
+        self.create_extraction_cache(cursor)
+
+        cursor.execute("UPDATE raft SET Value=? WHERE Name=?", [version, 'VERSION'])
+        self.conn.commit()
+
+        return version
+
+    def upgrade_to_3_0_6(self, cursor):
+
+        version = '3.0.6'
+
+        if self.has_search_index(cursor):
+            self.create_search_index_pending(cursor)
+
+        cursor.execute("UPDATE raft SET Value=? WHERE Name=?", [version, 'VERSION'])
+        self.conn.commit()
+
+        return version
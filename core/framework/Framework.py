@@ -25,7 +25,6 @@
 import traceback
 import os
 import sys
-import functools
 
 from PyQt4.QtCore import (Qt, SIGNAL, QObject, QThread, QMutex, QDir)
 from PyQt4.QtGui import QFont
@@ -42,6 +41,7 @@ class Framework(QObject):
         self._global_cookie_jar = InMemoryCookieJar(self, self)
         self._db = None
         self._contentExtractor = None
+        self._extractionCache = None
         self._networkAccessManager = None
         self._scopeController = None
         self._scopeConfig = None
@@ -135,12 +135,21 @@ class Framework(QObject):
     def get_data_dir(self):
         return self._data_dir
 
+    def get_user_data_dir(self):
+        return self.user_data_dir
+
     def getContentExtractor(self):
         return self._contentExtractor
 
     def setContentExtractor(self, contentExtractor):
         self._contentExtractor = contentExtractor
 
+    def getExtractionCache(self):
+        return self._extractionCache
+
+    def setExtractionCache(self, extractionCache):
+        self._extractionCache = extractionCache
+
     def getRequestResponseFactory(self):
         return self._requestResponseFactory
 
@@ -294,13 +303,20 @@ class Framework(QObject):
             self._db.release_thread_cursor(cursor)
             return value
     
+    def get_config_values(self, component, rtype = str):
+        """ Every value stored for a component, as a dictionary of name to value """
+        cursor = self._db.allocate_thread_cursor()
+        values = self._db.get_config_values(cursor, component, rtype)
+        cursor.close()
+        self._db.release_thread_cursor(cursor)
+        return values
+
     def clear_config_value(self, component, name=None):
         cursor = self._db.allocate_thread_cursor()
         value = self._db.clear_config_value(cursor, component, name)
         cursor.close()
         self._db.release_thread_cursor(cursor)
     
-    @functools.lru_cache(maxsize=16, typed=False)
     def get_request_response(self, response_id):
         return self._requestResponseFactory.fill(response_id)
 
@@ -0,0 +1,137 @@
+#
+# Adjusts how many requests a request runner keeps in flight
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+from collections import deque
+
+class ConcurrencyController(object):
+    """
+    Additive increase, multiplicative decrease of the in-flight window.
+    Each response that comes back without a sign of trouble grows the
+    window by about one request per round trip, as long as latency stays
+    within LATENCY_TOLERANCE times the lowest seen.  When latency climbs
+    past that, the window shrinks slowly.  Timeouts, network errors, 429
+    and 503 responses halve it, at most once per round trip.
+
+    Optional ceilings cap requests in flight to a single host and requests
+    started per second.  With adaptive off, the window stays at initial.
+    """
+
+    LATENCY_TOLERANCE = 2.0
+    THROUGHPUT_PERIOD = 5.0
+    BACKOFF_STATUSES = (429, 503)
+
+    def __init__(self, initial = 10, minimum = 1, maximum = 64, max_host = 0, max_rate = 0, adaptive = True, clock = time.monotonic):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.window = float(min(max(initial, self.minimum), self.maximum))
+        self.max_host = max_host
+        self.max_rate = max_rate
+        self.adaptive = adaptive
+        self.clock = clock
+
+        self.inflight = {}
+        self.host_inflight = {}
+        self.min_latency = None
+        self.smoothed_latency = None
+        self.last_decrease = None
+        self.completed = deque()
+        self.tokens = 1.0
+        self.token_time = self.clock()
+
+    def limit(self):
+        return max(self.minimum, int(self.window))
+
+    def can_send(self, host):
+        if self.max_host <= 0:
+            return True
+        return self.host_inflight.get(host, 0) < self.max_host
+
+    def refill_tokens(self, now):
+        if self.max_rate > 0:
+            # up to one second of requests may be sent in a burst
+            self.tokens = min(float(self.max_rate), self.tokens + (now - self.token_time) * self.max_rate)
+        self.token_time = now
+
+    def send_delay(self):
+        """ Seconds to wait before the requests per second ceiling allows another request """
+        if self.max_rate <= 0:
+            return 0.0
+        self.refill_tokens(self.clock())
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.max_rate
+
+    def request_sent(self, context, host):
+        now = self.clock()
+        if self.max_rate > 0:
+            self.refill_tokens(now)
+            self.tokens -= 1.0
+        self.inflight[context] = (host, now)
+        self.host_inflight[host] = self.host_inflight.get(host, 0) + 1
+
+    def response_received(self, context, status):
+        """ Record the response to a request; status is None when no HTTP response came back """
+        if context not in self.inflight:
+            return
+        host, started = self.inflight.pop(context)
+        count = self.host_inflight.get(host, 0) - 1
+        if count > 0:
+            self.host_inflight[host] = count
+        else:
+            self.host_inflight.pop(host, None)
+
+        now = self.clock()
+        self.completed.append(now)
+        while self.completed and self.completed[0] < now - self.THROUGHPUT_PERIOD:
+            self.completed.popleft()
+
+        if not self.adaptive:
+            return
+
+        if not status or status in self.BACKOFF_STATUSES:
+            round_trip = self.smoothed_latency or 0.0
+            if self.last_decrease is None or now - self.last_decrease >= round_trip:
+                self.window = max(float(self.minimum), self.window / 2.0)
+                self.last_decrease = now
+            return
+
+        latency = now - started
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency = 0.875 * self.smoothed_latency + 0.125 * latency
+
+        if self.smoothed_latency <= self.LATENCY_TOLERANCE * self.min_latency:
+            self.window = min(float(self.maximum), self.window + 1.0 / self.window)
+        else:
+            self.window = max(float(self.minimum), self.window - 0.5 / self.window)
+            # let the baseline follow a target that has become slower overall
+            self.min_latency += 0.01 * (latency - self.min_latency)
+
+    def throughput(self):
+        """ Responses per second over the last THROUGHPUT_PERIOD seconds """
+        now = self.clock()
+        while self.completed and self.completed[0] < now - self.THROUGHPUT_PERIOD:
+            self.completed.popleft()
+        return len(self.completed) / self.THROUGHPUT_PERIOD
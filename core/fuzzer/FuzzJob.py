@@ -0,0 +1,57 @@
+#
+# A web fuzzer attack, producing its requests one at a time
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import itertools
+import uuid
+
+from core.fuzzer.TemplateRenderer import TemplateRenderer
+
+class FuzzJob(object):
+    """
+    Every combination of the payload slots applied to a fuzzer template.
+    Requests are rendered only as they are asked for, so an attack over
+    large payload lists never holds more than the requests in flight.
+    """
+
+    def __init__(self, url, template_items, test_slots, replacements, global_ns, local_ns):
+        """ test_slots is a list of (payload name, payload values); the last slot varies fastest """
+        self.test_slots = test_slots
+        self.renderer = TemplateRenderer(url, template_items, [name for name, payloads in test_slots], replacements, global_ns, local_ns)
+        self.context_prefix = uuid.uuid4().hex
+
+        self.total = 1
+        for name, payloads in self.test_slots:
+            self.total *= len(payloads)
+
+        self.generated = 0
+        self.combinations = itertools.product(*[payloads for name, payloads in self.test_slots])
+
+    def next_request(self):
+        """ Returns (method, url, headers, body, context) of the next request, or None when all are generated """
+        values = next(self.combinations, None)
+        if values is None:
+            return None
+        self.generated += 1
+        method, url, headers, body = self.renderer.render(values)
+        return method, url, headers, body, '%s-%d' % (self.context_prefix, self.generated)
+
+    def is_finished(self):
+        return self.generated >= self.total
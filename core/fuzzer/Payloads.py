@@ -21,6 +21,21 @@
 
 import os
 
+def read_payload_file(filename):
+    """ Payload values from a file, one per line; lines starting with '# ' are comments """
+    f = open(filename, "rb")
+    vals = list()
+    
+    for item in f.readlines():
+        if item.startswith(b"# "):
+            pass
+        else:
+            vals.append(item.rstrip().decode())
+            
+    f.close()
+    
+    return vals
+
 class Payloads(object):
     """ Class that handles the identification and loading of payloads """
     
@@ -37,18 +52,7 @@ class Payloads(object):
         
     def read_data(self, payload_file):
         
-        f = open(os.path.join(self.payloads_dir, payload_file), "rb")
-        vals = list()
-        
-        for item in f.readlines():
-            if item.startswith(b"# "):
-                pass
-            else:
-                vals.append(item.rstrip().decode())
-                
-        f.close()
-        
-        return vals
+        return read_payload_file(os.path.join(self.payloads_dir, payload_file))
     
     def list_function_files(self):
         
@@ -22,14 +22,16 @@
 # along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from PyQt4.QtCore import (Qt, QObject, SIGNAL, QMutex)
+from PyQt4.QtCore import (Qt, QObject, SIGNAL, QMutex, QTimer)
 
 from core.network.StandardNetworkAccessManager import StandardNetworkAccessManager
 from core.network.InMemoryCookieJar import InMemoryCookieJar
 from core.network.NetworkRequester import NetworkRequester
 from core.fuzzer.RequestInstance import RequestInstance
 from core.fuzzer.SequenceManager import SequenceManager
+from core.fuzzer.ConcurrencyController import ConcurrencyController
 
+from urllib import parse as urlparse
 import collections
 import uuid
 
@@ -56,7 +58,20 @@ class RequestRunner(QObject):
         self.cursor = None
         self.framework.subscribe_database_events(self.db_attach, self.db_detach)
 
-        self.max_concurrent = 10
+        self.controller = ConcurrencyController()
+        self.send_timer_pending = False
+
+    @property
+    def max_concurrent(self):
+        return self.controller.limit()
+
+    def concurrency_stats(self):
+        """ Returns (in-flight window, responses per second) """
+        self.qlock.lock()
+        try:
+            return self.controller.limit(), self.controller.throughput()
+        finally:
+            self.qlock.unlock()
 
     def db_attach(self):
         self.Data = self.framework.getDB()
@@ -93,6 +108,15 @@ class RequestRunner(QObject):
         self.networkAccessManager = StandardNetworkAccessManager(self.framework, self.cookieJar)
         self.networkRequester = NetworkRequester(self.framework, self.networkAccessManager, self.response_received, self)
 
+        self.controller = ConcurrencyController(
+            initial = self.framework.get_raft_config_value('RequestRunner.InitialConcurrency', int, 10),
+            minimum = self.framework.get_raft_config_value('RequestRunner.MinConcurrency', int, 1),
+            maximum = self.framework.get_raft_config_value('RequestRunner.MaxConcurrency', int, 64),
+            max_host = self.framework.get_raft_config_value('RequestRunner.MaxHostConcurrency', int, 0),
+            max_rate = self.framework.get_raft_config_value('RequestRunner.MaxRequestsPerSecond', float, 0.0),
+            adaptive = self.framework.get_raft_config_value('RequestRunner.AdaptiveConcurrency', bool, True),
+            )
+
         self.inflight_list = {}
 
     def queue_request(self, method, url, headers, body, context = ''):
@@ -156,6 +180,7 @@ class RequestRunner(QObject):
             if response.context not in self.inflight_list:
                 raise Exception('unexpected response; context=%s' % (response.context))
             request = self.inflight_list.pop(response.context)
+            self.controller.response_received(response.context, response.status)
 
             if response.context in self.request_context:
                 # user request
@@ -223,6 +248,17 @@ class RequestRunner(QObject):
                 else:
                     single_step = False
 
+                if not self.controller.can_send(self.request_host(self.request_queue[0])):
+                    # a response from that host will process the queue again
+                    break
+
+                delay = self.controller.send_delay()
+                if delay > 0:
+                    if not self.send_timer_pending:
+                        self.send_timer_pending = True
+                        QTimer.singleShot(int(delay * 1000) + 1, self.process_delayed)
+                    break
+
                 request = self.request_queue.popleft()
                 if request.context in self.request_context:
                     if self.sequence_enabled and request.sequence_needed:
@@ -238,6 +274,7 @@ class RequestRunner(QObject):
                 self.inflight_list[request.context] = self.networkRequester.send(
                     request.method, request.url, request.headers, request.body, request.context
                     )
+                self.controller.request_sent(request.context, self.request_host(request))
                 if single_step or len(self.inflight_list) >= self.max_concurrent:
                     keep_looping = False
                 
@@ -248,6 +285,19 @@ class RequestRunner(QObject):
             if is_locked:
                 self.qlock.unlock()
         
+    def process_delayed(self):
+        self.qlock.lock()
+        try:
+            self.send_timer_pending = False
+            do_process = len(self.inflight_list) < self.max_concurrent
+        finally:
+            self.qlock.unlock()
+        if do_process:
+            self.process_next()
+
+    def request_host(self, request):
+        return urlparse.urlsplit(request.url).netloc.lower()
+
     def setup_sequence_items(self):
         # this function must be called with lock
         request_list = self.sequenceManager.get_request_list()
@@ -0,0 +1,339 @@
+#
+# Renders fuzzer templates compiled once for an attack
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from io import StringIO
+from urllib import parse as urlparse
+import operator
+import re
+
+# private use characters stand in for payloads and functions while the template is split
+PLACEHOLDER_BASE = 0xE000
+PLACEHOLDER_LIMIT = 0xF8FF
+
+def build_replacements(method, url, user_agent):
+    """ The ${...} builtins of a template sent to url; request_uri is the path and query, which render joins with url """
+    replacements = {}
+    splitted = urlparse.urlsplit(url)
+    replacements['method'] = method.upper()
+    replacements['url'] = url
+    replacements['scheme'] = splitted.scheme or ''
+    replacements['netloc'] = splitted.netloc or ''
+    replacements['host'] = splitted.hostname or ''
+    replacements['path'] = splitted.path or '/'
+    replacements['query'] = splitted.query or ''
+    replacements['fragment'] = splitted.fragment or ''
+    replacements['request_uri'] = urlparse.urlunsplit(('', '', replacements['path'], replacements['query'], ''))
+    replacements['user_agent'] = user_agent
+    return replacements
+
+class CompiledText(object):
+    """ Text with payload and function values filled in by % formatting """
+
+    def __init__(self, fmt, producers):
+        self.fmt = fmt
+        self.producers = producers
+
+    def render(self, values):
+        if not self.producers:
+            return self.fmt
+        return self.fmt % tuple([producer(values) for producer in self.producers])
+
+class TemplateRenderer(object):
+    """
+    A fuzzer template (TemplateDefinition items) compiled for one attack.
+    Static text is joined, builtins are replaced and the request line,
+    headers and body are split once; function items are looked up once
+    and then called directly.  Rendering fills in payload values, taken
+    from a tuple ordered as slot_names.
+
+    Values that could change how the rendered text splits (line breaks,
+    or '$', '{' and '}' that might form a replacement) are rendered and
+    parsed as text like before, so results are the same either way.
+    """
+
+    re_request = re.compile(r'^(\S+)\s+((?:https?://(?:\S+\.)+\w+(?::\d+)?)?/.*)\s+HTTP/\d+\.\d+\s*$', re.I)
+    re_replacement = re.compile(r'\$\{(\w+)\}')
+    re_unsafe_value = re.compile('[\r\n\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029${}]')
+    re_placeholder = re.compile('[\ue000-\uf8ff]')
+    # paths urljoin would change: dot segments, removed characters, empty query, fragment or params
+    re_unjoinable_uri = re.compile(r'/\.|[\t\r\n]|[?#;]$|\?#|;[?#]')
+
+    def __init__(self, url, template_items, slot_names, replacements, global_ns, local_ns):
+        self.url = url
+        self.template_items = template_items
+        self.slot_names = list(slot_names)
+        self.slots = dict((name, index) for index, name in enumerate(self.slot_names))
+        self.replacements = replacements
+        self.global_ns = global_ns
+        self.local_ns = local_ns
+        self.functions = {}
+        splitted = urlparse.urlsplit(url)
+        self.origin = None
+        if splitted.scheme in ('http', 'https') and splitted.netloc:
+            self.origin = '%s://%s' % (splitted.scheme, splitted.netloc)
+        self.compiled = self.compile()
+
+    def render(self, values):
+        """ Returns (method, url, headers, body) for payload values ordered as slot_names """
+        if self.compiled:
+            if self.payload_getter is not None:
+                dynamic = self.payload_getter(values)
+            else:
+                dynamic = [producer(values) for producer in self.producers]
+            if not self.re_unsafe_value.search(''.join(dynamic)):
+                result = self.render_compiled(dynamic)
+                if result is not None:
+                    return result
+        return self.render_text(values)
+
+    def render_compiled(self, dynamic):
+        if self.request_line is None:
+            method, url = self.method, self.request_url
+        else:
+            fmt, getter = self.request_line
+            m = self.re_request.match(fmt % getter(dynamic))
+            if not m:
+                return None
+            method, url = m.group(1), self.join_url(m.group(2))
+
+        if self.header_values is not None:
+            headers = self.header_values.copy()
+        else:
+            headers = {}
+            for name, value, fmt, getter in self.header_lines:
+                if fmt is not None:
+                    line = fmt % getter(dynamic)
+                    if not line:
+                        # would have ended the headers
+                        return None
+                    if ':' not in line:
+                        continue
+                    name, value = [v.strip() for v in line.split(':', 1)]
+                headers[name] = value
+
+        if self.body_getter is None:
+            body = self.body_fmt
+        else:
+            body = self.body_fmt % self.body_getter(dynamic)
+
+        return method, url, headers, body
+
+    def join_url(self, uri):
+        """ urljoin of the attack url and uri, without parsing either for a plain absolute path """
+        if self.origin and uri.startswith('/') and not uri.startswith('//') and not self.re_unjoinable_uri.search(uri):
+            return self.origin + uri
+        return urlparse.urljoin(self.url, uri)
+
+    def compile(self):
+        """ Split the template with placeholders for its values; returns False if it can't be """
+        self.producers = []
+        for value in self.replacements.values():
+            if self.re_placeholder.search(str(value)):
+                return False
+        placeholder_io = StringIO()
+        for item in self.template_items:
+            if item.is_text():
+                if self.re_placeholder.search(item.item_value):
+                    return False
+                placeholder_io.write(item.item_value)
+            elif item.is_builtin():
+                placeholder_io.write('${'+item.item_value+'}')
+            elif item.is_payload() or item.is_function():
+                if PLACEHOLDER_BASE + len(self.producers) > PLACEHOLDER_LIMIT:
+                    return False
+                placeholder_io.write(chr(PLACEHOLDER_BASE + len(self.producers)))
+                self.producers.append(self.compile_producer(item))
+            else:
+                raise Exception('unsupported template parameters: ' + repr(item))
+
+        # with only payloads in the template, one getter picks all the values
+        self.payload_getter = None
+        payload_indexes = [self.slots[item.item_value] for item in self.template_items if item.is_payload()]
+        if self.producers and len(payload_indexes) == len(self.producers):
+            if 1 == len(payload_indexes):
+                self.payload_getter = lambda values: (values[payload_indexes[0]],)
+            else:
+                self.payload_getter = operator.itemgetter(*payload_indexes)
+
+        template = placeholder_io.getvalue()
+        headers, body = self.split_template(template)
+
+        lines = headers.splitlines()
+        if not lines or not lines[0]:
+            return False
+        request_line = self.substitute(lines[0])
+        self.request_line = None
+        if self.re_placeholder.search(request_line):
+            self.request_line = self.compile_line(request_line)
+        else:
+            m = self.re_request.match(request_line)
+            if not m:
+                raise Exception('Invalid HTTP request: failed to match request line: %s' % (request_line))
+            self.method, self.request_url = m.group(1), urlparse.urljoin(self.url, m.group(2))
+
+        # (name, value, None, None) for static lines, (None, None, format, getter) for the rest
+        self.header_lines = []
+        for line in lines[1:]:
+            if not line:
+                break
+            line = self.substitute(line)
+            if self.re_placeholder.search(line):
+                fmt, getter = self.compile_line(line)
+                self.header_lines.append((None, None, fmt, getter))
+            elif ':' in line:
+                name, value = [v.strip() for v in line.split(':', 1)]
+                self.header_lines.append((name, value, None, None))
+        self.header_values = None
+        if all(fmt is None for name, value, fmt, getter in self.header_lines):
+            self.header_values = dict((name, value) for name, value, fmt, getter in self.header_lines)
+
+        self.body_fmt, self.body_getter = self.compile_line(self.substitute(body))
+        return True
+
+    def compile_line(self, line):
+        """ % format and getter of the dynamic values for text with placeholders """
+        fmt_io = StringIO()
+        indexes = []
+        prev = 0
+        for m in self.re_placeholder.finditer(line):
+            fmt_io.write(line[prev:m.start()].replace('%', '%%'))
+            fmt_io.write('%s')
+            indexes.append(ord(m.group(0)) - PLACEHOLDER_BASE)
+            prev = m.end()
+        if not indexes:
+            return line, None
+        fmt_io.write(line[prev:].replace('%', '%%'))
+        # values are strings, so a single one formats without a tuple
+        return fmt_io.getvalue(), operator.itemgetter(*indexes)
+
+    def compile_producer(self, item):
+        if item.is_payload():
+            return operator.itemgetter(self.slots[item.item_value])
+        function = self.lookup_function(item.item_value)
+        argument = self.compile_text(item.items)
+        return lambda values: str(function(argument.render(values)))
+
+    def compile_text(self, items):
+        text_io = StringIO()
+        fmt_io = StringIO()
+        producers = []
+        for item in items:
+            if item.is_text():
+                text_io.write(item.item_value)
+                fmt_io.write(item.item_value.replace('%', '%%'))
+            elif item.is_builtin():
+                text_io.write('${'+item.item_value+'}')
+                fmt_io.write('${'+item.item_value+'}')
+            elif item.is_payload() or item.is_function():
+                fmt_io.write('%s')
+                producers.append(self.compile_producer(item))
+            else:
+                raise Exception('unsupported template parameters: ' + repr(item))
+        if not producers:
+            return CompiledText(text_io.getvalue(), producers)
+        return CompiledText(fmt_io.getvalue(), producers)
+
+    def lookup_function(self, name):
+        if name not in self.functions:
+            self.functions[name] = eval(name, self.global_ns, self.local_ns)
+        return self.functions[name]
+
+    def substitute(self, text):
+        if '$' in text:
+            # TODO: this allows for missing entries -- is this good?
+            return self.re_replacement.sub(lambda m: self.replacements.get(m.group(1)), text)
+        return text
+
+    def split_template(self, template):
+        """ Returns (headers, body) of template, split at the first empty line """
+        prev = 0
+        while True:
+            n = template.find('\n', prev)
+            if -1 == n:
+                break
+            if n > 0 and '\r' == template[n-1]:
+                line = template[prev:n-1]
+            else:
+                line = template[prev:n]
+
+            if 0 == len(line):
+                # end of headers
+                return template[0:n+1], template[n+1:]
+            prev = n + 1
+
+        return template, ''
+
+    def render_text(self, values):
+        """ Render the template as text and parse it, for values the compiled form can't take """
+        data = dict(zip(self.slot_names, values))
+        template_io = StringIO()
+        self.apply_template_parameters(template_io, data, self.template_items)
+        return self.process_template(self.url, template_io.getvalue(), self.replacements)
+
+    def apply_template_parameters(self, template_io, data, template_items):
+
+        for item in template_items:
+            if item.is_text():
+                template_io.write(item.item_value)
+            elif item.is_builtin():
+                template_io.write('${'+item.item_value+'}')
+            elif item.is_payload():
+                template_io.write(data[item.item_value])
+            elif item.is_function():
+                temp_io = StringIO()
+                self.apply_template_parameters(temp_io, data, item.items)
+                temp_result = temp_io.getvalue()
+                temp_io = None
+                result = self.lookup_function(item.item_value)(temp_result)
+                template_io.write(str(result))
+            else:
+                raise Exception('unsupported template parameters: ' + repr(item))
+
+    def process_template(self, url, template, replacements):
+
+        method, uri = '' ,''
+        headers, body = self.split_template(template)
+
+        # TODO: could work from ordered dict to main order?
+        headers_dict = {}
+        first = True
+        for line in headers.splitlines():
+            if not line:
+                break
+            line = self.substitute(line)
+            if first:
+                m = self.re_request.match(line)
+                if not m:
+                    raise Exception('Invalid HTTP request: failed to match request line: %s' % (line))
+                method = m.group(1)
+                uri = m.group(2)
+                first = False
+                continue
+
+            if ':' in line:
+                name, value = [v.strip() for v in line.split(':', 1)]
+                headers_dict[name] = value
+
+        body = self.substitute(body)
+
+        url = urlparse.urljoin(url, uri)
+
+        return (method, url, headers_dict, body)
@@ -0,0 +1,382 @@
+#
+# Sends requests on asyncio, without a Qt event loop
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import ssl
+import time
+from collections import deque
+from io import BytesIO
+from urllib import parse as urlparse
+
+from core.fuzzer.ConcurrencyController import ConcurrencyController
+
+# requests that may be pipelined, and sent again if the connection drops before the response
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# requests resent when a kept-alive connection drops them; anything else may already have taken effect
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+DEFAULT_PORTS = {'http' : 80, 'https' : 443}
+
+class ConnectionLost(Exception):
+    pass
+
+class AsyncResponse(object):
+    def __init__(self, version, status, reason, headers, raw_headers, body, hostip):
+        self.version = version
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.raw_headers = raw_headers
+        self.body = body
+        self.hostip = hostip
+
+    def header(self, name, default = None):
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def keep_alive(self):
+        connection = self.header('connection', '').lower()
+        if 'close' in connection:
+            return False
+        if 'HTTP/1.0' == self.version:
+            return 'keep-alive' in connection
+        return True
+
+class HttpConnection(object):
+    """
+    One keep-alive connection.  Requests are written as they are sent and
+    their responses read back in order by a single reader task, so up to
+    pipeline depth safe requests can share the connection at once.
+    """
+
+    def __init__(self, pool, reader, writer):
+        self.pool = pool
+        self.reader = reader
+        self.writer = writer
+        self.pending = deque()
+        self.reusable = True
+        self.confirmed = False
+        self.responses = 0
+        self.reader_task = None
+        peername = writer.get_extra_info('peername')
+        self.hostip = peername[0] if peername else None
+
+    def is_idle(self):
+        return self.reusable and not self.pending
+
+    def can_pipeline(self, depth):
+        if not self.reusable or not self.confirmed or len(self.pending) >= depth:
+            return False
+        return all(method in SAFE_METHODS for method, future in self.pending)
+
+    def send(self, method, data):
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((method, future))
+        self.writer.write(data)
+        if self.reader_task is None:
+            self.reader_task = asyncio.ensure_future(self.read_responses())
+        return future
+
+    def close(self, error = None):
+        self.reusable = False
+        self.writer.close()
+        while self.pending:
+            method, future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error or ConnectionLost('connection closed'))
+        self.pool.remove(self)
+
+    async def read_responses(self):
+        error = None
+        try:
+            while self.pending:
+                method, future = self.pending[0]
+                response = await self.read_response(method)
+                self.pending.popleft()
+                self.responses += 1
+                if not future.done():
+                    future.set_result(response)
+                if not response.keep_alive:
+                    self.reusable = False
+                    break
+                self.confirmed = 'HTTP/1.1' == response.version
+                self.pool.wake()
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError, OSError) as e:
+            error = ConnectionLost(str(e) or e.__class__.__name__)
+        except (ConnectionLost, ValueError) as e:
+            error = e
+        finally:
+            self.reader_task = None
+        if error is not None or not self.reusable:
+            self.close(error)
+
+    async def read_response(self, method):
+        reader = self.reader
+        while True:
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionLost('connection closed before response')
+            headers_io = BytesIO()
+            headers_io.write(status_line)
+            parts = status_line.decode('latin-1').strip().split(' ', 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise ValueError('invalid status line: %r' % (status_line))
+            version, status, reason = parts[0], int(parts[1]), (parts[2] if len(parts) > 2 else '')
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionLost('connection closed in response headers')
+                headers_io.write(line)
+                if line in (b'\r\n', b'\n'):
+                    break
+                if b':' in line:
+                    name, value = line.decode('latin-1').split(':', 1)
+                    name = name.strip().lower()
+                    if name in headers:
+                        headers[name] += ', ' + value.strip()
+                    else:
+                        headers[name] = value.strip()
+            # interim responses are followed by the real one
+            if 100 <= status < 200 and 101 != status:
+                continue
+            break
+
+        response = AsyncResponse(version, status, reason, headers, headers_io.getvalue(), b'', self.hostip)
+        if 'HEAD' == method or status in (101, 204, 304):
+            return response
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            response.body = await self.read_chunked()
+        elif 'content-length' in headers:
+            response.body = await reader.readexactly(int(headers['content-length']))
+        else:
+            response.body = await reader.read()
+            self.reusable = False
+            headers['connection'] = 'close'
+        return response
+
+    async def read_chunked(self):
+        reader = self.reader
+        body_io = BytesIO()
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionLost('connection closed in chunked body')
+            size = int(line.split(b';', 1)[0].strip() or b'0', 16)
+            if 0 == size:
+                break
+            body_io.write(await reader.readexactly(size))
+            await reader.readline()
+        # trailers
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+        return body_io.getvalue()
+
+class HostPool(object):
+    def __init__(self):
+        self.connections = []
+        self.opening = 0
+        self.waiters = deque()
+        self.pipelining = True
+
+    def remove(self, connection):
+        if connection in self.connections:
+            self.connections.remove(connection)
+        self.wake()
+
+    def wake(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+class AsyncRequestEngine(object):
+    """
+    Sends requests over pooled keep-alive connections, at most
+    max_host_connections per host.  Safe requests with no body are
+    pipelined up to pipeline_depth deep on connections that have answered
+    with HTTP/1.1 keep-alive.  The number of requests in flight, and the
+    optional requests per second ceiling, come from a ConcurrencyController
+    so the window adapts like the GUI request runner's.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, controller = None, max_host_connections = 6, pipeline_depth = 1, timeout = 30.0, user_agent = None):
+        self.controller = controller or ConcurrencyController()
+        self.max_host_connections = max(1, max_host_connections)
+        self.pipeline_depth = max(1, pipeline_depth)
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.pools = {}
+        self.ssl_context = ssl.create_default_context()
+        # like the GUI, certificate errors are ignored
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+
+    def run(self, request_source, callback):
+        """
+        Send every (method, url, headers, body, context) from request_source;
+        callback(request, response, request_headers, elapsed, started, error)
+        is called as each one completes, with response None on error.
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.run_requests(request_source, callback))
+        finally:
+            self.close_all()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    async def run_requests(self, request_source, callback):
+        active = set()
+        requests = iter(request_source)
+        exhausted = False
+        while True:
+            delay = None
+            while not exhausted and len(active) < self.controller.limit():
+                delay = self.controller.send_delay()
+                if delay > 0:
+                    break
+                delay = None
+                request = next(requests, None)
+                if request is None:
+                    exhausted = True
+                    break
+                active.add(asyncio.ensure_future(self.send_request(request)))
+            if not active:
+                if exhausted:
+                    break
+                await asyncio.sleep(delay or 0)
+                continue
+            done, active = await asyncio.wait(active, timeout = delay, return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                callback(*task.result())
+
+    async def send_request(self, request):
+        method, url, headers, body, context = request
+        host = urlparse.urlsplit(url).netloc.lower()
+        self.controller.request_sent(context, host)
+        started = time.time()
+        response, request_headers, error = None, b'', None
+        try:
+            response, request_headers = await self.fetch(method, url, headers, body)
+        except asyncio.TimeoutError:
+            error = 'timed out after %s seconds' % (self.timeout)
+        except (ConnectionLost, ConnectionError, OSError, ValueError) as e:
+            error = str(e) or e.__class__.__name__
+        elapsed = int((time.time() - started)*1000)
+        self.controller.response_received(context, response.status if response else None)
+        return request, response, request_headers, elapsed, started, error
+
+    def build_request(self, method, splitted, headers, body):
+        """ Returns (request head, body) as bytes """
+        names = set(name.lower() for name in headers)
+        uri = urlparse.urlunsplit(('', '', splitted.path or '/', splitted.query, ''))
+        head_io = BytesIO()
+        head_io.write(('%s %s HTTP/1.1\r\n' % (method, uri)).encode('utf-8'))
+        if 'host' not in names:
+            head_io.write(('Host: %s\r\n' % (splitted.netloc)).encode('utf-8'))
+        if self.user_agent and 'user-agent' not in names:
+            head_io.write(('User-Agent: %s\r\n' % (self.user_agent)).encode('utf-8'))
+        for name, value in headers.items():
+            if name.lower() in ('content-length', 'transfer-encoding'):
+                continue
+            head_io.write(('%s: %s\r\n' % (name, value)).encode('utf-8'))
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        body = body or b''
+        if body or method not in SAFE_METHODS:
+            head_io.write(('Content-Length: %d\r\n' % (len(body))).encode('ascii'))
+        head_io.write(b'\r\n')
+        return head_io.getvalue(), body
+
+    async def fetch(self, method, url, headers, body):
+        """ Returns (response, request head) """
+        splitted = urlparse.urlsplit(url)
+        scheme = splitted.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not splitted.hostname:
+            raise ValueError('unsupported url: %s' % (url))
+        key = (scheme, splitted.hostname.lower(), splitted.port or DEFAULT_PORTS[scheme])
+        request_head, body = self.build_request(method, splitted, headers, body)
+        safe = method in SAFE_METHODS and not body
+
+        attempts = 0
+        while True:
+            attempts += 1
+            connection = await self.get_connection(key, safe)
+            reused = connection.responses > 0
+            pipelined = len(connection.pending) > 0
+            future = connection.send(method, request_head + body)
+            try:
+                response = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                return response, request_head
+            except asyncio.TimeoutError:
+                future.cancel()
+                connection.close(ConnectionLost('connection closed after a timeout'))
+                raise
+            except ConnectionLost:
+                if pipelined:
+                    # the server dropped requests queued behind another; stop pipelining to it
+                    self.pools[key].pipelining = False
+                # a kept-alive connection may be closed by the server at any time
+                if attempts >= self.MAX_ATTEMPTS or method not in RETRY_METHODS or not (reused or pipelined):
+                    raise
+
+    async def get_connection(self, key, safe):
+        pool = self.pools.setdefault(key, HostPool())
+        while True:
+            if safe and self.pipeline_depth > 1 and pool.pipelining:
+                candidates = [c for c in pool.connections if c.can_pipeline(self.pipeline_depth)]
+                if candidates:
+                    return min(candidates, key = lambda c: len(c.pending))
+            for connection in pool.connections:
+                if connection.is_idle():
+                    return connection
+            if len(pool.connections) + pool.opening < self.max_host_connections:
+                pool.opening += 1
+                try:
+                    connection = await self.open_connection(pool, key)
+                except BaseException:
+                    pool.wake()
+                    raise
+                finally:
+                    pool.opening -= 1
+                pool.connections.append(connection)
+                return connection
+            waiter = asyncio.get_event_loop().create_future()
+            pool.waiters.append(waiter)
+            await waiter
+
+    async def open_connection(self, pool, key):
+        scheme, host, port = key
+        ssl_context = self.ssl_context if 'https' == scheme else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl = ssl_context, limit = 1 << 20), self.timeout)
+        return HttpConnection(pool, reader, writer)
+
+    def close_all(self):
+        for pool in self.pools.values():
+            for connection in list(pool.connections):
+                connection.close()
+        self.pools = {}
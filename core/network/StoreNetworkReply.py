@@ -288,18 +288,24 @@ class StoreNetworkReply(QNetworkReply):
                           status, self.datalen, elapsed, time.asctime(time.localtime(self.requestTime)), None, None, None, 
                           self.method, hostip, contentType, '%s-%s' % ('RAFT', 'ResponseReader'), self.host]
 
-            # use a fresh cursor to avoid threading issues
-            cursor = self.Data.allocate_thread_cursor()
-            rowid = self.Data.insert_responses(cursor, insertlist)
-            cursor.close()
-            self.Data.release_thread_cursor(cursor)
+            writer = self.Data.get_write_behind()
+            if writer is not None:
+                # row id is assigned now; the row itself is written with the next batch
+                rowid = writer.queue_response(insertlist)
+            else:
+                # use a fresh cursor to avoid threading issues
+                cursor = self.Data.allocate_thread_cursor()
+                rowid = self.Data.insert_responses(cursor, insertlist)
+                cursor.close()
+                self.Data.release_thread_cursor(cursor)
 
             # TODO: should use a separate constant?
             self.setAttribute(QNetworkRequest.User, rowid)
             self.setAttribute(QNetworkRequest.User + 1, self.requestId)
             self.setAttribute(QNetworkRequest.User + 2, self.xrefId)
 
-            self.framework.signal_response_data_added()
+            if writer is None:
+                self.framework.signal_response_data_added()
         
         self.is_finished = True
         self.emit(SIGNAL("readyRead()"))
@@ -38,6 +38,9 @@ class RequestResponse(object):
         self._responseUTF8Headers = None
         self._responseUTF8Body = None
         self._rawResponse = None
+        self._contentLoader = None
+        self._requestBody = b''
+        self._responseBody = b''
 
         ######
         self.Id = ''
@@ -61,6 +64,32 @@ class RequestResponse(object):
         self.baseType = ''
         ######
 
+    def set_content_loader(self, contentLoader):
+        """ Read the bodies on first use by passing their hashes to contentLoader """
+        self._contentLoader = contentLoader
+        self._requestBody = None
+        self._responseBody = None
+
+    @property
+    def requestBody(self):
+        if self._requestBody is None:
+            self._requestBody = self._contentLoader(self.requestHash)
+        return self._requestBody
+
+    @requestBody.setter
+    def requestBody(self, value):
+        self._requestBody = value
+
+    @property
+    def responseBody(self):
+        if self._responseBody is None:
+            self._responseBody = self._contentLoader(self.responseHash)
+        return self._responseBody
+
+    @responseBody.setter
+    def responseBody(self, value):
+        self._responseBody = value
+
     @property
     def results(self):
         """ Get the extracted data results"""
@@ -68,9 +97,9 @@ class RequestResponse(object):
             return self._results
 
         if 'html' == self.baseType:
-            self._results = self._framework.getContentExtractor().getExtractor('html').process(self.responseBody, self.responseUrl, self.charset, None)
+            self._results = self.extract_results('html', self.responseBody)
         elif 'javascript' == self.baseType:
-            self._results = self._framework.getContentExtractor().getExtractor('javascript').process(self.responseUTF8Body, self.responseUrl, self.charset, None)
+            self._results = self.extract_results('javascript', self.responseUTF8Body)
         else:
             # TODO: implement more types
             self._results = None
@@ -89,6 +118,15 @@ class RequestResponse(object):
 
         return self._results
 
+    def extract_results(self, content_type, content):
+        extractor = self._framework.getContentExtractor().getExtractor(content_type)
+        extract = lambda: extractor.process(content, self.responseUrl, self.charset, None)
+        extractionCache = self._framework.getExtractionCache()
+        if extractionCache is None:
+            return extract()
+        # the stored hash is of the raw body, which is what the charset is applied to
+        return extractionCache.process(content_type, self.responseBody, self.responseHash, self.responseUrl, self.charset, extract)
+
     @property
     def requestParams(self):
         """ Get a Dictionary containing all request parameters """
@@ -25,6 +25,7 @@
 from PyQt4.QtCore import QObject, QMutex
 
 from core.database.constants import ResponsesTable
+from core.data.LRUCache import LRUCache
 from core.responses.RequestResponse import RequestResponse
 from actions import interface
 
@@ -41,6 +42,8 @@ class RequestResponseFactory(QObject):
         self.qlock = QMutex()
         self.Data = None
         self.cursor = None
+        # decompressed bodies by hash, shared by every RequestResponse this factory fills
+        self.contentCache = LRUCache(4096, 64*1024*1024, len)
         self.framework.subscribe_database_events(self.db_attach, self.db_detach)
 
         self.contentExtractor = self.framework.getContentExtractor()
@@ -53,8 +56,13 @@ class RequestResponseFactory(QObject):
         self.cursor = self.Data.allocate_thread_cursor()
 
     def db_detach(self):
-        self.close_cursor()
-        self.Data = None
+        self.qlock.lock()
+        try:
+            self.close_cursor()
+            self.contentCache.clear()
+            self.Data = None
+        finally:
+            self.qlock.unlock()
 
     def close_cursor(self):
         if self.cursor:
@@ -63,45 +71,65 @@ class RequestResponseFactory(QObject):
             self.cursor = None
 
     def fill(self, Id):
+        """ Returns the RequestResponse for Id, with the bodies read when first used """
         self.qlock.lock()
         try:
-            row = self.Data.read_responses_by_id(self.cursor, Id)
+            row = self.Data.read_responses_metadata_by_id(self.cursor, Id)
             if not row:
                 return None
 
             rr = self.fill_by_row(row)
+            rr.set_content_loader(self.read_content)
 
         finally:
             self.qlock.unlock()
 
         return rr
 
-    def fill_by_row(self, row):
+    def read_content(self, hashval):
+        if not hashval:
+            return b''
+        self.qlock.lock()
+        try:
+            if self.contentCache.has_key(hashval):
+                return self.contentCache.getitem(hashval)
+            if self.Data is None:
+                return b''
+            content = self.Data.read_content_data(self.cursor, hashval) or b''
+            self.contentCache.setitem(hashval, content)
+            return content
+        finally:
+            self.qlock.unlock()
 
+    def fill_by_row(self, row):
         responseItems = interface.data_row_to_response_items(row)
-
-        rr = RequestResponse(self.framework)
-        rr.Id = responseItems[ResponsesTable.ID]
-        rr.responseUrl = responseItems[ResponsesTable.URL]
-        rr.requestHeaders = responseItems[ResponsesTable.REQ_HEADERS]
-        rr.requestBody = responseItems[ResponsesTable.REQ_DATA]
-        rr.responseHeaders = responseItems[ResponsesTable.RES_HEADERS]
-        rr.responseBody = responseItems[ResponsesTable.RES_DATA]
-        rr.responseContentType = responseItems[ResponsesTable.RES_CONTENT_TYPE]
-        rr.requestHost = responseItems[ResponsesTable.REQ_HOST]
-        rr.responseStatus = responseItems[ResponsesTable.STATUS]
-        rr.responseHash = responseItems[ResponsesTable.RES_DATA_HASHVAL]
-        rr.requestHash = responseItems[ResponsesTable.REQ_DATA_HASHVAL]
-        rr.requestTime = responseItems[ResponsesTable.REQTIME]
-        rr.requestDate = responseItems[ResponsesTable.REQDATE]
-        rr.notes = responseItems[ResponsesTable.NOTES]
-        rr.confirmed = responseItems[ResponsesTable.CONFIRMED]
-
-        if not rr.responseContentType:
-            # TODO: fix this to use better algorithm
-            rr.responseContentType = 'text/html'
-
-        rr.contentType, rr.charset = self.contentExtractor.parseContentType(rr.responseContentType)
-        rr.baseType = self.contentExtractor.getBaseType(rr.contentType)
-
-        return rr
+        return request_response_from_items(self.framework, self.contentExtractor, responseItems)
+
+def request_response_from_items(framework, contentExtractor, responseItems):
+    """ Build a RequestResponse from response items; usable without a database (e.g. in analysis workers) """
+
+    rr = RequestResponse(framework)
+    rr.Id = responseItems[ResponsesTable.ID]
+    rr.responseUrl = responseItems[ResponsesTable.URL]
+    rr.requestHeaders = responseItems[ResponsesTable.REQ_HEADERS]
+    rr.requestBody = responseItems[ResponsesTable.REQ_DATA]
+    rr.responseHeaders = responseItems[ResponsesTable.RES_HEADERS]
+    rr.responseBody = responseItems[ResponsesTable.RES_DATA]
+    rr.responseContentType = responseItems[ResponsesTable.RES_CONTENT_TYPE]
+    rr.requestHost = responseItems[ResponsesTable.REQ_HOST]
+    rr.responseStatus = responseItems[ResponsesTable.STATUS]
+    rr.responseHash = responseItems[ResponsesTable.RES_DATA_HASHVAL]
+    rr.requestHash = responseItems[ResponsesTable.REQ_DATA_HASHVAL]
+    rr.requestTime = responseItems[ResponsesTable.REQTIME]
+    rr.requestDate = responseItems[ResponsesTable.REQDATE]
+    rr.notes = responseItems[ResponsesTable.NOTES]
+    rr.confirmed = responseItems[ResponsesTable.CONFIRMED]
+
+    if not rr.responseContentType:
+        # TODO: fix this to use better algorithm
+        rr.responseContentType = 'text/html'
+
+    rr.contentType, rr.charset = contentExtractor.parseContentType(rr.responseContentType)
+    rr.baseType = contentExtractor.getBaseType(rr.contentType)
+
+    return rr
@@ -23,7 +23,12 @@
 # along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import sys
 import inspect
+import hashlib
+import json
+import ast
 
 from PyQt4.QtCore import Qt, QObject, SIGNAL, QThread, QTimer, QMutex
 
@@ -36,7 +41,12 @@ except ImportError:
 from io import StringIO
 
 from analysis.AnalyzerList import AnalyzerList
+from analysis.AnalysisEngine import AnalysisEngine
 from core.database.constants import ResponsesTable
+from actions import interface
+
+# modules below here, or in an analyzer path, count towards an analyzer's hash
+RAFT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 class AnalyzerThread(QThread):
     def __init__(self, framework, parent = None):
@@ -112,25 +122,21 @@ class AnalyzerThread(QThread):
     def analyze_content(self):
         """ Perform analysis on the captured content"""
 
-        #TODO:  NEW DB THREAD TO HOLD RESPONSES, ANOTHER FOR WRITING RESULTS
         scopeController = self.framework.getScopeController()
-        response = self.Data.read_all_responses(self.read_cursor)
-        response_IDs = []
-        for row in response:
-            dbrow = [m or '' for m in row]
-            Id = dbrow[ResponsesTable.ID]
-            url = dbrow[ResponsesTable.URL]
-            if scopeController.isUrlInScope(url, url):
-                response_IDs.append(Id)
-            
+
         #Instantiate all found analyzers
         analyzerobjects = AnalyzerList(self.framework)
         analyzerobjects.instantiate_analyzers()
         
         analysisrunid=self.Data.analysis_start(self.cursor)
-        
-        #TODO - Consider threading from here down
 
+        # only responses added since the last completed run are analyzed, unless an analyzer changed
+        lastrun=self.Data.analysis_get_last_run(self.cursor)
+        maxresponseid=self.Data.read_max_response_id(self.read_cursor)
+        fullanalyzers=[]
+        incrementalanalyzers=[]
+        sourcedigests={}
+        
         for x in analyzerobjects:
             
             #dbconfig=self.Data.get_config_value(self.read_cursor, 'ANALYSIS', str(x.__class__))
@@ -140,47 +146,34 @@ class AnalyzerThread(QThread):
             x.preanalysis()
             x.initResultsData()
             resultinstance=x.getResults()
+            classname=str(x.__class__).translate('<>')
+            confighash=self.analyzer_hash(x, sourcedigests)
             x.analyzerinstanceid=self.Data.analysis_add_analyzer_instance(self.cursor, 
                                                                           analysisrunid,
-                                                                          str(x.__class__).translate('<>'),
-                                                                          x.friendlyname,x.desc, self.result_type_to_string(resultinstance))     
+                                                                          classname,
+                                                                          x.friendlyname,x.desc, self.result_type_to_string(resultinstance),
+                                                                          confighash)
+            if lastrun is not None and self.carry_forward(x, lastrun[0], classname, confighash):
+                incrementalanalyzers.append(x)
+            else:
+                fullanalyzers.append(x)
         
         fullanalysistext=StringIO()
 
-        for Id in response_IDs:
-            transaction = self.framework.get_request_response(Id)
-            for analyzer in analyzerobjects:
-                try:
-                    
-                    analyzer.analyzeTransaction(transaction,analyzer.getResults())
-                    tempanalysisresults=analyzer.getResults()
-                    
-                    
-                    #If there were results for this page, add them to the DB
-                    if transaction.Id in tempanalysisresults.pages:
-                        pageresultset=self.Data.analysis_add_resultset(self.cursor, analyzer.analyzerinstanceid,
-                                                                       transaction.Id,False,transaction.responseUrl,
-                                                                       self.result_type_to_string(tempanalysisresults.pages[transaction.Id]))
-                        for result in tempanalysisresults.pages[transaction.Id].results:
-                            self.Data.analysis_add_singleresult(self.cursor, 
-                                                                pageresultset,
-                                                                result.severity,
-                                                                result.certainty,
-                                                                result.type,
-                                                                result.desc,
-                                                                #TODO: Consider db structure to handle data field
-                                                                str(result.data),
-                                                                result.span,
-                                                                self.result_type_to_string(result))
-                        for key,value in list(tempanalysisresults.pages[transaction.Id].stats.items()):
-                            self.Data.analysis_add_stat(self.cursor, pageresultset, key, value)
-                except Exception as e:
-                    # TODO: add real debugging support
-                    self.framework.debug_log('Transaction ID: ' + str(transaction.Id))
-                    self.framework.report_exception(e)
-                    
+        # responses are read once and analyzed in worker processes; page results are written as they come back
+        passes=[(fullanalyzers, 0)]
+        if incrementalanalyzers:
+            passes.append((incrementalanalyzers, lastrun[1]))
+        for analyzers, afterId in passes:
+            if analyzers:
+                self.analyze_responses(scopeController, analyzers, afterId, maxresponseid)
+
         #Post Analysis
         for analyzer in analyzerobjects:
+                state=analyzer.getAnalysisState()
+                if state is not None:
+                    self.Data.analysis_set_instance_state(self.cursor, analyzer.analyzerinstanceid, repr(state))
+                    analyzer.mergeAnalysisState(state)
                 results=analyzer.getResults()
                 analyzer.postanalysis(results)
                 
@@ -205,6 +198,7 @@ class AnalyzerThread(QThread):
                     for key,value in list(results.overall[context].stats.items()):
                         self.Data.analysis_add_stat(self.cursor, overallresultset, key, value)
                 
+        self.Data.analysis_finish(self.cursor, analysisrunid, maxresponseid)
         self.Data.commit()
         #Output results to analysis tab
         #for analyzer in analyzerobjects:
@@ -212,5 +206,106 @@ class AnalyzerThread(QThread):
 
         return ''
 
-    
-    
+    def analyze_responses(self, scopeController, analyzers, afterId, throughId):
+        engine = AnalysisEngine(analyzers, self.framework.get_analyzer_paths())
+        responses = self.in_scope_responses(scopeController, engine, afterId, throughId)
+        for analyzer, Id, url, pageresults in engine.run(responses):
+            pageresultset=self.Data.analysis_add_resultset(self.cursor, analyzer.analyzerinstanceid,
+                                                           Id,False,url,
+                                                           self.result_type_to_string(pageresults))
+            for result in pageresults.results:
+                self.Data.analysis_add_singleresult(self.cursor, 
+                                                    pageresultset,
+                                                    result.severity,
+                                                    result.certainty,
+                                                    result.type,
+                                                    result.desc,
+                                                    #TODO: Consider db structure to handle data field
+                                                    str(result.data),
+                                                    result.span,
+                                                    self.result_type_to_string(result))
+            for key,value in list(pageresults.stats.items()):
+                self.Data.analysis_add_stat(self.cursor, pageresultset, key, value)
+
+        for message in engine.errors:
+            # TODO: add real debugging support
+            self.framework.debug_log(message)
+
+    def analyzer_hash(self, analyzer, sourcedigests):
+        """Hash of the source the analyzer depends on, its version, configuration and the scope; a change means earlier results can't be reused"""
+        sha = hashlib.sha1()
+        filenames = self.analyzer_sources(analyzer)
+        if not filenames:
+            # no source to compare against, so never reuse results
+            return None
+        for filename in filenames:
+            if filename not in sourcedigests:
+                try:
+                    with open(filename, 'rb') as fh:
+                        sourcedigests[filename] = hashlib.sha1(fh.read()).hexdigest()
+                except IOError:
+                    sourcedigests[filename] = None
+            if sourcedigests[filename] is None:
+                return None
+            sha.update(('%s %s\n' % (os.path.relpath(filename, RAFT_DIR), sourcedigests[filename])).encode('utf-8'))
+        sha.update(str(getattr(analyzer, 'analyzerversion', None)).encode('utf-8'))
+        sha.update(json.dumps(analyzer.getCurrentConfiguration(), sort_keys=True, default=str).encode('utf-8'))
+        sha.update(str(self.framework.get_raft_config_value('SCOPING', str)).encode('utf-8'))
+        return sha.hexdigest()
+
+    def analyzer_sources(self, analyzer):
+        """Source files of the analyzer's class hierarchy and of the RAFT or analyzer path modules they use, directly or not"""
+        roots = [RAFT_DIR] + [os.path.abspath(p) for p in self.framework.get_analyzer_paths()]
+        sources = set()
+        seen = set()
+        pending = [cls.__module__ for cls in inspect.getmro(analyzer.__class__)]
+        while pending:
+            modname = pending.pop()
+            if modname in seen:
+                continue
+            seen.add(modname)
+            module = sys.modules.get(modname)
+            filename = getattr(module, '__file__', None)
+            if not filename:
+                continue
+            filename = os.path.abspath(filename)
+            if filename.endswith('.pyc'):
+                filename = inspect.getsourcefile(module) or filename
+            if not [root for root in roots if filename.startswith(root + os.sep)]:
+                # standard library and installed packages
+                continue
+            sources.add(filename)
+            for value in list(vars(module).values()):
+                if inspect.ismodule(value):
+                    pending.append(value.__name__)
+                elif isinstance(getattr(value, '__module__', None), str):
+                    pending.append(value.__module__)
+        return sorted(sources)
+
+    def carry_forward(self, analyzer, lastrunid, classname, confighash):
+        """Copy the page results and saved state of the analyzer's previous instance, if it is unchanged"""
+        if confighash is None:
+            return False
+        previous=self.Data.analysis_get_instance_by_class(self.cursor, lastrunid, classname)
+        if previous is None or previous[1] != confighash:
+            return False
+        if previous[2] is not None:
+            try:
+                state=ast.literal_eval(previous[2])
+            except (ValueError, SyntaxError):
+                return False
+            analyzer.mergeAnalysisState(state)
+        self.Data.analysis_copy_page_resultsets(self.cursor, previous[0], analyzer.analyzerinstanceid)
+        return True
+
+    def in_scope_responses(self, scopeController, engine, afterId, throughId):
+        """ Yields (response items, analyzer indexes) for in scope responses wanted by at least one analyzer """
+        conditions = engine.conditions()
+        count = len(conditions)
+        for row in self.Data.read_responses_for_analysis(self.read_cursor, afterId, throughId, conditions):
+            responseItems = interface.data_row_to_response_items(row[:-count])
+            url = responseItems[ResponsesTable.URL]
+            if scopeController.isUrlInScope(url, url):
+                selected = engine.select(responseItems, row[-count:])
+                if selected:
+                    yield responseItems, selected
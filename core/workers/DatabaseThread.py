@@ -18,29 +18,110 @@
 # You should have received a copy of the GNU General Public License
 # along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
 #
-from PyQt4.QtCore import Qt, QObject, SIGNAL, QThread, QTimer, QMutex
+from PyQt4.QtCore import Qt, QObject, SIGNAL, QThread, QTimer, QMutex, pyqtSlot
+
+from core.database.constants import ResponsesTable
+
+class ResponseFlusher(QObject):
+    """ Created in DatabaseThread.run, so its slots run on the database thread's event loop """
+
+    def __init__(self, databaseThread):
+        QObject.__init__(self)
+        self.databaseThread = databaseThread
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    @pyqtSlot()
+    def schedule(self):
+        if not self.timer.isActive():
+            self.timer.start(self.databaseThread.FLUSH_INTERVAL)
+
+    @pyqtSlot()
+    def flush(self):
+        self.timer.stop()
+        self.databaseThread.flushResponsesHandler()
+
+class SearchIndexer(QObject):
+    """ Created in DatabaseThread.run; indexes bulk imported responses a batch at a time, returning to the event loop in between """
+
+    BATCH_SIZE = 100
+
+    def __init__(self, databaseThread):
+        QObject.__init__(self)
+        self.databaseThread = databaseThread
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.index)
+
+    @pyqtSlot()
+    def schedule(self):
+        if not self.timer.isActive():
+            self.timer.start(0)
+
+    @pyqtSlot()
+    def index(self):
+        if not self.databaseThread.qlock.tryLock():
+            # the database is being closed or replaced, connectDbHandler schedules a new pass
+            return
+        try:
+            Data = self.databaseThread.Data
+            cursor = Data.allocate_thread_cursor()
+            try:
+                count = Data.index_pending_responses(cursor, self.BATCH_SIZE)
+            finally:
+                cursor.close()
+                Data.release_thread_cursor(cursor)
+        except Exception as error:
+            self.databaseThread.framework.report_exception(error)
+            return
+        finally:
+            self.databaseThread.qlock.unlock()
+        if count:
+            self.timer.start(0)
 
 class DatabaseThread(QThread):
+
+    # captured responses are written in one transaction per FLUSH_COUNT rows or FLUSH_INTERVAL ms
+    FLUSH_COUNT = 100
+    FLUSH_INTERVAL = 250
+    # a batch that keeps failing is given up on after this many writes
+    FLUSH_ATTEMPTS = 3
+
     def __init__(self, framework, Data, parent = None):
         QThread.__init__(self, parent)
         self.framework = framework
         self.Data = Data
         self.qlock = QMutex()
+        self.queueLock = QMutex()
+        self.flushLock = QMutex()
+        self.pending_responses = []
+        self.unwritten_ids = set()
+        self.lost_ids = set()
+        self.attempts = {}
         QObject.connect(self, SIGNAL('quit()'), self.quitHandler)
         QObject.connect(self, SIGNAL('started()'), self.startedHandler)
  
     def run(self):
         QObject.connect(self, SIGNAL('doConnectDb()'), self.connectDbHandler, Qt.DirectConnection)
+        self.flusher = ResponseFlusher(self)
+        # queued, so rows added on other threads are written here rather than by the caller
+        QObject.connect(self, SIGNAL('doFlushResponses()'), self.flusher.flush, Qt.QueuedConnection)
+        QObject.connect(self, SIGNAL('doScheduleFlush()'), self.flusher.schedule, Qt.QueuedConnection)
+        self.indexer = SearchIndexer(self)
+        QObject.connect(self, SIGNAL('doIndexPending()'), self.indexer.schedule, Qt.QueuedConnection)
         self.exec_()
 
     def close(self):
         self.qlock.lock()
         try:
+            self.flushAll()
             self.Data.close()
         finally:
             self.qlock.unlock()
 
     def quitHandler(self):
+        self.flushAll()
         self.Data.close()
         self.exit(0)
 
@@ -55,9 +136,123 @@ class DatabaseThread(QThread):
     def connectDbHandler(self):
         self.qlock.lock()
         try:
+            # anything still queued belongs to the previous database
+            self.flushAll()
             self.Data.connect(self.filename)
+            self.Data.set_write_behind(self)
         finally:
             self.qlock.unlock()
 
         self.callbackObj.emit(SIGNAL('connectDbFinished()'))
-        
+        # catch up on responses imported without indexing, possibly from the command line
+        self.indexPending()
+
+    def indexPending(self):
+        """ Index bulk imported responses in the background on this thread """
+        self.emit(SIGNAL('doIndexPending()'))
+
+    def queue_response(self, insertlist):
+        """ Queue a response row for a batched write and return the row id it will be stored under """
+        rowid = self.Data.allocate_response_id()
+        insertlist[ResponsesTable.ID] = rowid
+        self.queueLock.lock()
+        try:
+            self.pending_responses.append(insertlist)
+            self.unwritten_ids.add(rowid)
+            count = len(self.pending_responses)
+        finally:
+            self.queueLock.unlock()
+
+        if count >= self.FLUSH_COUNT:
+            self.emit(SIGNAL('doFlushResponses()'))
+        elif 1 == count:
+            self.emit(SIGNAL('doScheduleFlush()'))
+
+        return rowid
+
+    def ensure_written(self, Id):
+        """ Write the row now if it is still queued; returns False if the row was lost to a failed write """
+        try:
+            Id = int(Id)
+        except (TypeError, ValueError):
+            return True
+        if Id in self.unwritten_ids:
+            # the caller is about to read the row, so it cannot wait for the database thread
+            self.flushResponsesHandler()
+        return Id not in self.unwritten_ids and Id not in self.lost_ids
+
+    def flushResponsesHandler(self):
+        self.flushLock.lock()
+        try:
+            self.queueLock.lock()
+            try:
+                pending = self.pending_responses
+                self.pending_responses = []
+            finally:
+                self.queueLock.unlock()
+
+            if not pending:
+                return
+
+            ids = [insertlist[ResponsesTable.ID] for insertlist in pending]
+            cursor = self.Data.allocate_thread_cursor()
+            try:
+                self.Data.insert_responses_batch(cursor, pending)
+            except Exception as error:
+                self.framework.report_exception(error)
+                self.requeue(pending)
+                return
+            finally:
+                cursor.close()
+                self.Data.release_thread_cursor(cursor)
+
+            self.queueLock.lock()
+            try:
+                for Id in ids:
+                    self.unwritten_ids.discard(Id)
+                    self.attempts.pop(Id, None)
+            finally:
+                self.queueLock.unlock()
+        finally:
+            self.flushLock.unlock()
+
+        self.framework.signal_response_data_added()
+
+    def flushAll(self):
+        """ Flush before the database goes away; rows that still cannot be written are reported lost """
+        self.flushResponsesHandler()
+        self.queueLock.lock()
+        try:
+            pending = self.pending_responses
+            self.pending_responses = []
+        finally:
+            self.queueLock.unlock()
+        if pending:
+            for insertlist in pending:
+                self.attempts[insertlist[ResponsesTable.ID]] = self.FLUSH_ATTEMPTS
+            self.requeue(pending)
+
+    def requeue(self, pending):
+        """ Put a failed batch back in front of the queue, giving up on rows that have failed FLUSH_ATTEMPTS times """
+        retry, lost = [], []
+        self.queueLock.lock()
+        try:
+            for insertlist in pending:
+                Id = insertlist[ResponsesTable.ID]
+                self.attempts[Id] = self.attempts.get(Id, 0) + 1
+                if self.attempts[Id] < self.FLUSH_ATTEMPTS:
+                    retry.append(insertlist)
+                else:
+                    del self.attempts[Id]
+                    self.unwritten_ids.discard(Id)
+                    self.lost_ids.add(Id)
+                    lost.append(Id)
+            self.pending_responses = retry + self.pending_responses
+            count = len(self.pending_responses)
+        finally:
+            self.queueLock.unlock()
+
+        if lost:
+            self.framework.report_exception(Exception('failed to write captured responses, lost response ids: %s' % (', '.join([str(Id) for Id in lost]))))
+        if count:
+            self.emit(SIGNAL('doScheduleFlush()'))
@@ -24,6 +24,7 @@ from PyQt4.QtGui import *
 import traceback
 
 from core.database.constants import ResponsesTable
+from core.data.ResponsesVirtualDataModel import ResponsesVirtualDataModel, response_info_items
 
 class ResponsesThread(QThread):
     def __init__(self, framework, treeViewModel, parent = None):
@@ -81,6 +82,25 @@ class ResponsesThread(QThread):
             self.doCallback = False
         QTimer.singleShot(50, self, SIGNAL('doFillResponses()'))
 
+    def fill_rows(self):
+        rows = self.Data.read_newer_responses_info(self.cursor, self.lastId)
+
+        count = 0
+        datarows = []
+        for row in rows:
+            count += 1
+            if 0 == (count % 100):
+                self.treeViewModel.append_data(datarows)
+                datarows = []
+                self.yieldCurrentThread()
+
+            Id = str(row[ResponsesTable.ID])
+            self.lastId = int(Id)
+
+            datarows.append(response_info_items(row))
+
+        self.treeViewModel.append_data(datarows)
+
     def fillResponsesHandler(self, fillAll = False):
         if self.qlock.tryLock():
             try:
@@ -90,31 +110,12 @@ class ResponsesThread(QThread):
                     self.treeViewModel.clearModel()
                     self.lastId = -1
 
-                rows = self.Data.read_newer_responses_info(self.cursor, self.lastId)
-                    
-                count = 0
-                datarows = []
-                for row in rows:
-                    count += 1
-                    if 0 == (count % 100):
-                        self.treeViewModel.append_data(datarows)
-                        datarows = []
-                        self.yieldCurrentThread()
-
-                    responseItems = [m or '' for m in list(row)]
-
-                    Id = str(row[ResponsesTable.ID])
-                    self.lastId = int(Id)
-
-                    if str(responseItems[ResponsesTable.CONFIRMED]).lower() in ('y', '1'):
-                        confirmed = "Yes"
-                    else:
-                        confirmed = ""
-
-                    responseItems[ResponsesTable.CONFIRMED]  = confirmed
-                    datarows.append(responseItems)
-                    
-                self.treeViewModel.append_data(datarows)
+                if isinstance(self.treeViewModel, ResponsesVirtualDataModel):
+                    # the model reads the rows it shows itself
+                    self.lastId = self.Data.read_max_response_id(self.cursor)
+                    self.treeViewModel.refresh_rows(self.lastId)
+                else:
+                    self.fill_rows()
 
             except Exception as error:
                 print(('FIX ME! ERROR: %s' % (traceback.format_exc(error))))
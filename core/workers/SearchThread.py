@@ -126,7 +126,25 @@ class SearchThread(QThread):
                 self.str_strategy = lambda v: -1 != v.lower().find(ltext)
                 self.bytes_strategy = lambda v: -1 != v.lower().find(ltext.encode('utf-8'))
 
-        for row in self.Data.execute_search(self.cursor, self.reqbody or self.resbody):
+        search_query = None
+        if not invertSearch and not options['RegularExpression']:
+            # the full-text index only narrows the candidates; every row is still checked by isMatch
+            if options['Wildcard']:
+                fragments = re.split(r'[*?]', text)
+            else:
+                fragments = [text]
+            columns = [column for column, enabled in (('Url', self.requrl), ('ReqHeaders', self.reqheaders), 
+                                                      ('ReqData', self.reqbody), ('ResHeaders', self.resheaders),
+                                                      ('ResContent', self.resbody)) if enabled]
+            responses_query, notes_query = None, None
+            if columns:
+                responses_query = self.Data.build_search_query(fragments, columns)
+            if self.notes:
+                notes_query = self.Data.build_search_query(fragments, None)
+            if (columns or self.notes) and (responses_query or not columns) and (notes_query or not self.notes):
+                search_query = (responses_query, notes_query)
+
+        for row in self.Data.execute_search(self.cursor, self.reqbody or self.resbody, search_query, self.resbody):
             if self.canceled:
                 break
             responseItems = interface.data_row_to_response_items(row)
@@ -169,5 +169,8 @@ class SiteMapThread(QThread):
                 # TODO: should determine best candidate to display
                 parentNode.setResponseId(Id, url)
 
+            # nodes added above become visible in one pass
+            self.treeViewModel.applyPendingChanges()
+
         finally:
             self.qlock.unlock()
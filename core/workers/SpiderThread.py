@@ -27,6 +27,9 @@ from core.fuzzer.RequestRunner import RequestRunner
 from core.network.InMemoryCookieJar import InMemoryCookieJar
 from core.crawler.FormFiller import FormFiller
 from core.crawler.SpiderRules import SpiderRules
+from core.crawler.CrawlFrontier import CrawlFrontier, frontier_key
+from core.crawler.SpiderScheduler import SpiderScheduler
+from core.crawler.PageClusters import PageClusters
 
 import re
 import urllib.request, urllib.error, urllib.parse
@@ -60,9 +63,14 @@ class SpiderThread(QThread):
         self.scopeController = self.framework.getScopeController()
         self.contentExtractor = self.framework.getContentExtractor()
         self.htmlExtractor = self.contentExtractor.getExtractor('html')
+        self.extractionCache = self.framework.getExtractionCache()
         self.spiderConfig = self.framework.getSpiderConfig()
         self.spiderRules = SpiderRules(self.framework, self)
         self.formFiller = FormFiller(self.framework, self)
+        self.frontier = CrawlFrontier()
+        self.clusters = PageClusters()
+        self.cluster_rows = {}
+        self.scheduler = SpiderScheduler(self.spiderConfig, clusters = self.clusters)
 
         self.re_location_header = re.compile(r'^Location:\s*(.+)$', re.I)
         self.re_content_location_header = re.compile(r'^Content-Location:\s*(.+)$', re.I)
@@ -79,12 +87,51 @@ class SpiderThread(QThread):
         self.read_cursor = self.Data.allocate_thread_cursor()
         self.read_cursor2 = self.Data.allocate_thread_cursor()
         self.write_cursor = self.Data.allocate_thread_cursor()
+        self.qlock.lock()
+        try:
+            self.frontier.attach(self.Data, self.read_cursor2)
+            self.load_page_clusters()
+        finally:
+            self.qlock.unlock()
         self.populateExistingSpiderData()
 
     def db_detach(self):
+        self.qlock.lock()
+        try:
+            self.frontier.detach()
+            self.clusters.clear()
+            self.cluster_rows = {}
+            self.internalStateDataModel.clearModel()
+        finally:
+            self.qlock.unlock()
         self.close_cursor()
         self.Data = None
 
+    def load_page_clusters(self):
+        self.clusters.load(self.Data.read_spider_internal_state(self.read_cursor2, PageClusters.CATEGORY))
+        self.cluster_rows = {}
+        rows = []
+        for cluster in self.clusters.clusters.values():
+            row = [PageClusters.CATEGORY, cluster.key, cluster.count, cluster.url]
+            self.cluster_rows[cluster.key] = row
+            rows.append(row)
+        self.internalStateDataModel.clearModel()
+        self.internalStateDataModel.append_data(rows)
+
+    def add_page_cluster(self, url, simhash):
+        cluster, is_new = self.clusters.add_page(url, simhash)
+        if cluster is None:
+            return
+        self.Data.set_spider_internal_state(self.write_cursor, PageClusters.CATEGORY, cluster.key, cluster.count, cluster.url)
+        if is_new:
+            row = [PageClusters.CATEGORY, cluster.key, cluster.count, cluster.url]
+            self.cluster_rows[cluster.key] = row
+            self.internalStateDataModel.append_data([row])
+        else:
+            row = self.cluster_rows[cluster.key]
+            row[SpiderInternalStateTable.STATE_COUNT] = cluster.count
+            self.internalStateDataModel.update_data(row)
+
     def close_cursor(self):
         if self.write_cursor and self.Data:
             self.write_cursor.close()
@@ -169,6 +216,12 @@ class SpiderThread(QThread):
         # TODO: decide about global cookies ?
         self.requestRunner = RequestRunner(self.framework, self)
         self.requestRunner.setup(self.network_response_received, self.cookieJar, self.sequence_id)
+        self.qlock.lock()
+        try:
+            self.scheduler.max_concurrency = self.requestRunner.max_concurrent
+            self.scheduler.start()
+        finally:
+            self.qlock.unlock()
         self.keep_spidering = True
         self.renderer_available = False
         self.handle_spider_available()
@@ -180,15 +233,8 @@ class SpiderThread(QThread):
     def handle_spider_available(self):
         if self.keep_spidering:
             QTimer.singleShot(10, self, SIGNAL('generateSpiderValues()'))
-            do_send = False
-            self.qlock.lock()
-            try:
-                if len(self.spider_outstanding_requests) == 0:
-                    do_send = True
-            finally:
-                self.qlock.unlock()
-            if do_send:
-                QTimer.singleShot(10, self, SIGNAL('sendNextSpiderRequest()'))
+            # the scheduler decides how many requests may be outstanding
+            QTimer.singleShot(10, self, SIGNAL('sendNextSpiderRequest()'))
 
             self.dispatch_next_render_item()
 
@@ -234,6 +280,7 @@ class SpiderThread(QThread):
         data_item = [response_id, request_type, depth, 'P']
         if self.Data.add_spider_pending_response_id(self.write_cursor, data_item):
             self.pendingResponsesDataModel.append_data([data_item])
+        self.frontier.add_pending(response_id, request_type)
 
     def do_generateSpiderValues(self):
         self.generate_from_pending_responses()
@@ -308,26 +355,35 @@ class SpiderThread(QThread):
                 self.renderer_available = True
 
     def do_sendNextSpiderRequest(self):
-        while True:
+        while self.keep_spidering:
             spider_request = self.get_next_spider_request()
 ###->            print(spider_request)
             if not spider_request:
-                return
-            if spider_request:
-                method, url, headers, body, context = spider_request
-                if self.scopeController.isUrlInScope(url, url):
-                    self.requestRunner.queue_request(method, url, headers, body, context)
-                    return
-                else:
-                    self.framework.log_warning('SKIPPING out of scope: [%s]' % (url))
-                    self.qlock.lock()
-                    try:
-                        data_item = self.spider_outstanding_requests.pop(context)
-                        self.Data.update_spider_queue_item_status(self.write_cursor, int(data_item[SpiderQueueTable.ID]), 'C') 
-                    except KeyError:
-                        pass
-                    finally:
-                        self.qlock.unlock()
+                break
+            method, url, headers, body, context = spider_request
+            if self.scopeController.isUrlInScope(url, url):
+                self.requestRunner.queue_request(method, url, headers, body, context)
+            else:
+                self.framework.log_warning('SKIPPING out of scope: [%s]' % (url))
+                self.qlock.lock()
+                try:
+                    data_item = self.spider_outstanding_requests.pop(context)
+                    self.scheduler.finished(data_item)
+                    self.Data.update_spider_queue_item_status(self.write_cursor, int(data_item[SpiderQueueTable.ID]), 'C') 
+                except KeyError:
+                    pass
+                finally:
+                    self.qlock.unlock()
+
+        if self.keep_spidering:
+            # hosts held back by their request delay are tried again once it has passed
+            self.qlock.lock()
+            try:
+                delay = self.scheduler.next_delay()
+            finally:
+                self.qlock.unlock()
+            if delay is not None:
+                QTimer.singleShot(int(delay * 1000) + 1, self, SIGNAL('sendNextSpiderRequest()'))
 
     def network_response_received(self, response_id, context):
         data_item = None
@@ -339,6 +395,7 @@ class SpiderThread(QThread):
                     self.framework.log_warning('*** missing spider request for [%s]' % (context))
                 else:
                     data_item = self.spider_outstanding_requests.pop(context)
+                    self.scheduler.finished(data_item)
                     self.Data.update_spider_queue_item_status(self.write_cursor, int(data_item[SpiderQueueTable.ID]), 'C') 
 
                     self.add_pending_spider_response_id(response_id, 'spider', int(data_item[SpiderQueueTable.DEPTH]))
@@ -400,8 +457,9 @@ class SpiderThread(QThread):
         self.qlock.lock()
         spider_request = None
         try:
-            data_item = self.queueDataModel.popleft_data()
+            data_item = self.scheduler.next_request()
             if data_item:
+                self.queueDataModel.remove_data(data_item)
                 method, target_url, headers, body = self.make_spider_request_content(data_item)
                 context = uuid.uuid4().hex
                 self.spider_outstanding_requests[context] = data_item
@@ -448,17 +506,26 @@ class SpiderThread(QThread):
                 self.write_cursor, queue_item
                 )
             queue_item[0] = rowid
+            self.queue_spider_item(queue_item)
+            queued_url = request[1]
+            if request[2]:
+                queued_url += '?' + request[2]
+            self.frontier.add_queued(request[0], queued_url)
+
+    def queue_spider_item(self, queue_item):
+        if self.scheduler.add(queue_item):
             self.queueDataModel.append_data([queue_item])
+        else:
+            # over a SpiderConfig limit; completed so it isn't discovered again
+            self.Data.update_spider_queue_item_status(self.write_cursor, int(queue_item[SpiderQueueTable.ID]), 'C')
 
     def do_populateExistingSpiderData(self):
 ###        print('starting populating responses')
         self.qlock.lock()
         try:
 
-            rows = []
             for row in self.Data.get_spider_queue_items(self.read_cursor, 'P'):
-                rows.append([m or '' for m in row])
-            self.queueDataModel.append_data(rows)
+                self.queue_spider_item([m or '' for m in row])
 
             rows = []
             for row in self.Data.read_spider_pending_responses(self.read_cursor, 'P'):
@@ -490,6 +557,8 @@ class SpiderThread(QThread):
         try:
             self.Data.clear_spider_queue(self.write_cursor)
             self.queueDataModel.clearModel()
+            self.scheduler.clear()
+            self.frontier.load_queue()
         finally:
             self.qlock.unlock()
 
@@ -506,6 +575,7 @@ class SpiderThread(QThread):
         try:
             self.Data.reset_spider_pending_responses(self.write_cursor)
             self.pendingResponsesDataModel.clearModel()
+            self.frontier.reset_pending()
         finally:
             self.qlock.unlock()
 
@@ -544,45 +614,28 @@ class SpiderThread(QThread):
         return self.filter_spider_requests(requests, depth)
 
     def filter_spider_requests(self, requests, depth):
-        # make sure that request has not already been retrieved
+        # make sure that request has not already been retrieved or queued
+        self.frontier.refresh_responses()
         filtered_requests = []
-        already_seen = {}
-        found_response_id = None
+        already_seen = set()
         for request in requests:
-            print(('filter spider request', request))
             method, base_url, query = request[0], request[1], request[2]
             if query:
                 base_url += '?' + query
-            content_type = ''
-            if already_seen.get(base_url) == method:
-                found = True
-            else:
-                already_seen[base_url] = method
-                found = False
-                for row in self.Data.read_responses_by_url(self.read_cursor, base_url):
-                    response_items = [m or '' for m in row]
-                    if response_items[ResponsesTable.REQ_METHOD] == method:
-                        content_type = str(response_items[ResponsesTable.RES_CONTENT_TYPE])
-                        found = True
-                        found_response_id = int(response_items[ResponsesTable.ID])
-                        break
-            if not found:
-                # TODO: probably shouldn't go back to database for this ....
-                for row in self.Data.read_spider_queue_by_url(self.read_cursor, base_url):
-                    response_items = [m or '' for m in row]
-                    if response_items[SpiderQueueTable.STATUS] != 'D' and response_items[SpiderQueueTable.METHOD] == method:
-                        found = True
-                        break
-            if not found:
-                if self.spiderRules.should_include_url(base_url):
-                    filtered_requests.append(request)
-            elif found_response_id:
-                if not self.Data.spider_pending_response_exists(self.read_cursor2, found_response_id, 'spider'):
+            key = frontier_key(method, base_url)
+            if key in already_seen:
+                continue
+            already_seen.add(key)
+            found_response_id, is_html = self.frontier.find_response(key)
+            if found_response_id is not None:
+                if not self.frontier.is_pending(found_response_id, 'spider'):
                     self.add_pending_spider_response_id(found_response_id, 'spider', depth)
                 # TODO: fix this hack
-                if 'html' in content_type.lower():
-                    if not self.Data.spider_pending_response_exists(self.read_cursor2, found_response_id, 'render'):
-                        self.add_pending_spider_response_id(found_response_id, 'render', depth)
+                if is_html and not self.frontier.is_pending(found_response_id, 'render'):
+                    self.add_pending_spider_response_id(found_response_id, 'render', depth)
+            elif not self.frontier.is_queued(key):
+                if self.spiderRules.should_include_url(base_url):
+                    filtered_requests.append(request)
 
         return filtered_requests
 
@@ -618,8 +671,12 @@ class SpiderThread(QThread):
     def process_html_data(self, url, body, charset):
         requests = []
 
-        results = self.htmlExtractor.process(body, url, charset, None)
-        # TODO: check fingerprints here ?
+        extract = lambda: self.htmlExtractor.process(body, url, charset, None)
+        if self.extractionCache is None:
+            results = extract()
+        else:
+            results = self.extractionCache.process('html', body, None, url, charset, extract)
+        self.add_page_cluster(url, results.contextual_simhash)
 
         for link in results.links:
             # TODO: all links should be already resolved ?
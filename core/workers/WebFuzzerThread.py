@@ -0,0 +1,220 @@
+#
+# This module supports running web fuzzer attacks in a background thread
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+from PyQt4.QtCore import Qt, QObject, SIGNAL, QThread, QMutex, pyqtSlot
+
+from core.fuzzer.RequestRunner import RequestRunner
+
+import time
+
+class FuzzWorker(QObject):
+    """ Created in WebFuzzerThread.run, so requests are generated and rendered on the fuzzer thread's event loop """
+
+    def __init__(self, fuzzerThread):
+        QObject.__init__(self)
+        self.fuzzerThread = fuzzerThread
+
+    @pyqtSlot()
+    def start(self):
+        self.fuzzerThread.do_startFuzzing(self)
+
+    @pyqtSlot()
+    def stop(self):
+        self.fuzzerThread.do_stopFuzzing()
+
+    @pyqtSlot()
+    def fill(self):
+        self.fuzzerThread.do_fillFuzzWindow()
+
+class WebFuzzerThread(QThread):
+    """
+    Sends the requests of a FuzzJob, generating each one only when the
+    request runner has room for it.  The fuzz callback receives
+    fuzzResponseReceived(int, QString) for every response, fuzzRunError(QString)
+    if a request can't be generated, and fuzzRunFinished() at the end.
+    fuzzRunStats(int, double) reports the runner's in-flight window and
+    responses per second, at most every STATS_INTERVAL seconds.
+    """
+
+    STATS_INTERVAL = 0.5
+
+    def __init__(self, framework, parent = None):
+        QThread.__init__(self, parent)
+        self.framework = framework
+        self.qlock = QMutex()
+        QObject.connect(self, SIGNAL('quit()'), self.quitHandler)
+        QObject.connect(self, SIGNAL('started()'), self.startedHandler)
+
+        self.fuzz_job = None
+        self.fuzz_callback = None
+        self.requestRunner = None
+        self.pending_fuzz_requests = {}
+        self.cancelled_requests = []
+        self.keep_fuzzing = False
+        self.stats_time = 0
+        self.worker = None
+
+    def run(self):
+        # the thread object belongs to the GUI thread, the worker to this one
+        self.worker = FuzzWorker(self)
+        QObject.connect(self, SIGNAL('startFuzzing()'), self.worker.start, Qt.QueuedConnection)
+        QObject.connect(self, SIGNAL('stopFuzzing()'), self.worker.stop, Qt.QueuedConnection)
+        QObject.connect(self, SIGNAL('fillFuzzWindow()'), self.worker.fill, Qt.QueuedConnection)
+        self.exec_()
+
+    def quitHandler(self):
+        self.framework.debug_log('WebFuzzerThread quit...')
+        self.exit(0)
+
+    def startedHandler(self):
+        self.framework.debug_log('WebFuzzerThread started...')
+
+    def startFuzzing(self, fuzz_job, fuzz_callback, cookieJar, sequenceId = None, postSequenceId = None):
+        self.qlock.lock()
+        try:
+            self.fuzz_job = fuzz_job
+            self.fuzz_callback = fuzz_callback
+            self.cookieJar = cookieJar
+            self.sequenceId = sequenceId
+            self.postSequenceId = postSequenceId
+            self.keep_fuzzing = True
+        finally:
+            self.qlock.unlock()
+        self.emit(SIGNAL('startFuzzing()'))
+
+    def stopFuzzing(self):
+        # the run ends here rather than on the worker, so a run started before
+        # the worker gets to the stop is left alone
+        self.qlock.lock()
+        try:
+            self.keep_fuzzing = False
+            self.fuzz_job = None
+            self.cancelled_requests.extend(self.pending_fuzz_requests.values())
+            self.pending_fuzz_requests = {}
+        finally:
+            self.qlock.unlock()
+        self.emit(SIGNAL('stopFuzzing()'))
+
+    def do_startFuzzing(self, parent):
+        # parented to the worker, so the runner's network replies are also handled on this thread
+        self.requestRunner = RequestRunner(self.framework, parent)
+        self.requestRunner.setup(self.fuzz_response_received, self.cookieJar, self.sequenceId, self.postSequenceId)
+        self.qlock.lock()
+        try:
+            # requests left over from a run that ended with an error
+            self.cancelled_requests.extend(self.pending_fuzz_requests.values())
+            self.pending_fuzz_requests = {}
+        finally:
+            self.qlock.unlock()
+        self.stats_time = 0
+        self.do_stopFuzzing()
+        self.do_fillFuzzWindow()
+
+    def do_stopFuzzing(self):
+        self.qlock.lock()
+        try:
+            pending_requests = self.cancelled_requests
+            self.cancelled_requests = []
+        finally:
+            self.qlock.unlock()
+        for pending_request in pending_requests:
+            if pending_request is not None:
+                pending_request.cancel()
+
+    def do_fillFuzzWindow(self):
+        """ Generate requests until the runner's in-flight window is full """
+        error = None
+        finished = False
+        while not finished:
+            self.qlock.lock()
+            try:
+                if not self.keep_fuzzing or self.fuzz_job is None:
+                    return
+                if len(self.pending_fuzz_requests) >= self.requestRunner.max_concurrent:
+                    return
+                try:
+                    fuzz_request = self.fuzz_job.next_request()
+                except Exception as e:
+                    error = e
+                    self.keep_fuzzing = False
+                    fuzz_request = None
+                if fuzz_request is None:
+                    finished = error is not None or 0 == len(self.pending_fuzz_requests)
+                    if not finished:
+                        # the last responses finish the run
+                        return
+                else:
+                    method, url, headers, body, context = fuzz_request
+                    # placeholder, in case the response arrives before queue_request returns
+                    self.pending_fuzz_requests[context] = None
+            finally:
+                self.qlock.unlock()
+
+            if not finished:
+                request = self.requestRunner.queue_request(method, url, headers, body, context)
+                self.qlock.lock()
+                try:
+                    stopped = context not in self.pending_fuzz_requests
+                    if not stopped:
+                        self.pending_fuzz_requests[context] = request
+                finally:
+                    self.qlock.unlock()
+                if stopped:
+                    # the run was stopped while the request was being queued
+                    request.cancel()
+
+        if error is not None:
+            self.framework.report_exception(error)
+            QObject.emit(self.fuzz_callback, SIGNAL('fuzzRunError(QString)'), str(error))
+        self.finish_fuzzing()
+
+    def fuzz_response_received(self, response_id, context):
+        context = str(context)
+        self.qlock.lock()
+        try:
+            if context not in self.pending_fuzz_requests:
+                # a response to a request of a stopped run
+                return
+            del self.pending_fuzz_requests[context]
+            finished = self.fuzz_job is not None and self.fuzz_job.is_finished() and 0 == len(self.pending_fuzz_requests)
+        finally:
+            self.qlock.unlock()
+
+        QObject.emit(self.fuzz_callback, SIGNAL('fuzzResponseReceived(int, QString)'), response_id, context)
+        now = time.monotonic()
+        if finished or now - self.stats_time >= self.STATS_INTERVAL:
+            self.stats_time = now
+            window, throughput = self.requestRunner.concurrency_stats()
+            QObject.emit(self.fuzz_callback, SIGNAL('fuzzRunStats(int, double)'), window, throughput)
+        if finished:
+            self.finish_fuzzing()
+        elif self.keep_fuzzing:
+            self.emit(SIGNAL('fillFuzzWindow()'))
+
+    def finish_fuzzing(self):
+        self.qlock.lock()
+        try:
+            if self.fuzz_job is None:
+                return
+            self.fuzz_job = None
+            self.keep_fuzzing = False
+        finally:
+            self.qlock.unlock()
+        QObject.emit(self.fuzz_callback, SIGNAL('fuzzRunFinished()'))
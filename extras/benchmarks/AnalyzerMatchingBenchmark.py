@@ -0,0 +1,136 @@
+#
+# Benchmark of the StringFinder and RegexFinder matching against captured responses
+#
+# Usage: python3 extras/benchmarks/AnalyzerMatchingBenchmark.py [project.raftdb] [extra_string_count]
+#
+# Without a project file, the html, javascript and python files in this tree
+# are used as the corpus.  The project file is opened read-only.
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import re
+import time
+import zlib
+import random
+import string
+import sqlite3
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, TOP)
+
+from utility.PatternMatcher import MultiStringMatcher
+from analyzers.base import StringFinder, RegexFinder
+
+def read_project_corpus(filename):
+    conn = sqlite3.connect('file:%s?mode=ro' % (filename), uri = True)
+    cursor = conn.cursor()
+    cursor.execute("SELECT cd.Data FROM responses, content_data cd WHERE cd.Hashval = ResContentHashval")
+    corpus = []
+    for row in cursor:
+        if row[0]:
+            corpus.append(zlib.decompress(row[0]))
+    conn.close()
+    return corpus
+
+def read_tree_corpus():
+    corpus = []
+    for dirpath, dirnames, filenames in os.walk(TOP):
+        for name in filenames:
+            if name.endswith(('.html', '.js', '.py')):
+                with open(os.path.join(dirpath, name), 'rb') as fh:
+                    corpus.append(fh.read())
+    return corpus
+
+def string_list(extra_count):
+    strings = []
+    for stringtype, stringlist in StringFinder.defaultconfig.items():
+        for ident, searchstring in stringlist.items():
+            strings.append(searchstring.encode('utf-8'))
+    rand = random.Random(2013)
+    for i in range(extra_count):
+        strings.append(''.join(rand.choice(string.ascii_letters + ' ') for j in range(rand.randint(6, 30))).encode('utf-8'))
+    return strings
+
+def find_each(strings, corpus):
+    # the matching done by StringFinder before the multi-pattern matcher
+    matches = []
+    for data in corpus:
+        found = {}
+        for searchstring in strings:
+            startindex = data.find(searchstring)
+            if startindex > -1:
+                found[searchstring] = startindex
+        matches.append(found)
+    return matches
+
+def find_all(matcher, corpus):
+    return [matcher.first_matches(data) for data in corpus]
+
+def regex_each(expressions, corpus):
+    # RegexFinder compiled every expression for every response, served from the re module cache
+    count = 0
+    for data in corpus:
+        for expression in expressions:
+            for found in re.compile(expression).finditer(data):
+                count += 1
+    return count
+
+def regex_compiled(compiled, corpus):
+    count = 0
+    for data in corpus:
+        for regex in compiled:
+            for found in regex.finditer(data):
+                count += 1
+    return count
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+def main():
+    if len(sys.argv) > 1:
+        corpus = read_project_corpus(sys.argv[1])
+    else:
+        corpus = read_tree_corpus()
+    extra_counts = [int(sys.argv[2])] if len(sys.argv) > 2 else [0, 1000]
+    print('responses: %d, %d bytes' % (len(corpus), sum(len(data) for data in corpus)))
+
+    for extra_count in extra_counts:
+        strings = string_list(extra_count)
+        matcher = MultiStringMatcher(strings)
+        before, expected = timed(find_each, strings, corpus)
+        after, actual = timed(find_all, matcher, corpus)
+        if expected != actual:
+            raise Exception('multi-pattern matches differ from str.find matches')
+        print('StringFinder, %d strings: before %.3f s, after %.3f s' % (len(strings), before, after))
+
+    expressions = []
+    for main_name, sub in RegexFinder.defaultconfig.items():
+        for name, expression in sub.items():
+            expressions.append(expression.encode('utf-8'))
+    before, expected = timed(regex_each, expressions, corpus)
+    compiled = [re.compile(expression) for expression in expressions]
+    after, actual = timed(regex_compiled, compiled, corpus)
+    print('RegexFinder, %d expressions: before %.3f s, after %.3f s' % (len(expressions), before, after))
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,170 @@
+#
+# Benchmark of the buffered Burp state reader against byte at a time reading
+#
+# Usage: python3 extras/benchmarks/BurpStateBenchmark.py [item_count]
+#
+# A synthetic Burp state file with proxy history items is written to a
+# scratch directory and parsed twice, once with BurpStateReader and once
+# with the reader burp_parse_state used before, and the results compared.
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import time
+import random
+import shutil
+import struct
+import tempfile
+import zipfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from lib.parsers.burpparse import burp_parse_state, BurpStateReader
+
+class LegacyBurpStateReader(BurpStateReader):
+    """ The reader as it was: tags a byte at a time, values joined with += """
+
+    def read_data(self, length):
+        data = b''
+        if self.buffer:
+            if len(self.buffer) >= length:
+                data = self.buffer[0:length]
+                self.buffer = self.buffer[length:]
+            else:
+                data = self.buffer
+                self.buffer = b''
+
+        readlen = length - len(data)
+        while readlen > 0:
+            buf = self.file.read(readlen)
+            if not buf:
+                self.end_of_file()
+            buflen = len(buf)
+            if buflen > readlen:
+                data += buf[0:readlen]
+                self.buffer = buf[readlen:]
+                break
+            else:
+                data += buf
+                readlen -= len(buf)
+        return data
+
+    def read_next(self):
+        token = self.read_data(1)
+        if b'<' == token:
+            tag = token
+            while True:
+                b = self.read_data(1)
+                tag += b
+                if b'>' == b:
+                    break
+            return (self.T_TAG, tag)
+        datatype = ord(token)
+        if self.T_INT32 == datatype:
+            return (datatype, struct.unpack('>L', self.read_data(4))[0])
+        elif self.T_INT64 == datatype:
+            return (datatype, struct.unpack('>Q', self.read_data(8))[0])
+        elif self.T_BOOL == datatype:
+            return (datatype, 0 != ord(self.read_data(1)))
+        elif self.T_STRING == datatype or self.T_BINSTR == datatype:
+            datalen = struct.unpack('>L', self.read_data(4))[0]
+            return (datatype, self.read_data(datalen))
+        elif self.T_UNKNOWN_5 == datatype:
+            return (datatype, b'')
+        raise Exception
+
+def tag(out, name):
+    out.write(b'<' + name + b'>')
+
+def node(out, name, datatype, value):
+    tag(out, name)
+    if BurpStateReader.T_INT32 == datatype:
+        out.write(struct.pack('>BL', datatype, value))
+    elif BurpStateReader.T_INT64 == datatype:
+        out.write(struct.pack('>BQ', datatype, value))
+    elif BurpStateReader.T_BOOL == datatype:
+        out.write(struct.pack('>BB', datatype, value))
+    else:
+        out.write(struct.pack('>BL', datatype, len(value)))
+        out.write(value)
+    tag(out, b'/' + name)
+
+def write_state_file(filename, count):
+    rand = random.Random(2013)
+    out = BytesIO()
+    node(out, b'version', BurpStateReader.T_INT32, 1)
+    tag(out, b'state')
+    tag(out, b'proxy')
+    for i in range(count):
+        tag(out, b'historyItem')
+        tag(out, b'url')
+        node(out, b'https', BurpStateReader.T_BOOL, i % 2)
+        node(out, b'host', BurpStateReader.T_STRING, b'host%d.example.com' % (i % 20))
+        node(out, b'port', BurpStateReader.T_INT32, 443 if i % 2 else 80)
+        node(out, b'file', BurpStateReader.T_STRING, b'/path/%d?id=%d' % (i % 500, i))
+        tag(out, b'/url')
+        node(out, b'statusCode', BurpStateReader.T_INT32, 200)
+        node(out, b'ipAddress', BurpStateReader.T_STRING, b'10.0.0.%d' % (i % 250))
+        node(out, b'time', BurpStateReader.T_INT64, 1356998400000 + i)
+        request = b'GET /path/%d?id=%d HTTP/1.1\r\nHost: host%d.example.com\r\n\r\n' % (i % 500, i, i % 20)
+        node(out, b'originalRequest', BurpStateReader.T_BINSTR, request)
+        # mostly small pages, with the occasional large download
+        size = rand.randint(200, 40000) if i % 250 else rand.randint(2000000, 4000000)
+        body = (b'<html>%d ' % (i) * (size // 8 + 1))[:size]
+        response = b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: %d\r\n\r\n' % (len(body)) + body
+        node(out, b'originalResponse', BurpStateReader.T_BINSTR, response)
+        node(out, b'responseLength', BurpStateReader.T_INT32, len(response))
+        tag(out, b'/historyItem')
+    tag(out, b'/proxy')
+    tag(out, b'/state')
+    tag(out, b'config')
+    tag(out, b'/config')
+    zfile = zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED)
+    zfile.writestr('burp', out.getvalue())
+    zfile.close()
+    return len(out.getvalue())
+
+def parse(filename, reader_class):
+    parser = burp_parse_state(filename)
+    parser.reader = reader_class(parser.file, parser.logger)
+    return list(parser)
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dirname = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(dirname, 'state.burp')
+        size = write_state_file(filename, count)
+        before, expected = timed(parse, filename, LegacyBurpStateReader)
+        after, actual = timed(parse, filename, BurpStateReader)
+        if len(expected) != count or expected != actual:
+            raise Exception('buffered reader results differ from byte at a time reader')
+        print('%d items, %.1f MB: byte at a time %.3f s, buffered %.3f s (%.1fx)' % (count, size / 1048576.0, before, after, before / after))
+    finally:
+        shutil.rmtree(dirname)
+
+if '__main__' == __name__:
+    main()
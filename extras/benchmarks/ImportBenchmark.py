@@ -0,0 +1,133 @@
+#
+# Benchmark of row at a time versus bulk insertion of imported responses
+#
+# Usage: python3 extras/benchmarks/ImportBenchmark.py [response_count]
+#
+# Synthetic responses are written to two scratch project files, once with
+# insert_responses as the importers used to and once through
+# BulkResponseWriter, and the stored rows are compared.  The search index
+# pass that BulkResponseWriter defers is timed separately, and searches of
+# both files must find the same responses.
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from core.database.database import Db
+from core.database.BulkInsert import BulkResponseWriter
+from raft import __version__
+
+def synthetic_responses(count):
+    rand = random.Random(2013)
+    for i in range(count):
+        # a few hundred distinct pages, as with repeated scripts and error pages
+        body = (b'<html><body>page %d <a href="/p%d">link</a></body></html>\n' % (i % 300, i)) * rand.randint(20, 400)
+        request_body = b'' if i % 3 else b'name=value&id=%d' % (i)
+        yield [None, 'http://example.com/p%d?id=%d' % (i % 1000, i),
+               b'GET /p HTTP/1.1\r\nHost: example.com\r\n\r\n', request_body,
+               b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n', body,
+               200, len(body), '10', '2013-01-01 00:00:00', None, None, None,
+               'GET', '127.0.0.1', 'text/html', 'benchmark', 'example.com']
+
+def open_db(dirname, name):
+    filename = os.path.join(dirname, name)
+    Data = Db(__version__)
+    Data.create_raft_db(filename, __version__)
+    Data.connect(filename)
+    return Data
+
+def insert_each(Data, count):
+    cursor = Data.allocate_thread_cursor()
+    Data.set_insert_pragmas(cursor)
+    for n, values in enumerate(synthetic_responses(count)):
+        Data.insert_responses(cursor, values, False)
+        if 0 == (n + 1) % 100:
+            Data.commit()
+    Data.commit()
+    Data.reset_pragmas(cursor)
+    return count
+
+def insert_bulk(Data, count):
+    cursor = Data.allocate_thread_cursor()
+    Data.set_insert_pragmas(cursor)
+    writer = BulkResponseWriter(Data, cursor)
+    for values in synthetic_responses(count):
+        writer.add(values)
+    written = writer.finish()
+    Data.reset_pragmas(cursor)
+    return written
+
+def index_pending(Data):
+    cursor = Data.allocate_thread_cursor()
+    count = 0
+    while True:
+        indexed = Data.index_pending_responses(cursor, 2000)
+        if not indexed:
+            break
+        count += indexed
+    return count
+
+def stored_rows(Data):
+    cursor = Data.conn.cursor()
+    cursor.execute("SELECT Id, Url, ReqHeaders, ReqDataHashval, ResHeaders, ResContentHashval, UrlHash FROM responses ORDER BY Id")
+    return [tuple(bytes(value) if hasattr(value, 'value') else value for value in row) for row in cursor]
+
+def search_ids(Data, terms):
+    cursor = Data.conn.cursor()
+    found = []
+    for term in terms:
+        query = Data.build_search_query([term], None)
+        cursor.execute("SELECT Id FROM responses WHERE Id IN (SELECT rowid FROM responses_fts WHERE responses_fts MATCH ? UNION SELECT Response_Id FROM responses_fts_pending) ORDER BY Id", [query])
+        found.append([row[0] for row in cursor])
+    return found
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    terms = ['page 17 ', 'p123?id', 'name=value&id=99', 'href="/p4321"']
+    dirname = tempfile.mkdtemp()
+    try:
+        each_db = open_db(dirname, 'each.raftdb')
+        bulk_db = open_db(dirname, 'bulk.raftdb')
+        before, expected = timed(insert_each, each_db, count)
+        after, actual = timed(insert_bulk, bulk_db, count)
+        if expected != actual or stored_rows(each_db) != stored_rows(bulk_db):
+            raise Exception('bulk inserted rows differ from insert_responses rows')
+        indexing, indexed = timed(index_pending, bulk_db)
+        if indexed != count or search_ids(each_db, terms) != search_ids(bulk_db, terms):
+            raise Exception('deferred search index differs from the insert_responses index')
+        print('%d responses: insert_responses %.3f s, bulk %.3f s (%.1fx); deferred search indexing %.3f s' % (count, before, after, before / after, indexing))
+        each_db.close()
+        bulk_db.close()
+    finally:
+        shutil.rmtree(dirname)
+
+if '__main__' == __name__:
+    main()
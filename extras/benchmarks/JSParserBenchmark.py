@@ -0,0 +1,79 @@
+#
+# Micro-benchmark of the JavaScript tokenizer and JSLiteParser on large scripts
+#
+# Usage: python3 extras/benchmarks/JSParserBenchmark.py bundle.js [bundle.js ...]
+#
+# Each script is parsed whole and as its first quarter and half; with linear
+# tokenizing the time per KB stays flat as the input grows.
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import io
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from lib.extractors.JSParser import Tokenizer, JsParseException, T_END
+from lib.extractors.JSLiteParser import JSLiteParser
+
+def tokenize(source, tokenizer_class = Tokenizer):
+    # tokens only, stepping over anything the tokenizer doesn't know (template strings and the like)
+    tokenizer = tokenizer_class()
+    tokenizer.reset(source, '', 0, True)
+    count = 0
+    while True:
+        try:
+            if tokenizer.get() == T_END:
+                break
+            count += 1
+        except JsParseException:
+            tokenizer.cursor += 1
+    return count
+
+def lite_parse(source):
+    parser = JSLiteParser()
+    parser.parse_file(source)
+    return len(parser.strings()) + len(parser.comments())
+
+def timed(func, source):
+    start = time.time()
+    result = func(source)
+    return time.time() - start, result
+
+def main():
+    if len(sys.argv) < 2:
+        sys.stderr.write('usage: %s bundle.js [bundle.js ...]\n' % (sys.argv[0]))
+        sys.exit(1)
+
+    for filename in sys.argv[1:]:
+        with io.open(filename, 'r', encoding = 'utf-8', errors = 'replace') as fh:
+            source = fh.read()
+        print('%s: %d KB' % (filename, len(source) // 1024))
+        for fraction in (4, 2, 1):
+            part = source[:len(source) // fraction]
+            kb = max(1, len(part) / 1024.0)
+            elapsed, tokens = timed(tokenize, part)
+            lite_elapsed, items = timed(lite_parse, part)
+            print('  %7d KB  tokenizer %8.3f s (%.3f ms/KB, %d tokens)  JSLiteParser %8.3f s (%.3f ms/KB)' % (
+                    kb, elapsed, elapsed * 1000 / kb, tokens, lite_elapsed, lite_elapsed * 1000 / kb))
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,113 @@
+#
+# Benchmark of responses table lookups by url with and without the secondary indexes
+#
+# Usage: python3 extras/benchmarks/ResponsesLookupBenchmark.py [row_count]
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from core.database import database
+
+INDEXES = ('IDX_responses_Url_ReqMethod', 'IDX_responses_UrlHash', 'IDX_responses_ReqHost',
+           'IDX_responses_Status', 'IDX_responses_ResContentType', 'IDX_responses_DataOrigin')
+
+def populate(Data, cursor, count):
+    Data.set_insert_pragmas(cursor)
+    for i in range(count):
+        host = 'host%d.example.com' % (i % 50)
+        url = 'http://%s/dir%d/page%d?id=%d' % (host, i % 1000, i, i)
+        insertlist = [None, url, b'GET / HTTP/1.1\r\n\r\n', b'', b'HTTP/1.1 200 OK\r\n\r\n', b'body %d' % (i % 100),
+                      200, 10, 1, '', None, None, None, 'GET', None, 'text/html', 'BENCHMARK', host]
+        Data.insert_responses(cursor, insertlist, False)
+    Data.commit()
+    Data.reset_pragmas(cursor)
+
+def time_lookups(Data, cursor, urls):
+    start = time.time()
+    for url in urls:
+        for row in Data.read_responses_by_url(cursor, url):
+            pass
+    exact = (time.time() - start) / len(urls)
+    start = time.time()
+    for url in urls:
+        for row in Data.read_responses_starting_with_url(cursor, url.split('?')[0]):
+            pass
+    prefix = (time.time() - start) / len(urls)
+    return exact, prefix
+
+# the queries used before the 3.0.2 schema, selecting the same columns as the current ones
+RESPONSE_COLUMNS = """SELECT Id, Url, ReqHeaders, cd1.Data ReqData, ResHeaders, \
+                      cd2.Data ResContent, Status, Length, ReqTime, ReqDate, Notes, \
+                      Results, Confirmed, \
+                      ReqMethod, HostIP, ResContentType, DataOrigin, ReqDataHashval, ResContentHashval, ReqHost \
+                      FROM responses, content_data cd1, content_data cd2 \
+                      WHERE \
+                      cd1.Hashval = ReqDataHashval AND cd2.Hashval = ResContentHashval """
+
+def time_unindexed(Data, cursor, urls):
+    start = time.time()
+    for url in urls:
+        cursor.execute(RESPONSE_COLUMNS + "AND Url=?", [url])
+        for row in cursor:
+            pass
+    exact = (time.time() - start) / len(urls)
+    start = time.time()
+    for url in urls:
+        cursor.execute(RESPONSE_COLUMNS + "AND Url LIKE ?", [url.split('?')[0] + '%'])
+        for row in cursor:
+            pass
+    prefix = (time.time() - start) / len(urls)
+    return exact, prefix
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    filename = os.path.join(tempfile.mkdtemp(), 'benchmark.raftdb')
+    Data = database.Db('3.0.2')
+    Data.connect(filename)
+    cursor = Data.allocate_thread_cursor()
+
+    sys.stderr.write('populating %d rows in %s\n' % (count, filename))
+    populate(Data, cursor, count)
+
+    cursor.execute("SELECT Url FROM responses")
+    urls = [row[0] for row in cursor.fetchall()]
+    sample = random.sample(urls, 200)
+
+    exact, prefix = time_lookups(Data, cursor, sample)
+    for name in INDEXES:
+        cursor.execute("DROP INDEX %s" % (name))
+    before_exact, before_prefix = time_unindexed(Data, cursor, sample)
+
+    print('rows: %d' % (count))
+    print('exact url lookup:  before %.3f ms, after %.3f ms' % (before_exact*1000, exact*1000))
+    print('prefix url lookup: before %.3f ms, after %.3f ms' % (before_prefix*1000, prefix*1000))
+
+    cursor.close()
+    Data.release_thread_cursor(cursor)
+    Data.close()
+
+if '__main__' == __name__:
+    main()
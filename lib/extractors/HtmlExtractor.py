@@ -29,6 +29,27 @@ import hashlib
 import re
 import codecs
 
+SIMHASH_BITS = 64
+
+def simhash(features):
+    """ 64-bit similarity hash of features; similar feature sets differ in few bits """
+    weights = {}
+    for feature in features:
+        weights[feature] = weights.get(feature, 0) + 1
+    totals = [0] * SIMHASH_BITS
+    for feature, weight in weights.items():
+        value = int.from_bytes(hashlib.md5(feature.encode('utf-8', 'ignore')).digest()[:8], 'big')
+        for bit in range(SIMHASH_BITS):
+            if value & (1 << bit):
+                totals[bit] += weight
+            else:
+                totals[bit] -= weight
+    result = 0
+    for bit in range(SIMHASH_BITS):
+        if totals[bit] > 0:
+            result |= 1 << bit
+    return result
+
 BOM_MAPPINGS = (
     (codecs.BOM_UTF32_BE,'utf-32-be'),
     (codecs.BOM_UTF32_LE,'utf-32-le'),
@@ -114,6 +135,13 @@ class HtmlForm():
         
 class HtmlParseResults():
 
+    STATE_FIELDS = ('baseurl', 'encoding', 'comments', 'relative_links', 'links', 'anchors',
+                    'inline_scripts', 'all_scripts', 'scripts', 'script_links', 'inline_styles', 'styles',
+                    'labels_by_id', 'labels_by_name', 'baseurl_set', 'contextual_fingerprint', 'structural_fingerprint',
+                    'contextual_simhash')
+
+    re_tag = re.compile(r'<[^>]*>')
+
     def __init__(self, baseurl, encoding):
         self.baseurl = baseurl
         self.encoding = encoding
@@ -136,6 +164,7 @@ class HtmlParseResults():
         self.baseurl_set = False
         self.contextual_fingerprint = ''
         self.structural_fingerprint = ''
+        self.contextual_simhash = 0
 
     def resolve_url(self, uri):
         splitted = urlparse.urlsplit(uri)
@@ -245,12 +274,49 @@ class HtmlParseResults():
         sha256 = hashlib.sha256()
         sha256.update(data.encode('utf-8'))
         self.contextual_fingerprint = sha256.hexdigest()
+        # runs of three tags with their attribute names, so templated pages hash close together
+        tags = self.re_tag.findall(data)
+        if tags:
+            self.contextual_simhash = simhash(''.join(tags[i:i+3]) for i in range(max(1, len(tags) - 2)))
 
     def set_structural_fingerprint(self, data):
         sha256 = hashlib.sha256()
         sha256.update(data.encode('utf-8'))
         self.structural_fingerprint = sha256.hexdigest()
 
+    def get_state(self):
+        """ Plain lists and dictionaries holding the results, for the extraction cache """
+        state = {}
+        for name in self.STATE_FIELDS:
+            state[name] = getattr(self, name)
+        state['forms'] = []
+        for form in self.forms:
+            form_state = dict(vars(form))
+            form_state['inputs'] = [dict(vars(input)) for input in form.inputs]
+            state['forms'].append(form_state)
+        state['other_inputs'] = [dict(vars(input)) for input in self.other_inputs]
+        return state
+
+    def set_state(self, state):
+        for name in self.STATE_FIELDS:
+            setattr(self, name, state[name])
+        self.anchors = [tuple(anchor) for anchor in self.anchors]
+        self.forms = []
+        for form_state in state['forms']:
+            form = HtmlForm(self.baseurl)
+            for name, value in form_state.items():
+                if 'inputs' != name:
+                    setattr(form, name, value)
+            form.inputs = [self.input_from_state(input_state) for input_state in form_state['inputs']]
+            self.forms.append(form)
+        self.other_inputs = [self.input_from_state(input_state) for input_state in state['other_inputs']]
+
+    def input_from_state(self, input_state):
+        input = HtmlInput()
+        for name, value in input_state.items():
+            setattr(input, name, value)
+        return input
+
 class HtmlExtractor(BaseExtractor):
 
     T_SCRIPT = 1
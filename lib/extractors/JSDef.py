@@ -136,13 +136,14 @@ if '__main__' == __name__:
     defined_globals = {}
 
     opTypeNames = {}
-    opTypeNames_regex = '^'
+    # no anchors, the tokenizer matches at its current position
+    opTypeNames_regex = ''
     first = True
     for name, value in DEFINED_opTypeNames:
         opTypeNames[name] = value
         if '\n' != name:
             if not first:
-                opTypeNames_regex += '|^'
+                opTypeNames_regex += '|'
             opTypeNames_regex += re.escape(name)
             first = False
 
@@ -65,6 +65,21 @@ class JSParseResults():
         if resolved not in self.links:
             self.links.append(resolved)
 
+    def get_state(self):
+        """ Plain lists holding the results, for the extraction cache """
+        return {
+            'baseurl' : self.baseurl,
+            'encoding' : self.encoding,
+            'comments' : self.comments,
+            'strings' : self.strings,
+            'relative_links' : self.relative_links,
+            'links' : self.links,
+            }
+
+    def set_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
 
 class JSExtractor(BaseExtractor):
     def __init__(self):
@@ -74,7 +89,7 @@ class JSExtractor(BaseExtractor):
     def process(self, script, baseurl, encoding = 'utf-8', results = None):
 
         if results is None:
-            results = JSParseResults(script, baseurl)
+            results = JSParseResults(baseurl, encoding)
 
         self.jsParser.parse_file(script, '', 0)
         comments = self.jsParser.comments()
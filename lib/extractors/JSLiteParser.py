@@ -41,6 +41,9 @@ class JSLiteParser():
         self.re_keywords = re.compile(r'^(?:break|case|catch|const|continue|debugger|default|delete|do|else|enum|false|finally|for|function|if|in|instanceof|new|null|return|switch|this|throw|true|try|typeof|var|void|while|with)$')
         self.re_no_regex_start = re.compile(r'[\]]')
         self.re_space = re.compile(r'\s')
+        self.identifier_chars = frozenset('$_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.')
+        self.re_identifier_run = re.compile(r'[$_a-zA-Z0-9.]+')
+        self.re_quote_stop = {'"' : re.compile(r'[\\"\n]'), "'" : re.compile(r"[\\'\n]")}
 
     def reset(self):
         self._strings = []
@@ -124,6 +127,17 @@ class JSLiteParser():
         rewind_pos = 0
         last_was_identifier = False
         while pos < s_len:
+            if not escape_next:
+                # skip straight to the next character that can end a comment or string
+                if self.S_COMMENT == state:
+                    pos = script.find('*', pos)
+                elif self.S_LINE_COMMENT == state:
+                    pos = script.find('\n', pos)
+                elif self.S_QUOTE == state:
+                    match = self.re_quote_stop[qchar].search(script, pos)
+                    pos = match.start() if match else -1
+                if pos < 0:
+                    break
             c = script[pos]
             try:
                 if escape_next:
@@ -253,13 +267,15 @@ class JSLiteParser():
                             last_token = this_token
                         start_pos = pos
                         last_was_identifier = False
-                    elif self.re_identifier.match(c):
+                    elif c in self.identifier_chars:
                         if not last_was_identifier:
                             this_token = script[start_pos:pos]
                             if this_token:
                                 last_token = this_token
                                 start_pos = pos
                         last_was_identifier = True
+                        # the rest of the identifier changes nothing
+                        pos = self.re_identifier_run.match(script, pos).end() - 1
                     else:
                         this_token = script[start_pos:pos]
                         if this_token:
@@ -134,7 +134,7 @@ TOKENS = {0: 'END', 1: '\n', 2: ';', 3: ',', 4: '=', 5: '?', 6: ':', 7: 'CONDITI
 
 OP_TYPE_NAMES = {'>=': 'GE', '>>': 'RSH', '<<': 'LSH', '<=': 'LE', '!=': 'NE', '!': 'NOT', '%': 'MOD', '&': 'BITWISE_AND', ')': 'RIGHT_PAREN', '(': 'LEFT_PAREN', '+': 'PLUS', '*': 'MUL', '-': 'MINUS', ',': 'COMMA', '/': 'DIV', '.': 'DOT', '>>>': 'URSH', ';': 'SEMICOLON', ':': 'COLON', '=': 'ASSIGN', '||': 'OR', '?': 'HOOK', '>': 'GT', '\n': 'NEWLINE', '==': 'EQ', '&&': 'AND', '[': 'LEFT_BRACKET', ']': 'RIGHT_BRACKET', '^': 'BITWISE_XOR', '===': 'STRICT_EQ', '!==': 'STRICT_NE', '++': 'INCREMENT', '<': 'LT', '--': 'DECREMENT', '{': 'LEFT_CURLY', '}': 'RIGHT_CURLY', '|': 'BITWISE_OR', '~': 'BITWISE_NOT'}
 
-OP_REGEX = '^\\;|^\\,|^\\?|^\\:|^\\|\\||^\\&\\&|^\\||^\\^|^\\&|^\\=\\=\\=|^\\=\\=|^\\=|^\\!\\=\\=|^\\!\\=|^\\<\\<|^\\<\\=|^\\<|^\\>\\>\\>|^\\>\\>|^\\>\\=|^\\>|^\\+\\+|^\\-\\-|^\\+|^\\-|^\\*|^\\/|^\\%|^\\!|^\\~|^\\.|^\\[|^\\]|^\\{|^\\}|^\\(|^\\)'
+OP_REGEX = '\\;|\\,|\\?|\\:|\\|\\||\\&\\&|\\||\\^|\\&|\\=\\=\\=|\\=\\=|\\=|\\!\\=\\=|\\!\\=|\\<\\<|\\<\\=|\\<|\\>\\>\\>|\\>\\>|\\>\\=|\\>|\\+\\+|\\-\\-|\\+|\\-|\\*|\\/|\\%|\\!|\\~|\\.|\\[|\\]|\\{|\\}|\\(|\\)'
 
 KEYWORDS = {'false': 71, 'debugger': 65, 'in': 76, 'null': 79, 'if': 75, 'const': 63, 'for': 73, 'with': 90, 'while': 89, 'finally': 72, 'var': 87, 'new': 78, 'function': 74, 'do': 68, 'return': 80, 'void': 88, 'enum': 70, 'else': 69, 'break': 60, 'catch': 62, 'instanceof': 77, 'true': 84, 'throw': 83, 'case': 61, 'default': 66, 'try': 85, 'this': 82, 'switch': 81, 'continue': 64, 'typeof': 86, 'delete': 67}
 
@@ -166,16 +166,17 @@ class Token():
 
 class Tokenizer():
     def __init__(self):
-        self.re_lead_space_or_tab = re.compile(r'^[ \t]+')
-        self.re_leading_spaces = re.compile(r'^\s+')
-        self.re_comment = re.compile(r'^\/(?:\*(?:.|\n)*?\*\/|\/.*)')
+        # patterns are matched at the cursor with match(source, pos), so they carry no anchors
+        self.re_lead_space_or_tab = re.compile(r'[ \t]+')
+        self.re_leading_spaces = re.compile(r'\s+')
+        self.re_comment = re.compile(r'\/(?:\*[\s\S]*?\*\/|\/.*)')
         self.re_op = re.compile(OP_REGEX)
-        self.re_fp = re.compile(r'^\d+\.\d*(?:[eE][-+]?\d+)?|^\d+(?:\.\d*)?[eE][-+]?\d+|^\.\d+(?:[eE][-+]?\d+)?')
-        self.re_re = re.compile(r'^\/((?:\\.|\[(?:\\.|[^\]])*\]|[^\/])+)\/([gimy]*)')
-        self.re_integer = re.compile(r'^0[xX][\da-fA-F]+|^0[0-7]*|^\d+')
-        self.re_identifier = re.compile(r'^[$_\w]+')
-        self.re_string = re.compile(r'^"(?:\\.|[^"])*"|^\'(?:\\.|[^\'])*\'')
-        self.re_newline = re.compile(r'^\n')
+        self.re_fp = re.compile(r'\d+\.\d*(?:[eE][-+]?\d+)?|\d+(?:\.\d*)?[eE][-+]?\d+|\.\d+(?:[eE][-+]?\d+)?')
+        self.re_re = re.compile(r'\/((?:\\.|\[(?:\\.|[^\]])*\]|[^\/])+)\/([gimy]*)')
+        self.re_integer = re.compile(r'0[xX][\da-fA-F]+|0[0-7]*|\d+')
+        self.re_identifier = re.compile(r'[$_\w]+')
+        self.re_string = re.compile(r'"(?:\\.|[^"])*"|\'(?:\\.|[^\'])*\'')
+        self.re_newline = re.compile(r'\n')
         self.re_octal_digits = re.compile('[0-7]{3}')
         self.re_escape_string = re.compile(r'\\(?:[0-7]{3}|x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|.)')
 
@@ -197,8 +198,8 @@ class Tokenizer():
             self.comments = []
             self.strings = []
         
-    def script_input(self):
-        return self.source[self.cursor:]
+    def at_end(self):
+        return self.cursor >= len(self.source)
 
     def done(self):
         return self.peek() == T_END
@@ -242,19 +243,18 @@ class Tokenizer():
             token = self.tokens[self.tokenIndex]
             if token.ttype != T_NEWLINE or self.scanNewlines:
                 return token.ttype
+        source = self.source
         while True:
-            script_input = self.script_input()
             if self.scanNewlines:
-                match = self.re_lead_space_or_tab.match(script_input)
+                match = self.re_lead_space_or_tab.match(source, self.cursor)
             else:
-                match = self.re_leading_spaces.match(script_input)
+                match = self.re_leading_spaces.match(source, self.cursor)
             if match:
                 spaces = match.group(0)
                 self.cursor += len(spaces)
                 self.lineno += spaces.count('\n')
-                script_input = self.script_input()
 
-            match = self.re_comment.match(script_input)
+            match = self.re_comment.match(source, self.cursor)
             if not match:
                 break
             comment = match.group(0)
@@ -267,24 +267,25 @@ class Tokenizer():
         if not token:
             self.tokens[self.tokenIndex] = token = Token()
 
-        if not script_input:
+        if self.at_end():
             token.ttype = T_END
             return token.ttype
 
+        pos = self.cursor
         matched = ''
         match = None
         while True:
-            match = self.re_fp.match(script_input)
+            match = self.re_fp.match(source, pos)
             if match:
                 token.ttype = T_NUMBER
                 token.value = self.parseFloat(match.group(0))
                 break
-            match = self.re_integer.match(script_input)
+            match = self.re_integer.match(source, pos)
             if match:
                 token.ttype = T_NUMBER
                 token.value = self.parseInt(match.group(0))
                 break
-            match = self.re_identifier.match(script_input)
+            match = self.re_identifier.match(source, pos)
             if match:
                 Id = match.group(0)
                 if Id in KEYWORDS:
@@ -293,7 +294,7 @@ class Tokenizer():
                     token.ttype = T_IDENTIFIER
                 token.value = Id
                 break
-            match = self.re_string.match(script_input)
+            match = self.re_string.match(source, pos)
             if match:
                 token.ttype = T_STRING
                 string = self.parseString(match.group(0))
@@ -301,15 +302,15 @@ class Tokenizer():
                 token.value = string
                 break
             if self.scanOperand:
-                match = self.re_re.match(script_input)
+                match = self.re_re.match(source, pos)
                 if match:
                     token.ttype = T_REGEXP
                     token.value = self.parseRegexp(match.group(1), match.group(2))
                     break
-            match = self.re_op.match(script_input)
+            match = self.re_op.match(source, pos)
             if match:
                 op = match.group(0)
-                if op in ASSIGN_OPS and script_input[len(op)] == '=':
+                if op in ASSIGN_OPS and source[pos+len(op):pos+len(op)+1] == '=':
                     token.ttype = T_ASSIGN
                     token.assignOp = GLOBAL[OP_TYPE_NAMES[op]]
                     matched = match.group(0) + '='
@@ -320,12 +321,12 @@ class Tokenizer():
                     token.assignOp = None
                 token.value = op
                 break
-            match = self.re_newline.match(script_input)
+            match = self.re_newline.match(source, pos)
             if self.scanNewlines and match:
                 token.ttype = T_NEWLINE
                 break
 
-            raise self.newSyntaxError('Illegal token: [%s]' % repr(script_input[0:48]))
+            raise self.newSyntaxError('Illegal token: [%s]' % repr(source[pos:pos+48]))
 
 ####        print('token', token.ttype, token.value)
         token.start = self.cursor
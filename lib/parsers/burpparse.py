@@ -130,6 +130,116 @@ class BurpUtil():
 
         return origin, host, hostip, url, status, datetime, request, response, method, content_type, extra
 
+class BurpStateReader():
+    """
+    Reads the tags and typed values of a Burp state stream.  The stream is
+    read a large block at a time; tags are found with bytes.find and numbers
+    unpacked in place, and strings longer than the block are read after
+    the buffered part and joined once.
+    """
+
+    T_INT32 = 0
+    T_INT64 = 1
+    T_BOOL = 2
+    T_STRING = 3
+    T_BINSTR = 4
+    T_UNKNOWN_5 = 5
+    T_TAG = 256
+
+    BUFFER_SIZE = 1 << 20
+
+    unpack_int32 = struct.Struct('>L').unpack_from
+    unpack_int64 = struct.Struct('>Q').unpack_from
+
+    def __init__(self, file, logger, buffer_size = None):
+        self.file = file
+        self.logger = logger
+        self.buffer_size = buffer_size or self.BUFFER_SIZE
+        self.buffer = b''
+        self.pos = 0
+
+    def end_of_file(self):
+        self.logger.debug('read to end of file')
+        self.file.close()
+        raise(StopIteration)
+
+    def fill(self, needed):
+        """ Buffer at least needed bytes from the current position, which becomes 0 """
+        chunks = [memoryview(self.buffer)[self.pos:]]
+        available = len(chunks[0])
+        while available < needed:
+            data = self.file.read(max(self.buffer_size, needed - available))
+            if not data:
+                self.end_of_file()
+            chunks.append(data)
+            available += len(data)
+        self.buffer = b''.join(chunks)
+        self.pos = 0
+        return self.buffer
+
+    def read_bytes(self, length):
+        pos = self.pos
+        end = pos + length
+        if end <= len(self.buffer):
+            self.pos = end
+            return self.buffer[pos:end]
+        if length <= self.buffer_size:
+            self.fill(length)
+            self.pos = length
+            return self.buffer[0:length]
+        # a large string: read the rest of it directly, without filling the buffer first
+        chunks = [memoryview(self.buffer)[pos:]]
+        readlen = length - len(chunks[0])
+        while readlen > 0:
+            data = self.file.read(readlen)
+            if not data:
+                self.end_of_file()
+            chunks.append(data)
+            readlen -= len(data)
+        self.buffer = b''
+        self.pos = 0
+        return b''.join(chunks)
+
+    def read_next(self):
+        buffer, pos = self.buffer, self.pos
+        if pos >= len(buffer):
+            buffer, pos = self.fill(1), 0
+        datatype = buffer[pos]
+        if 0x3c == datatype: # '<'
+            end = buffer.find(b'>', pos + 1)
+            while -1 == end:
+                searched = len(buffer) - pos
+                buffer, pos = self.fill(searched + 1), 0
+                end = buffer.find(b'>', searched)
+            self.pos = end + 1
+            return (self.T_TAG, buffer[pos:end+1])
+        elif self.T_INT32 == datatype: # 32 bit
+            if pos + 5 > len(buffer):
+                buffer, pos = self.fill(5), 0
+            self.pos = pos + 5
+            return (datatype, self.unpack_int32(buffer, pos + 1)[0])
+        elif self.T_INT64 == datatype: # 64 bit
+            if pos + 9 > len(buffer):
+                buffer, pos = self.fill(9), 0
+            self.pos = pos + 9
+            return (datatype, self.unpack_int64(buffer, pos + 1)[0])
+        elif self.T_BOOL == datatype: # boolean
+            if pos + 2 > len(buffer):
+                buffer, pos = self.fill(2), 0
+            self.pos = pos + 2
+            return (datatype, 0 != buffer[pos + 1])
+        elif self.T_STRING == datatype or self.T_BINSTR == datatype: # string
+            if pos + 5 > len(buffer):
+                buffer, pos = self.fill(5), 0
+            datalen = self.unpack_int32(buffer, pos + 1)[0]
+            self.pos = pos + 5
+            return (datatype, self.read_bytes(datalen))
+        elif self.T_UNKNOWN_5 == datatype: # not known, maybe empty data/emptry string?
+            self.pos = pos + 1
+            return (datatype, b'')
+        else:
+            raise Exception
+
 class burp_parse_state():
     """ Parses Burp saved state file into request and result data """
 
@@ -172,81 +282,17 @@ class burp_parse_state():
             raise Exception
 
         self.states = []
-        self.buffer = b''
+        self.reader = BurpStateReader(self.file, self.logger)
         self.state = self.S_INITIAL
 
     def __iter__(self):
         return self
 
-    def __read_data(self, length):
-
-        data = b''
-        if self.buffer:
-            # buffered data
-            if len(self.buffer) >= length:
-                data = self.buffer[0:length]
-                self.buffer = self.buffer[length:]
-            else:
-                data = self.buffer
-                self.buffer = b''
-
-        readlen = length - len(data)
-        while readlen > 0:
-            buf = self.file.read(readlen)
-            if not buf:
-                self.logger.debug('read to end of file')
-                self.file.close()
-                raise(StopIteration)
-            buflen = len(buf)
-            if buflen > readlen:
-                data += buf[0:readlen]
-                self.buffer = buf[readlen:]
-                break
-            else:
-                data += buf
-                readlen -= len(buf)
-        return data
-
-    def __read_next_tag(self, begin):
-        data = begin
-        while True:
-            b = self.__read_data(1)
-            data += b
-            if b'>' == b:
-                break
-        return data
-
     def read_next(self):
         return self.__read_next()
 
     def __read_next(self):
-        token = self.__read_data(1)
-        if b'<' == token:
-            tag = self.__read_next_tag(token)
-            return (self.T_TAG, tag)
-        else:
-            datatype = ord(token)
-            if self.T_INT32 == datatype: # 32 bit
-                data = self.__read_data(4)
-                datavalue = struct.unpack('>L', data)[0]
-                return (datatype, datavalue)
-            elif self.T_INT64 == datatype: # 64 bit
-                data = self.__read_data(8)
-                datavalue = struct.unpack('>Q', data)[0]
-                return (datatype, datavalue)
-            elif self.T_BOOL == datatype: # boolean
-                data = self.__read_data(1)
-                b = 0 != ord(data)
-                return (datatype, b)
-            elif self.T_STRING == datatype or self.T_BINSTR == datatype: # string
-                data = self.__read_data(4)
-                datalen = struct.unpack('>L', data)[0]
-                datavalue = self.__read_data(datalen)
-                return (datatype, datavalue)
-            elif self.T_UNKNOWN_5 == datatype: # not known, maybe empty data/emptry string?
-                return (datatype, b'')
-            else:
-                raise Exception
+        return self.reader.read_next()
 
     def __read_tag(self, tagname = None):
         result = self.__read_next()
@@ -258,7 +304,7 @@ class burp_parse_state():
             if self.T_TAG != result[0]:
                 self.logger.error('failed on tag read; read: [%d,%s]' % (result))
                 raise Exception
-        self.logger.debug('read tag: [%s]' % (result[1]))
+        self.logger.debug('read tag: [%s]', result[1])
         return result[1]
 
     def __read_int(self):
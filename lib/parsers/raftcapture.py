@@ -0,0 +1,343 @@
+#
+# This module supports the indexed RAFT capture container format
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# Layout of a .raftcap file, all integers big endian:
+#
+#   header    b'RAFTCAP\0', uint16 version
+#   blocks    zlib streams, each holding a run of records
+#   index     zlib stream, see write_index
+#   trailer   uint64 index offset, uint64 index length, b'RAFTIDX\0'
+#
+# A record is a uint32 length followed by the CAPTURE_FIELDS, each a uint32
+# length and its bytes; a length of NULL_LENGTH stands for None.  Every
+# block decompresses on its own, so a capture is read by seeking to its
+# block, and blocks can be decoded in any order or in parallel.
+#
+
+import struct
+import zlib
+import multiprocessing
+from collections import deque
+
+from core.database.database import url_hash
+
+MAGIC = b'RAFTCAP\x00'
+INDEX_MAGIC = b'RAFTIDX\x00'
+VERSION = 1
+
+HEADER = struct.Struct('>8sH')
+TRAILER = struct.Struct('>QQ8s')
+INDEX_HEADER = struct.Struct('>III')
+BLOCK_ENTRY = struct.Struct('>QII')
+CAPTURE_ENTRY = struct.Struct('>IIqiII')
+LENGTH = struct.Struct('>I')
+
+NULL_LENGTH = 0xFFFFFFFF
+
+# text fields are str when read back, the rest are bytes
+TEXT_FIELDS = ('host', 'hostip', 'url', 'status', 'datetime', 'method', 'content_type', 'content_length', 'elapsed', 'notes', 'confirmed')
+BYTES_FIELDS = ('request_headers', 'request_body', 'response_headers', 'response_body')
+CAPTURE_FIELDS = TEXT_FIELDS + BYTES_FIELDS
+
+BLOCK_SIZE = 1024*1024
+BLOCK_RECORDS = 256
+
+def capture_status(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+def encode_value(value):
+    if value is None:
+        return LENGTH.pack(NULL_LENGTH)
+    if isinstance(value, str):
+        value = value.encode('utf-8', 'surrogateescape')
+    elif not isinstance(value, bytes):
+        value = str(value).encode('utf-8')
+    return LENGTH.pack(len(value)) + value
+
+def encode_record(capture):
+    data = b''.join([encode_value(getattr(capture, name, None)) for name in CAPTURE_FIELDS])
+    return LENGTH.pack(len(data)) + data
+
+def encode_block(captures):
+    """ Compress captures into one block; returns the block and the (offset, url hash, status, host, content type) of each record """
+    records = []
+    entries = []
+    offset = 0
+    for capture in captures:
+        record = encode_record(capture)
+        entries.append((offset, url_hash(capture.url or ''), capture_status(capture.status), str(capture.host or ''), str(capture.content_type or '')))
+        records.append(record)
+        offset += len(record)
+    return zlib.compress(b''.join(records)), entries
+
+def decode_record(data, offset):
+    """ The results tuple of the record at offset in a decompressed block """
+    view = memoryview(data)
+    offset += LENGTH.size
+    values = {}
+    for name in CAPTURE_FIELDS:
+        length = LENGTH.unpack_from(data, offset)[0]
+        offset += LENGTH.size
+        if NULL_LENGTH == length:
+            value = None
+        else:
+            value = bytes(view[offset:offset+length])
+            offset += length
+            if name in TEXT_FIELDS:
+                value = value.decode('utf-8', 'surrogateescape')
+        values[name] = value
+
+    status = capture_status(values['status'])
+    if -1 == status:
+        status = ''
+    request = (values['request_headers'] or b'', values['request_body'] or b'')
+    response = (values['response_headers'] or b'', values['response_body'] or b'')
+    extras = {'content_length' : values['content_length'], 'elapsed' : values['elapsed'], 'notes' : values['notes'], 'confirmed' : values['confirmed']}
+    return ('CAPTURE', values['host'], values['hostip'], values['url'], status, values['datetime'], request, response, values['method'], values['content_type'], extras)
+
+def decode_block(block, offsets):
+    """ Decompress a block and return the results of the records at offsets """
+    data = zlib.decompress(block)
+    return [decode_record(data, offset) for offset in offsets]
+
+class RaftCaptureWriter(object):
+    """
+    Writes captures to a .raftcap file.  Captures passed to add are
+    gathered into blocks of about BLOCK_SIZE bytes; callers that encode
+    their own blocks, possibly in other processes, hand them to
+    write_block instead.  The index is written by close.
+    """
+
+    def __init__(self, filename):
+        self.fh = open(filename, 'wb')
+        self.fh.write(HEADER.pack(MAGIC, VERSION))
+        self.offset = HEADER.size
+        self.blocks = []
+        self.entries = []
+        self.strings = {}
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, capture):
+        self.pending.append(capture)
+        self.pending_size += sum([len(getattr(capture, name, None) or b'') for name in BYTES_FIELDS])
+        if self.pending_size >= BLOCK_SIZE or len(self.pending) >= BLOCK_RECORDS:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.write_block(*encode_block(self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+    def write_block(self, block, entries):
+        if not entries:
+            return
+        blockno = len(self.blocks)
+        self.fh.write(block)
+        self.blocks.append((self.offset, len(block), len(entries)))
+        self.offset += len(block)
+        for offset, hashval, status, host, content_type in entries:
+            self.entries.append((blockno, offset, hashval, status, self.intern(host), self.intern(content_type)))
+
+    def intern(self, value):
+        ndx = self.strings.get(value)
+        if ndx is None:
+            ndx = self.strings[value] = len(self.strings)
+        return ndx
+
+    def write_index(self):
+        """ Block table, then one entry per capture, with hosts and content types kept in a string table """
+        strings = sorted(self.strings, key = self.strings.get)
+        chunks = [INDEX_HEADER.pack(len(strings), len(self.blocks), len(self.entries))]
+        for value in strings:
+            chunks.append(encode_value(value))
+        for block in self.blocks:
+            chunks.append(BLOCK_ENTRY.pack(*block))
+        for entry in self.entries:
+            chunks.append(CAPTURE_ENTRY.pack(*entry))
+        index = zlib.compress(b''.join(chunks))
+        self.fh.write(index)
+        self.fh.write(TRAILER.pack(self.offset, len(index), INDEX_MAGIC))
+
+    def close(self):
+        if self.fh is not None:
+            try:
+                self.flush()
+                self.write_index()
+            finally:
+                self.fh.close()
+                self.fh = None
+        return len(self.entries)
+
+class RaftCaptureReader(object):
+    """
+    Random access to a .raftcap file through its index.  Capture numbers
+    count from 0 in file order; find narrows them by host or URL using
+    only the index, and captures decodes just the blocks holding them.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fh = open(filename, 'rb')
+        self.cached = (None, None)
+        try:
+            magic, version = HEADER.unpack(self.fh.read(HEADER.size))
+            if MAGIC != magic:
+                raise Exception('not a RAFT capture container: %s' % (filename))
+            if version > VERSION:
+                raise Exception('unsupported RAFT capture container version %d: %s' % (version, filename))
+            self.fh.seek(-TRAILER.size, 2)
+            index_offset, index_length, magic = TRAILER.unpack(self.fh.read(TRAILER.size))
+            if INDEX_MAGIC != magic:
+                raise Exception('RAFT capture container has no index, it may be truncated: %s' % (filename))
+            self.fh.seek(index_offset)
+            self.read_index(zlib.decompress(self.fh.read(index_length)))
+        except:
+            self.close()
+            raise
+
+    def read_index(self, data):
+        string_count, block_count, entry_count = INDEX_HEADER.unpack_from(data, 0)
+        offset = INDEX_HEADER.size
+        strings = []
+        for i in range(string_count):
+            length = LENGTH.unpack_from(data, offset)[0]
+            offset += LENGTH.size
+            strings.append(data[offset:offset+length].decode('utf-8', 'surrogateescape'))
+            offset += length
+        self.blocks = []
+        for i in range(block_count):
+            self.blocks.append(BLOCK_ENTRY.unpack_from(data, offset))
+            offset += BLOCK_ENTRY.size
+        self.entries = []
+        for i in range(entry_count):
+            blockno, block_offset, hashval, status, host, content_type = CAPTURE_ENTRY.unpack_from(data, offset)
+            self.entries.append((blockno, block_offset, hashval, status, strings[host], strings[content_type]))
+            offset += CAPTURE_ENTRY.size
+
+    def __len__(self):
+        return len(self.entries)
+
+    def host(self, n):
+        return self.entries[n][4]
+
+    def status(self, n):
+        return self.entries[n][3]
+
+    def content_type(self, n):
+        return self.entries[n][5]
+
+    def find(self, hosts = None, urls = None):
+        """ Numbers of the captures on any of hosts and for any of urls; None matches everything """
+        if hosts is not None:
+            hosts = set([host.lower() for host in hosts])
+        if urls is not None:
+            urls = set([url_hash(url) for url in urls])
+        numbers = []
+        for n, entry in enumerate(self.entries):
+            if hosts is not None and entry[4].lower() not in hosts:
+                continue
+            if urls is not None and entry[2] not in urls:
+                continue
+            numbers.append(n)
+        return numbers
+
+    def read_block(self, blockno):
+        offset, length, count = self.blocks[blockno]
+        self.fh.seek(offset)
+        return self.fh.read(length)
+
+    def read_capture(self, n):
+        """ Results tuple of capture n """
+        blockno, offset = self.entries[n][0:2]
+        if self.cached[0] != blockno:
+            self.cached = (blockno, zlib.decompress(self.read_block(blockno)))
+        return decode_record(self.cached[1], offset)
+
+    def captures(self, numbers = None, processes = 1):
+        """ Results tuples of the numbered captures in file order, all of them if numbers is None """
+        if numbers is None:
+            numbers = range(len(self.entries))
+        wanted = []
+        for n in sorted(numbers):
+            blockno, offset = self.entries[n][0:2]
+            if wanted and wanted[-1][0] == blockno:
+                wanted[-1][1].append(offset)
+            else:
+                wanted.append((blockno, [offset]))
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes <= 1 or len(wanted) <= 1:
+            for blockno, offsets in wanted:
+                for result in decode_block(self.read_block(blockno), offsets):
+                    yield result
+            return
+
+        # spawn rather than fork, the parent may be a threaded Qt application
+        pool = multiprocessing.get_context('spawn').Pool(processes)
+        outstanding = deque()
+        try:
+            for blockno, offsets in wanted:
+                outstanding.append(pool.apply_async(decode_block, (self.read_block(blockno), offsets)))
+                # bound the number of decoded blocks held in memory
+                while len(outstanding) >= 2 * processes:
+                    for result in outstanding.popleft().get():
+                        yield result
+            while outstanding:
+                for result in outstanding.popleft().get():
+                    yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+class raft_parse_capture():
+    """ Parses a RAFT capture container into request and result data, optionally only some hosts or URLs """
+
+    def __init__(self, raftfile, hosts = None, urls = None, processes = 1):
+        if not raftfile.lower().endswith('.raftcap'):
+            raise Exception('Unsupported file type for %s' % (raftfile))
+        self.raftfile = raftfile
+        self.reader = RaftCaptureReader(raftfile)
+        numbers = None
+        if hosts is not None or urls is not None:
+            numbers = self.reader.find(hosts, urls)
+        self.iterator = self.reader.captures(numbers, processes)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self.reader.close()
+            raise
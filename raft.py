@@ -27,8 +27,9 @@
 #
 import sys
 import os
+import multiprocessing
 
-__version__ = "3.0.1"
+__version__ = "3.0.6"
 __all__ = ['__version__']
 
 def main():
@@ -59,6 +60,8 @@ def launch_cmd_line():
     RaftCmdLine.main()
 
 if '__main__' == __name__:
+    # analyzer, import and export pools spawn workers from this executable in frozen builds
+    multiprocessing.freeze_support()
     main()
 
 
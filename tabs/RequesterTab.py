@@ -36,6 +36,7 @@ from dialogs.RequestResponseDetailDialog import RequestResponseDetailDialog
 
 from core.database.constants import ResponsesTable
 from core.fuzzer.RequestRunner import RequestRunner
+from core.fuzzer.TemplateRenderer import build_replacements
 from core.data import ResponsesDataModel
 from widgets.ResponsesContextMenuWidget import ResponsesContextMenuWidget
 from widgets.MiniResponseRenderWidget import MiniResponseRenderWidget
@@ -455,19 +456,7 @@ class RequesterTab(QObject):
                 comboBox.setCurrentIndex(index)
 
     def build_replacements(self, method, url):
-        replacements = {}
-        splitted = urlparse.urlsplit(url)
-        replacements['method'] = method.upper()
-        replacements['url'] = url
-        replacements['scheme'] = splitted.scheme or ''
-        replacements['netloc'] = splitted.netloc or ''
-        replacements['host'] = splitted.hostname or ''
-        replacements['path'] = splitted.path or '/'
-        replacements['query'] = splitted.query or ''
-        replacements['fragment'] = splitted.fragment or ''
-        replacements['request_uri'] = urlparse.urlunsplit(('', '', replacements['path'], replacements['query'], ''))
-        replacements['user_agent'] = self.framework.useragent()
-        return replacements
+        return build_replacements(method, url, self.framework.useragent())
 
     def process_template(self, url, template, replacements):
 
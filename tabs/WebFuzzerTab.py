@@ -28,7 +28,6 @@ from PyQt4 import Qsci
 
 from io import StringIO
 from urllib import parse as urlparse
-import uuid
 import re
 import json
 import os
@@ -40,7 +39,8 @@ from dialogs.RequestResponseDetailDialog import RequestResponseDetailDialog
 
 from core.database.constants import ResponsesTable
 
-from core.fuzzer.RequestRunner import RequestRunner
+from core.fuzzer.FuzzJob import FuzzJob
+from core.fuzzer.TemplateRenderer import build_replacements
 from core.data import ResponsesDataModel
 from core.web.StandardPageFactory import StandardPageFactory
 from core.web.RenderingWebView import RenderingWebView
@@ -106,7 +106,6 @@ class WebFuzzerTab(QObject):
         
         self.re_request = re.compile(r'^(\S+)\s+((?:https?://(?:\S+\.)+\w+(?::\d+)?)?/.*)\s+HTTP/\d+\.\d+\s*$', re.I)
         self.re_request_cookie = re.compile(r'^Cookie:\s*(\S+)', re.I|re.M)
-        self.re_replacement = re.compile(r'\$\{(\w+)\}')
 
         self.setup_fuzzer_tab()
 
@@ -119,7 +118,6 @@ class WebFuzzerTab(QObject):
         
         # Fill the payloads combo boxes on init
         self.fill_payloads()
-        self.pending_fuzz_requests = None
         
         # Fill the functions combo box on init
         self.fill_function_combo_box()
@@ -628,17 +626,12 @@ def randomize_alert(input):
     def start_fuzzing_clicked(self):
         """ Start the fuzzing attack """
 
-        if 'Cancel' == self.mainWindow.wfStdStartButton.text() and self.pending_fuzz_requests is not None:
-            self.cancel_fuzz_requests = True
-            for context, pending_request in self.pending_fuzz_requests.items():
-                pending_request.cancel()
-            self.pending_fuzz_requests = None
+        if 'Cancel' == self.mainWindow.wfStdStartButton.text():
+            self.webFuzzerThread.stopFuzzing()
             self.mainWindow.wfStdStartButton.setText('Start Attack')
             self.mainWindow.fuzzerStandardProgressBar.setValue(0)
             return
         
-        self.pending_fuzz_requests = {}
-        
         url = str(self.mainWindow.wfStdUrlEdit.text())
         templateText = str(self.mainWindow.wfStdEdit.toPlainText())
         method = str(self.mainWindow.stdFuzzerReqMethod.currentText())
@@ -694,10 +687,6 @@ def randomize_alert(input):
                     errors.append(name)
         
         test_slots = []
-        counters = []
-        tests_count = []
-        total_tests = 1
-        
         for name, payload_info in payload_mapping.items():
             if name in parameter_names:
                 payload_type, payload_value, payload_file = payload_info
@@ -709,163 +698,40 @@ def randomize_alert(input):
                 elif 'dynamic' == payload_type:
                     payloads = fuzz_payloads[name]
 
-                total_tests *= len(payloads)
                 test_slots.append((name, payloads))
-                counters.append(0)
-                tests_count.append(len(payloads))
-            
-        position_end = len(counters) - 1
-        position = position_end
+
+        # requests are generated by the fuzzer thread as responses come back
+        fuzz_job = FuzzJob(url, template_items, test_slots, replacements, self.global_ns, self.local_ns)
 
         self.miniResponseRenderWidget.clear_response_render()
         self.mainWindow.fuzzerStandardProgressBar.setValue(0)
-        self.mainWindow.fuzzerStandardProgressBar.setMaximum(total_tests)
-        
-        finished = False
-        first = True
-        while not finished:
-            data = {}
-            for j in range(0, len(test_slots)):
-                name, payloads = test_slots[j]
-                data[name] = payloads[counters[j]]
-        
-            template_io = StringIO()
-            self.apply_template_parameters(template_io, data, template_items)
-        
-            templateText = template_io.getvalue()
-            context = uuid.uuid4().hex
-            # print('%s%s%s' % ('-'*32, request, '-'*32))
-            use_global_cookie_jar = self.mainWindow.webFuzzerUseGlobalCookieJar.isChecked()
-            (method, url, headers, body) = self.process_template(url, templateText, replacements)
-            
-            if first:
-                    self.mainWindow.wfStdStartButton.setText('Cancel')
-                    if use_global_cookie_jar:
-                        self.fuzzRequesterCookieJar = self.framework.get_global_cookie_jar()
-                    else:
-                        self.fuzzRequesterCookieJar = InMemoryCookieJar(self.framework, self)
-                    self.requestRunner = RequestRunner(self.framework, self)
-                    self.requestRunner.setup(self.fuzzer_response_received, self.fuzzRequesterCookieJar, sequenceId, postSequenceId)
-                    first = False
-
-            self.pending_fuzz_requests[context] = self.requestRunner.queue_request(method, url, headers, body, context)
-            
-            # increment to next test
-            counters[position] = (counters[position] + 1) % (tests_count[position])
-            while position >= 0 and counters[position] == 0:
-                position -= 1
-                counters[position] = (counters[position] + 1) % (tests_count[position])
-        
-            if position == -1:
-                finished = True
-            else:
-                position = position_end        
-
-    def apply_template_parameters(self, template_io, data, template_items):
-
-        for item in template_items:
-            if item.is_text():
-                template_io.write(item.item_value)
-            elif item.is_builtin():
-                template_io.write('${'+item.item_value+'}')
-            elif item.is_payload():
-                template_io.write(data[item.item_value])
-            elif item.is_function():
-                temp_io = StringIO()
-                self.apply_template_parameters(temp_io, data, item.items)
-                temp_result = temp_io.getvalue()
-                temp_io = None
-                result = eval('%s(%s)' % (item.item_value, repr(temp_result)), self.global_ns, self.local_ns)
-                template_io.write(str(result))
-            else:
-                raise Exception('unsupported template parameters: ' + repr(item))
-       
-    def build_replacements(self, method, url):
-        replacements = {}
-        splitted = urlparse.urlsplit(url)
-        replacements['method'] = method.upper()
-        replacements['url'] = url
-        replacements['scheme'] = splitted.scheme or ''
-        replacements['netloc'] = splitted.netloc or ''
-        replacements['host'] = splitted.hostname or ''
-        replacements['path'] = splitted.path or ''
-        replacements['query'] = splitted.query or ''
-        replacements['fragment'] = splitted.fragment or ''
-        replacements['request_uri'] = url
-        replacements['user_agent'] = self.framework.useragent()
-        return replacements
-
-    def process_template(self, url, template, replacements):
-        
-        # Start of old
-        method, uri = '' ,''
-        headers, body = '', ''
-
-        # TODO: this allows for missing entries -- is this good?
-        func = lambda m: replacements.get(m.group(1))
-
-        prev = 0
-        while True:
-            n = template.find('\n', prev)
-            if -1 == n:
-                break
-            if n > 0 and '\r' == template[n-1]:
-                line = template[prev:n-1]
-            else:
-                line = template[prev:n]
-
-            if 0 == len(line):
-                # end of headers
-                headers = template[0:n+1]
-                body = template[n+1:]
-                break
-            prev = n + 1
+        self.mainWindow.fuzzerStandardProgressBar.setMaximum(fuzz_job.total)
+        self.mainWindow.fuzzerStandardProgressBar.setFormat('%p%')
 
-        if not headers:
-            headers = template
-            body = ''
-            
-        # TODO: could work from ordered dict to main order?
-        headers_dict = {}
-        first = True
-        for line in headers.splitlines():
-#            print(line)
-            if not line:
-                break
-            if '$' in line:
-                line = self.re_replacement.sub(func, line)
-            if first:
-                m = self.re_request.match(line)
-                if not m:
-                    raise Exception('Invalid HTTP request: failed to match request line: %s' % (line))
-                method = m.group(1)
-                uri = m.group(2)
-                first = False
-                continue
+        if self.mainWindow.webFuzzerUseGlobalCookieJar.isChecked():
+            self.fuzzRequesterCookieJar = self.framework.get_global_cookie_jar()
+        else:
+            self.fuzzRequesterCookieJar = InMemoryCookieJar(self.framework, self)
 
-            if ':' in line:
-                name, value = [v.strip() for v in line.split(':', 1)]
-                headers_dict[name] = value
-        
-        if '$' in body:
-            body = self.re_replacement.sub(func, body)
+        self.mainWindow.wfStdStartButton.setText('Cancel')
+        self.webFuzzerThread.startFuzzing(fuzz_job, self, self.fuzzRequesterCookieJar, sequenceId, postSequenceId)
 
-        url = urlparse.urljoin(url, uri)
+    def build_replacements(self, method, url):
+        return build_replacements(method, url, self.framework.useragent())
 
-        return (method, url, headers_dict, body)
-        
     def fuzzer_history_clear_button_clicked(self):
         self.Data.clear_fuzzer_history(self.cursor)
         self.fuzzerHistoryDataModel.clearModel()
 
+    def set_fuzzer_thread(self, webFuzzerThread):
+        self.webFuzzerThread = webFuzzerThread
+        QObject.connect(self, SIGNAL('fuzzResponseReceived(int, QString)'), self.fuzzer_response_received)
+        QObject.connect(self, SIGNAL('fuzzRunFinished()'), self.handle_fuzzRunFinished)
+        QObject.connect(self, SIGNAL('fuzzRunError(QString)'), self.handle_fuzzRunError)
+        QObject.connect(self, SIGNAL('fuzzRunStats(int, double)'), self.handle_fuzzRunStats)
+
     def fuzzer_response_received(self, response_id, context):
         self.mainWindow.fuzzerStandardProgressBar.setValue(self.mainWindow.fuzzerStandardProgressBar.value()+1)
-        context = str(context)
-        if self.pending_fuzz_requests is not None:
-            try:
-                self.pending_fuzz_requests.pop(context)
-            except KeyError as e:
-                pass
         if 0 != response_id:
             row = self.Data.read_responses_by_id(self.cursor, response_id)
             if row:
@@ -873,12 +739,12 @@ def randomize_alert(input):
                 self.Data.insert_fuzzer_history(self.cursor, response_id)
                 self.fuzzerHistoryDataModel.append_data([response_item])
 
-        finished = False
-        if self.pending_fuzz_requests is None or len(self.pending_fuzz_requests) == 0:
-            self.mainWindow.fuzzerStandardProgressBar.setValue(self.mainWindow.fuzzerStandardProgressBar.maximum())
-            finished = True
-        elif self.mainWindow.fuzzerStandardProgressBar.value() == self.mainWindow.fuzzerStandardProgressBar.maximum():
-            finished = True
-        if finished:
-            self.mainWindow.wfStdStartButton.setText('Start Attack')
-        
+    def handle_fuzzRunFinished(self):
+        self.mainWindow.fuzzerStandardProgressBar.setValue(self.mainWindow.fuzzerStandardProgressBar.maximum())
+        self.mainWindow.wfStdStartButton.setText('Start Attack')
+
+    def handle_fuzzRunStats(self, window, throughput):
+        self.mainWindow.fuzzerStandardProgressBar.setFormat('%%p%%  (%d in flight, %.1f requests/sec)' % (window, throughput))
+
+    def handle_fuzzRunError(self, message):
+        self.framework.log_warning('web fuzzer stopped: %s' % (message))
@@ -1845,6 +1845,8 @@ class Ui_MainWindow(object):
         self.actionQuit.setObjectName(_fromUtf8("actionQuit"))
         self.actionImport_RaftCaptureXml = QtGui.QAction(MainWindow)
         self.actionImport_RaftCaptureXml.setObjectName(_fromUtf8("actionImport_RaftCaptureXml"))
+        self.actionImport_RaftCapture = QtGui.QAction(MainWindow)
+        self.actionImport_RaftCapture.setObjectName(_fromUtf8("actionImport_RaftCapture"))
         self.actionImport_BurpLog = QtGui.QAction(MainWindow)
         self.actionImport_BurpLog.setObjectName(_fromUtf8("actionImport_BurpLog"))
         self.actionImport_BurpState = QtGui.QAction(MainWindow)
@@ -1932,6 +1934,7 @@ class Ui_MainWindow(object):
         self.menuFile.addAction(self.actionSave_As)
         self.menuFile.addSeparator()
         self.menuFile.addAction(self.actionImport_RaftCaptureXml)
+        self.menuFile.addAction(self.actionImport_RaftCapture)
         self.menuFile.addAction(self.actionImport_BurpLog)
         self.menuFile.addAction(self.actionImport_BurpState)
         self.menuFile.addAction(self.actionImport_BurpXml)
@@ -2289,6 +2292,8 @@ class Ui_MainWindow(object):
         self.actionQuit.setText(_translate("MainWindow", "Quit", None))
         self.actionImport_RaftCaptureXml.setText(_translate("MainWindow", "Import Raft Capture XML", None))
         self.actionImport_RaftCaptureXml.setToolTip(_translate("MainWindow", "Import Raft Capture XML", None))
+        self.actionImport_RaftCapture.setText(_translate("MainWindow", "Import Raft Capture", None))
+        self.actionImport_RaftCapture.setToolTip(_translate("MainWindow", "Import Raft Capture Container", None))
         self.actionImport_BurpLog.setText(_translate("MainWindow", "Import Burp Log", None))
         self.actionImport_BurpLog.setToolTip(_translate("MainWindow", "Import Burp Proxy Log", None))
         self.actionImport_BurpState.setText(_translate("MainWindow", "Import Burp State", None))
@@ -0,0 +1,105 @@
+#
+# Multi-pattern matching for analyzers
+#
+# Copyright (c) 2011-2013 RAFT Team
+#
+# This file is part of RAFT.
+#
+# RAFT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# RAFT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with RAFT.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+
+class MultiStringMatcher():
+    """
+    Finds every occurrence of a set of byte strings in one pass over the data.
+
+    The strings are compiled into a single regular expression shaped like a
+    trie, so each position only follows the branches matching its leading
+    bytes and the scan itself runs inside the re module.  At each position
+    the longest string wins; shorter strings that are prefixes of it are
+    reported from a table built up front, and scanning resumes one byte on
+    so overlapping occurrences are not lost.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = []
+        for pattern in patterns:
+            if pattern and pattern not in self.patterns:
+                self.patterns.append(pattern)
+
+        # longest first, so the patterns found at a position can be reported in that order
+        self.prefixes = {}
+        for pattern in self.patterns:
+            self.prefixes[pattern] = sorted([other for other in self.patterns if pattern.startswith(other)], key = len, reverse = True)
+
+        self.regex = None
+        if self.patterns:
+            try:
+                self.regex = re.compile(self.build_trie_expression(self.patterns))
+            except (RuntimeError, re.error):
+                # very long patterns can nest too deeply; a flat alternation matches the same way
+                alternation = b'|'.join([re.escape(pattern) for pattern in sorted(self.patterns, key = len, reverse = True)])
+                self.regex = re.compile(alternation)
+
+    def build_trie_expression(self, patterns):
+        trie = {}
+        for pattern in patterns:
+            node = trie
+            for i in range(len(pattern)):
+                node = node.setdefault(pattern[i:i+1], {})
+            node[b''] = None
+        return self.trie_node_expression(trie)
+
+    def trie_node_expression(self, node):
+        terminal = b'' in node
+        branches = []
+        for key in sorted(node.keys()):
+            if key:
+                branches.append(re.escape(key) + self.trie_node_expression(node[key]))
+        if not branches:
+            return b''
+        if terminal:
+            # greedy, so the longer pattern is preferred when both match
+            return b'(?:' + b'|'.join(branches) + b')?'
+        if 1 == len(branches):
+            return branches[0]
+        return b'(?:' + b'|'.join(branches) + b')'
+
+    def finditer(self, data):
+        """ Yields (offset, pattern) for every occurrence of every pattern, in order of offset """
+        if self.regex is None:
+            return
+        search = self.regex.search
+        pos = 0
+        while True:
+            m = search(data, pos)
+            if m is None:
+                return
+            start = m.start()
+            for pattern in self.prefixes[m.group()]:
+                yield start, pattern
+            pos = start + 1
+
+    def first_matches(self, data):
+        """ Returns a dictionary of pattern to the offset of its first occurrence """
+        found = {}
+        remaining = len(self.patterns)
+        for start, pattern in self.finditer(data):
+            if pattern not in found:
+                found[pattern] = start
+                remaining -= 1
+                if 0 == remaining:
+                    break
+        return found
@@ -414,9 +414,6 @@ class RequestResponseWidget(QObject):
         try:
             results = rr.results
             if 'html' == rr.baseType:
-                # Create content for parsing HTML
-                self.htmlExtractor.process(body, url, charset, results)
-
                 self.tabwidget.setTabText(self.scriptsTabIndex, 'Scripts')
                 for script in results.scripts:
                     scriptsIO.write('%s\n\n' % self.flat_str(script))
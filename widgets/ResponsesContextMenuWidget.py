@@ -30,11 +30,9 @@ from io import StringIO
 
 from actions import interface
 from core.database.constants import ResponsesTable
+from core.data.ResponsesVirtualDataModel import ResponsesVirtualDataModel
 
-from lib.parsers.raftparse import ParseAdapter
-from core.data.RaftDbCapture import RaftDbCapture
-import bz2
-import lzma
+from core.database.BulkExport import BulkCaptureExporter, capture_compression
 
 class ResponsesContextMenuWidget(QObject):
     def __init__(self, framework, dataModel, treeView, parent = None):
@@ -176,36 +174,27 @@ class ResponsesContextMenuWidget(QObject):
             self.currentChanged_callback(index)
 
     def export_to_raft_capture(self):
-        # TODO: consider implementing a tasklet if this is the entire DB being exported
         filename = 'RaftExport-%s' % int(time.time())
-        file = QFileDialog.getSaveFileName(None, "Save to file", filename, "XML File (*.xml);;XZ XML File (*.xml.xz)")
+        file = QFileDialog.getSaveFileName(None, "Save to file", filename, "XML File (*.xml);;XZ XML File (*.xml.xz);;BZ2 XML File (*.xml.bz2);;RAFT Capture (*.raftcap)")
         if file:
-            adapter = ParseAdapter()
             # TODO: refactor
             filename = str(file)
             while '.xml.xml' in filename:
                 filename = filename.replace('.xml.xml', '.xml')
-            if filename.endswith('.xml.xz'):
-                while '.xml.xz.xml.xz' in filename:
-                    filename = filename.replace('.xml.xz.xml.xz', '.xml.xz')
-                fh = lzma.LZMAFile(filename, 'w')
-            elif filename.endswith('.xml'):
-                filename = filename.replace('.xml.xml', '.xml')
-                fh = open(filename, 'wb')
-            else:
+            for extension in ('.xml.xz', '.xml.bz2', '.raftcap'):
+                while extension + extension in filename:
+                    filename = filename.replace(extension + extension, extension)
+            if capture_compression(filename) is None:
                 raise Exception('unhandled file type: %s' % (filename))
+            ids = []
+            for index in self.treeViewSelectionModel.selectedRows():
+                Id = interface.index_to_id(self.dataModel, index)
+                if Id:
+                    ids.append(Id)
             Data = self.framework.getDB()
             cursor = Data.allocate_thread_cursor()
             try:
-                fh.write(b'<raft version="1.0">\n')
-                for index in self.treeViewSelectionModel.selectedRows():
-                    Id = interface.index_to_id(self.dataModel, index)
-                    if Id:
-                        capture = RaftDbCapture()
-                        capture.populate_by_id(self.framework, Data, cursor, Id)
-                        fh.write(adapter.format_as_xml(capture).encode('utf-8'))
-                fh.write(b'</raft>')
-                fh.close()
+                BulkCaptureExporter(Data, cursor, filename).export_ids(ids)
             finally:
                 cursor.close()
                 Data.release_thread_cursor(cursor)
@@ -342,6 +331,9 @@ class ResponsesContextMenuWidget(QObject):
         index = self.dataModel.index(index.row(), column)
         if index.isValid():
             value = self.dataModel.data(index)
+            if isinstance(self.dataModel, ResponsesVirtualDataModel):
+                self.dataModel.add_filter(offset, value, False)
+                return
             for i in range(0, self.dataModel.rowCount()):
                 itemIndex = self.dataModel.index(i, column)
                 data = self.dataModel.data(itemIndex)
@@ -359,6 +351,9 @@ class ResponsesContextMenuWidget(QObject):
         index = self.dataModel.index(index.row(), column)
         if index.isValid():
             value = self.dataModel.data(index)
+            if isinstance(self.dataModel, ResponsesVirtualDataModel):
+                self.dataModel.add_filter(offset, value, True)
+                return
             for i in range(0, self.dataModel.rowCount()):
                 itemIndex = self.dataModel.index(i, column)
                 data = self.dataModel.data(itemIndex)
@@ -377,6 +372,11 @@ class ResponsesContextMenuWidget(QObject):
                 self.treeView.setRowHidden(i, QModelIndex(), True)
 
     def data_tree_show_all(self):
+        if isinstance(self.dataModel, ResponsesVirtualDataModel):
+            # the model reset done by set_filters also clears rows hidden in the
+            # view, so there is no need to visit every row
+            self.dataModel.set_filters([])
+            return
         for i in range(0, self.dataModel.rowCount()):
             self.treeView.setRowHidden(i, QModelIndex(), False)
 